@@ -1,60 +1,85 @@
+from importlib import import_module
 from flask import Flask
-from flask_restx import Api
 from .config.config import config_dict
 from flask_migrate import Migrate
-from .utils import db
+from .utils import JWTManager, db
+from .utils.compression import compressor
+from .utils.profiling import profiler
+from .utils.ratelimit import rate_limiter
+from .utils.slowqueries import slow_query_recorder
+from .utils.swagger import CachedSchemaApi
+from .utils.tenancy import tenancy, tenant_claims
+from .utils.validation import request_validator
+from .health.views import health_blueprint
 from .models import Admin, Course, Enrollment, Student
-from .auth.views import auth_namespace
-from .courses.views import course_namespace  
-from .enrollments.views import enrollment_namespace
-from .students.views import student_namespace
-from flask_jwt_extended import JWTManager
+from .commands import commands, create_admin, delete_admin, activate_admin, deactivate_admin
 from werkzeug.exceptions import NotFound, MethodNotAllowed
-import click
-from werkzeug.security import generate_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy.orm import configure_mappers
 
 # App
 
-# Cli Function to create an admin
-def create_admin(username, password):
-    user = Admin(username=username, password=generate_password_hash(password), is_active=False)
-    user.save()
-
-# Cli Function to delete an admin
-def delete_admin(username):
-    user = Admin.query.filter_by(username=username).first()
-    if user:
-        user.delete()
-
-# Cli Function to activate an admin
-def activate_admin(username):
-    user = Admin.query.filter_by(username=username).first()
-    if user:
-        user.is_active = True
-        user.save()
-
-# Cli Function to deactivate an admin
-def deactivate_admin(username):
-    user = Admin.query.filter_by(username=username).first()
-    if user:
-        user.is_active = False
-        user.save()
+# Flask Restx Namespaces the factory can mount: name -> (module, namespace, url path)
+# Modules are only imported when their namespace is mounted
+NAMESPACES = {
+    'auth': ('.auth.views', 'auth_namespace', '/auth'),
+    'courses': ('.courses.views', 'course_namespace', '/courses'),
+    'enrollments': ('.enrollments.views', 'enrollment_namespace', '/enrollments'),
+    'students': ('.students.views', 'student_namespace', '/students'),
+    'batch': ('.batch.views', 'batch_namespace', '/batch'),
+    'jobs': ('.jobs.views', 'job_namespace', '/jobs'),
+    'changes': ('.outbox.views', 'change_namespace', '/changes'),
+    'live': ('.live.views', 'live_namespace', '/live'),
+    'audit': ('.audit.views', 'audit_namespace', '/audit'),
+    'admin': ('.admin.views', 'admin_namespace', '/admin'),
+}
+
+# Build everything workers would otherwise build lazily on their first request
+def warm_up(app):
+    configure_mappers()
+    with app.test_request_context():
+        app.extensions['restx_api'].__schema__
 
 # App Factory
-def create_app(config=config_dict['dev']):
+# namespaces limits the mounted Flask Restx namespaces, all of them by default
+def create_app(config=config_dict['dev'], namespaces=None):
+    if isinstance(config, str):
+        config = config_dict[config]
+
     app = Flask(__name__)
 
     app.config.from_object(config)
+
+    # Client address, scheme and host from the trusted proxies' X-Forwarded-* headers
+    hops = app.config['PROXY_FIX_HOPS']
+    if hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
+    # Schools with their own databases, adds their binds so it comes before db
+    tenancy.init_app(app)
     
     # Init db
     db.init_app(app)
 
-    #  JWT
+    #  JWT, tokens carry the school they were issued for
     jwt = JWTManager(app)
+    jwt.additional_claims_loader(tenant_claims)
 
     #  Flask Migrate
     migrate = Migrate(app, db)
 
+    # Slow query log of the app's engines
+    slow_query_recorder.init_app(app)
+
+    # Rate limits, checked before every request
+    rate_limiter.init_app(app)
+
+    # Gzip / brotli compression of the responses, negotiated with Accept-Encoding
+    compressor.init_app(app)
+
+    # Request profiling, nothing is hooked in unless PROFILE_ENABLED is set
+    profiler.init_app(app)
+
     # Flask Restx authorization Bearer Auth
     authorizations = {
         "Bearer Auth": {
@@ -65,8 +90,8 @@ def create_app(config=config_dict['dev']):
         }
     }
 
-    # Flask Restx Api Swagger
-    api = Api(app,
+    # Flask Restx Api Swagger, the spec is built on first request and cached
+    api = CachedSchemaApi(app,
         title='School REST API',
         description='A simple REST API for school',
         authorizations=authorizations,
@@ -74,10 +99,17 @@ def create_app(config=config_dict['dev']):
     )
         
     # Flask Restx Namespaces
-    api.add_namespace(auth_namespace, path='/auth')
-    api.add_namespace(course_namespace, path='/courses')
-    api.add_namespace(enrollment_namespace, path='/enrollments')
-    api.add_namespace(student_namespace, path='/students')
+    for name in namespaces or app.config.get('API_NAMESPACES') or NAMESPACES:
+        module, namespace, path = NAMESPACES[name]
+        api.add_namespace(getattr(import_module(module, __name__), namespace), path=path)
+
+    app.extensions['restx_api'] = api
+
+    # Validators of the POST and PUT payloads, compiled from the namespace models
+    request_validator.init_app(app)
+
+    # Health and readiness probes, outside of the Api so they skip JWT and Swagger
+    app.register_blueprint(health_blueprint)
 
     # Flask Restx Error Handlers
     @api.errorhandler(NotFound)
@@ -100,40 +132,7 @@ def create_app(config=config_dict['dev']):
         }
     
     # Cli Commands
+    for command in commands:
+        app.cli.add_command(command)
 
-    # Create Admin
-    @click.command()
-    @click.option('--username', prompt=True, help='The admin username')
-    @click.option('--password', prompt=True, hide_input=True, confirmation_prompt=True, help='The admin password')
-    def create_admin_command(username, password):
-        create_admin(username, password)
-        click.echo('Admin created!')
-
-    # Delete Admin
-    @click.command()
-    @click.option('--username', prompt=True, help='The admin username')
-    def delete_admin_command(username):
-        delete_admin(username)
-        click.echo('Admin deleted!')
-
-    # Activate Admin
-    @click.command()
-    @click.option('--username', prompt=True, help='The admin username')
-    def activate_admin_command(username):
-        activate_admin(username)
-        click.echo('Admin activated!')
-    
-    # Deactivate Admin
-    @click.command()
-    @click.option('--username', prompt=True, help='The admin username')
-    def deactivate_admin_command(username):
-        deactivate_admin(username)
-        click.echo('Admin deactivated!')
-
-    # Add Cli Commands
-    app.cli.add_command(activate_admin_command)
-    app.cli.add_command(deactivate_admin_command)
-    app.cli.add_command(delete_admin_command)
-    app.cli.add_command(create_admin_command)
-
-    return app
\ No newline at end of file
+    return app
@@ -0,0 +1,146 @@
+from flask import current_app, request
+from flask_restx import Namespace, Resource, fields
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from http import HTTPStatus
+from ..models import Admin
+from ..utils.profiling import load_profile, recent_profiles
+
+# Admin Diagnostics Endpoints
+
+# Largest list of profiles
+MAX_PROFILE_LIMIT = 200
+
+# Orders of the slow query report
+SLOW_QUERY_ORDERS = ('total_ms', 'count', 'max_ms')
+
+# Admin Namespace
+admin_namespace = Namespace('admin', description='Diagnostics for admins')
+
+# Profile Model
+profile_model = admin_namespace.model('Profile', {
+    'id': fields.String(description='Profile id'),
+    'endpoint': fields.String(description='Flask endpoint of the request'),
+    'method': fields.String(description='HTTP method'),
+    'path': fields.String(description='Request path'),
+    'status': fields.Integer(description='Response status code'),
+    'trigger': fields.String(description='sample or header'),
+    'pid': fields.Integer(description='Worker process id'),
+    'started_at': fields.String(description='When the request started (UTC)'),
+    'duration_ms': fields.Float(description='Request time while profiled'),
+})
+
+# Profiled Function Model
+profile_function_model = admin_namespace.model('ProfileFunction', {
+    'function': fields.String(description='file:line(function)'),
+    'calls': fields.Integer(description='Number of calls'),
+    'own_ms': fields.Float(description='Time spent in the function itself'),
+    'cumulative_ms': fields.Float(description='Time spent in the function and its callees'),
+})
+
+# Profile Detail Model
+profile_detail_model = admin_namespace.inherit('ProfileDetail', profile_model, {
+    'functions': fields.List(fields.Nested(profile_function_model), description='Most expensive functions first'),
+})
+
+# Slow Query Model
+slow_query_model = admin_namespace.model('SlowQuery', {
+    'fingerprint': fields.String(description='Statement with literals and parameters replaced by ?'),
+    'statement': fields.String(description='First statement recorded with this fingerprint'),
+    'count': fields.Integer(description='Number of slow runs'),
+    'total_ms': fields.Float(description='Time of all slow runs'),
+    'mean_ms': fields.Float(description='Mean time of a slow run'),
+    'max_ms': fields.Float(description='Slowest run'),
+    'last_seen': fields.DateTime(description='Last slow run (UTC)'),
+    'endpoints': fields.Raw(description='Endpoint -> number of slow runs'),
+    'plan': fields.List(fields.String, description='Latest query plan, captured again every SLOW_QUERY_EXPLAIN_INTERVAL seconds'),
+    'plan_at': fields.DateTime(description='When the plan was captured (UTC)'),
+    'previous_plan': fields.List(fields.String, description='Plan before the latest one, when it changed'),
+    'worker': fields.Integer(description='Pid of the worker whose log this is'),
+    'analyzed': fields.Boolean(description='Whether the plan is an EXPLAIN ANALYZE'),
+})
+
+
+# Abort unless the current user is an active admin
+def require_admin():
+    admin = Admin.query.filter_by(id=get_jwt_identity(), is_active=True).first()
+    if not admin:
+        admin_namespace.abort(HTTPStatus.UNAUTHORIZED, 'You are not authorized to perform this action')
+    return admin
+
+
+# Recent request profiles, admin only
+@admin_namespace.route('/profiles')
+class ProfileList(Resource):
+    @admin_namespace.doc('get_profiles', params={
+        'limit': 'Number of profiles (default 50, at most {})'.format(MAX_PROFILE_LIMIT),
+    })
+    @admin_namespace.marshal_list_with(profile_model)
+    @jwt_required()
+    def get(self):
+        '''
+        Get the newest request profiles of this host
+            by admin only
+        '''
+        require_admin()
+        limit = min(max(request.args.get('limit', 50, type=int), 1), MAX_PROFILE_LIMIT)
+        return recent_profiles(current_app.config['PROFILE_DIR'], limit), HTTPStatus.OK
+
+
+# Request profile, admin only
+@admin_namespace.route('/profiles/<string:profile_id>')
+class ProfileDetail(Resource):
+    @admin_namespace.doc('get_profile')
+    @admin_namespace.marshal_with(profile_detail_model)
+    @jwt_required()
+    def get(self, profile_id):
+        '''
+        Get a request profile with its most expensive functions
+            by admin only
+        '''
+        require_admin()
+        profile = load_profile(current_app.config['PROFILE_DIR'], profile_id)
+        if profile is None:
+            admin_namespace.abort(HTTPStatus.NOT_FOUND, 'Profile not found')
+        return profile, HTTPStatus.OK
+
+
+# Slow query log of this worker, admin only
+@admin_namespace.route('/slow-queries')
+class SlowQueryList(Resource):
+    @admin_namespace.doc('get_slow_queries', params={
+        'order_by': 'One of {} (default total_ms)'.format(', '.join(SLOW_QUERY_ORDERS)),
+        'limit': 'Number of queries (default 50)',
+    })
+    @admin_namespace.marshal_list_with(slow_query_model)
+    @jwt_required()
+    def get(self):
+        '''
+        Get the slow queries of this worker, the most expensive first
+            by admin only
+        '''
+        require_admin()
+        log = slow_query_log()
+        order_by = request.args.get('order_by', 'total_ms')
+        if order_by not in SLOW_QUERY_ORDERS:
+            admin_namespace.abort(HTTPStatus.BAD_REQUEST, 'order_by must be one of {}'.format(', '.join(SLOW_QUERY_ORDERS)))
+        limit = max(request.args.get('limit', 50, type=int), 1)
+        return log.report(order_by, limit), HTTPStatus.OK
+
+    @admin_namespace.doc('reset_slow_queries')
+    @jwt_required()
+    def delete(self):
+        '''
+        Clear the slow query log of this worker
+            by admin only
+        '''
+        require_admin()
+        slow_query_log().reset()
+        return {'message': 'Slow query log cleared'}, HTTPStatus.OK
+
+
+# Slow query log of the app, 404 when it is off
+def slow_query_log():
+    log = current_app.extensions.get('slow_queries')
+    if log is None:
+        admin_namespace.abort(HTTPStatus.NOT_FOUND, 'The slow query log is off (SLOW_QUERY_ENABLED)')
+    return log
@@ -0,0 +1,174 @@
+import json
+import mmap
+import os
+import sys
+from array import array
+
+# Columnar Snapshot Format
+#
+# A snapshot is a directory with one file per column and a manifest.json
+# describing them. Numeric columns are raw native-order arrays (int64,
+# float64, or int8 for booleans) that can be memory-mapped and read in place.
+# A string column is its UTF-8 bytes back to back, plus an int64 offsets file
+# with one more entry than there are rows. Missing floats are NaN.
+#
+# Columns are appended a chunk at a time and the manifest is written last,
+# so a directory without one is an unfinished snapshot.
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+
+# Column type -> array typecode
+TYPECODES = {'int64': 'q', 'float64': 'd', 'bool': 'b'}
+
+
+class ColumnWriter:
+    '''
+    Appends the values of one column to its file
+    '''
+
+    def __init__(self, directory, table, name, type):
+        self.type = type
+        self.entry = {'type': type, 'file': '{}.{}.bin'.format(table, name)}
+        self.file = open(os.path.join(directory, self.entry['file']), 'wb')
+        if type == 'string':
+            self.entry['offsets'] = '{}.{}.offsets.bin'.format(table, name)
+            self.offsets = open(os.path.join(directory, self.entry['offsets']), 'wb')
+            self.size = 0
+            array('q', [0]).tofile(self.offsets)
+
+    def append(self, values):
+        if self.type != 'string':
+            array(TYPECODES[self.type], values).tofile(self.file)
+            return
+        encoded = [value.encode() for value in values]
+        offsets = array('q')
+        for value in encoded:
+            self.size += len(value)
+            offsets.append(self.size)
+        self.file.write(b''.join(encoded))
+        offsets.tofile(self.offsets)
+
+    # Manifest entry of the column
+    def close(self):
+        self.file.close()
+        if self.type == 'string':
+            self.offsets.close()
+        return self.entry
+
+
+class TableWriter:
+    '''
+    Appends rows, as tuples in column order, to the columns of one table
+    '''
+
+    def __init__(self, directory, table, columns):
+        self.columns = [ColumnWriter(directory, table, name, type) for name, type in columns]
+        self.names = [name for name, _ in columns]
+        self.rows = 0
+
+    def append(self, rows):
+        if not rows:
+            return
+        for column, values in zip(self.columns, zip(*rows)):
+            column.append(values)
+        self.rows += len(rows)
+
+    def close(self):
+        return {
+            'rows': self.rows,
+            'columns': {name: column.close() for name, column in zip(self.names, self.columns)},
+        }
+
+
+# Write the manifest of a finished snapshot, tables is {name: TableWriter.close()}
+def write_manifest(directory, tables, **info):
+    manifest = dict(info, format=FORMAT_VERSION, byteorder=sys.byteorder, tables=tables)
+    with open(os.path.join(directory, MANIFEST), 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+class StringColumn:
+    '''
+    String column read from its offsets and bytes
+    '''
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode()
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class Snapshot:
+    '''
+    Memory-mapped snapshot, columns are read from the page cache as they are used
+
+    Columns are memoryviews (or StringColumns) over the mapped files and can not
+    be used once the snapshot is closed.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as file:
+            self.manifest = json.load(file)
+        if self.manifest['format'] != FORMAT_VERSION:
+            raise ValueError('Unsupported snapshot format {}'.format(self.manifest['format']))
+        if self.manifest['byteorder'] != sys.byteorder:
+            raise ValueError('The snapshot was written on a {} endian machine'.format(self.manifest['byteorder']))
+        self.tables = self.manifest['tables']
+        self.maps = []
+        self.views = []
+        self.columns = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def rows(self, table):
+        return self.tables[table]['rows']
+
+    # Column of a table, mapped on first use
+    def column(self, table, name):
+        key = (table, name)
+        if key not in self.columns:
+            entry = self.tables[table]['columns'][name]
+            if entry['type'] == 'string':
+                self.columns[key] = StringColumn(self.map(entry['offsets'], 'q'), self.map(entry['file'], 'B'))
+            else:
+                self.columns[key] = self.map(entry['file'], TYPECODES[entry['type']])
+        return self.columns[key]
+
+    def map(self, filename, typecode):
+        with open(os.path.join(self.path, filename), 'rb') as file:
+            if not os.fstat(file.fileno()).st_size:
+                # Empty files can not be mapped
+                return memoryview(array(typecode))
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps.append(mapped)
+        view = memoryview(mapped).cast(typecode)
+        self.views.append(view)
+        return view
+
+    def close(self):
+        self.columns.clear()
+        for view in self.views:
+            view.release()
+        for mapped in self.maps:
+            mapped.close()
+        self.views, self.maps = [], []
@@ -0,0 +1,81 @@
+import math
+from collections import Counter, defaultdict
+from ..courses.stats import summarise
+
+# Snapshot Queries
+#
+# Aggregates computed from the memory-mapped columns of a Snapshot, without
+# the database. They follow the API: GPAs are weighted by course credits with
+# ungraded enrollments counting as 0 and deleted courses left out, like
+# calculate_gpa, and course stats have the shape of GET /courses/stats.
+# pass_grade defaults to the PASS_GRADE the snapshot was written with.
+
+
+# Credits of the courses that are not deleted, {course id: credits}
+def live_course_credits(snapshot):
+    return {
+        course_id: credits
+        for course_id, credits, deleted in zip(
+            snapshot.column('courses', 'id'),
+            snapshot.column('courses', 'credits'),
+            snapshot.column('courses', 'deleted'),
+        )
+        if not deleted
+    }
+
+
+# Enrollment rows as (student_id, course_id, grade), of one term when given
+def enrollment_rows(snapshot, term_id=None):
+    rows = zip(
+        snapshot.column('enrollments', 'student_id'),
+        snapshot.column('enrollments', 'course_id'),
+        snapshot.column('enrollments', 'grade'),
+        snapshot.column('enrollments', 'term_id'),
+    )
+    return ((student_id, course_id, grade) for student_id, course_id, grade, term in rows
+            if term_id is None or term == term_id)
+
+
+# GPA of every student with enrollments, {student id: gpa}
+def student_gpas(snapshot, term_id=None):
+    credits = live_course_credits(snapshot)
+    deleted = {
+        student_id
+        for student_id, is_deleted in zip(snapshot.column('students', 'id'), snapshot.column('students', 'deleted'))
+        if is_deleted
+    }
+    points = defaultdict(float)
+    total_credits = defaultdict(float)
+    for student_id, course_id, grade in enrollment_rows(snapshot, term_id):
+        if student_id in deleted or course_id not in credits:
+            continue
+        total_credits[student_id] += credits[course_id]
+        points[student_id] += (0.0 if math.isnan(grade) else grade) * credits[course_id]
+    return {
+        student_id: points[student_id] / course_credits
+        for student_id, course_credits in total_credits.items()
+        if course_credits
+    }
+
+
+# Distribution of the students' GPAs: count, mean, median, std_dev, pass_rate and histogram
+def gpa_distribution(snapshot, term_id=None, pass_grade=None):
+    pass_grade = snapshot.manifest['pass_grade'] if pass_grade is None else pass_grade
+    gpas = Counter(student_gpas(snapshot, term_id).values())
+    return summarise(sorted(gpas.items()), pass_grade)
+
+
+# Grade statistics of the courses that are not deleted, as GET /courses/stats lists them
+def course_stats(snapshot, term_id=None, pass_grade=None):
+    pass_grade = snapshot.manifest['pass_grade'] if pass_grade is None else pass_grade
+    credits = live_course_credits(snapshot)
+    grades = defaultdict(Counter)
+    for _, course_id, grade in enrollment_rows(snapshot, term_id):
+        if course_id in credits and not math.isnan(grade):
+            grades[course_id][grade] += 1
+
+    return [
+        dict(summarise(sorted(grades[course_id].items()), pass_grade), course_id=course_id, course_name=name)
+        for course_id, name in zip(snapshot.column('courses', 'id'), snapshot.column('courses', 'name'))
+        if course_id in credits
+    ]
@@ -0,0 +1,109 @@
+import math
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, select
+from ..models import Course, Enrollment, Student
+from ..utils import db
+from .columns import TableWriter, write_manifest
+
+# Analytics Snapshot
+#
+# Copies students, courses and enrollments with their grades into a columnar
+# snapshot (see columns.py) that analytics queries read without touching the
+# database. Tables are read in id order, CHUNK_SIZE rows per query, and each
+# chunk is appended to the column files as it arrives. On Postgres all reads
+# share one REPEATABLE READ transaction, so the tables are consistent with each
+# other. Password hashes and emails are left out.
+
+# Rows read per query
+CHUNK_SIZE = 5000
+
+
+def missing_float(value):
+    return math.nan if value is None else float(value)
+
+
+# table -> (key, [(column, type, expression, converter)])
+TABLES = {
+    'students': (Student.id, [
+        ('id', 'int64', Student.id, int),
+        ('full_name', 'string', Student.full_name, str),
+        ('deleted', 'bool', Student.deleted_at.isnot(None), bool),
+    ]),
+    'courses': (Course.id, [
+        ('id', 'int64', Course.id, int),
+        ('name', 'string', Course.name, str),
+        ('lecturer', 'string', Course.lecturer, str),
+        ('credits', 'int64', Course.credits, int),
+        ('deleted', 'bool', Course.deleted_at.isnot(None), bool),
+    ]),
+    'enrollments': (Enrollment.id, [
+        ('id', 'int64', Enrollment.id, int),
+        ('student_id', 'int64', Enrollment.student_id, int),
+        ('course_id', 'int64', Enrollment.course_id, int),
+        ('term_id', 'int64', Enrollment.term_id, int),
+        ('grade', 'float64', Enrollment.grade, missing_float),
+    ]),
+}
+
+
+# Default snapshot directory, in EXPORT_DIR
+def snapshot_path(name=None):
+    name = name or datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    return os.path.join(current_app.config['EXPORT_DIR'], 'snapshot-{}'.format(name))
+
+
+# Connection the snapshot is read with
+@contextmanager
+def snapshot_reader():
+    engine = db.session.get_bind()
+    if engine.dialect.name != 'postgresql':
+        # SQLite has a single writer, a long read transaction would hold up every commit
+        yield db.session
+        return
+    with engine.connect() as connection:
+        connection.execution_options(isolation_level='REPEATABLE READ')
+        with connection.begin():
+            yield connection
+
+
+# Write a snapshot of the current database (the tenant's while one is active) to path, replacing
+# any snapshot there. progress(fraction) is called after every chunk. Returns the manifest.
+def write_snapshot(path, chunk_size=CHUNK_SIZE, progress=None):
+    # Written next to path and renamed once complete
+    partial = path + '.partial'
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+
+    with snapshot_reader() as reader:
+        total = sum(reader.execute(select(func.count(key))).scalar() for key, _ in TABLES.values()) or 1
+        done = 0
+        tables = {}
+        for table, (key, columns) in TABLES.items():
+            writer = TableWriter(partial, table, [(name, type) for name, type, _, _ in columns])
+            converters = [converter for _, _, _, converter in columns]
+            query = select(*[expression for _, _, expression, _ in columns]).order_by(key).limit(chunk_size)
+            last_id = None
+            while True:
+                chunk = reader.execute(query if last_id is None else query.where(key > last_id)).all()
+                if not chunk:
+                    break
+                writer.append([tuple(convert(value) for convert, value in zip(converters, row)) for row in chunk])
+                # The key is the first column
+                last_id = chunk[-1][0]
+                done += len(chunk)
+                if progress:
+                    progress(done / total)
+            tables[table] = writer.close()
+
+    manifest = write_manifest(
+        partial, tables,
+        created_at=datetime.utcnow().isoformat(),
+        pass_grade=current_app.config['PASS_GRADE'],
+    )
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(partial, path)
+    return manifest
@@ -0,0 +1,287 @@
+import json
+import re
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+import jwt
+from flask_restx import marshal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import selectinload, sessionmaker
+
+from .config.config import config_dict
+from .courses.views import course_catalogue_model, course_model
+from .models import Admin, ArchivedEnrollment, Course, Enrollment, Student, Term
+from .students.views import ALL_TERMS, calculate_gpa, transcript_enrollments
+from .utils.compression import compress, negotiate
+from .utils.tenancy import host_tenant
+
+# ASGI App for the read only endpoints
+#
+# Serves the courses, student transcript and GPA reads with an async
+# SQLAlchemy engine so a request waiting on the database does not hold a
+# whole worker. Writes keep going through the Flask app in runserver.py.
+#
+# Each school in TENANTS gets an async engine of its own. A request's school
+# is resolved like the Flask app does (see utils/tenancy.py): the token's
+# tenant claim, which must match the school named by the host or the
+# TENANT_HEADER when there is one.
+
+
+# Async drivers used for each sync database url
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+# Get the async database url from the config
+def async_database_uri(config):
+    uri = getattr(config, 'ASYNC_DATABASE_URI', None)
+    if uri:
+        return uri
+    return async_uri(config.SQLALCHEMY_DATABASE_URI)
+
+
+# Async database url of a tenant, its TENANTS entry is a url or engine options with a 'url'
+def tenant_database_uri(options):
+    return async_uri(options['url'] if isinstance(options, dict) else options)
+
+
+# Swap the driver of a sync database url for its async one
+def async_uri(uri):
+    scheme, _, rest = uri.partition('://')
+    scheme = scheme.split('+')[0]
+    if scheme not in ASYNC_DRIVERS:
+        raise ValueError('No async driver for database url {}'.format(uri))
+    return '{}://{}'.format(ASYNC_DRIVERS[scheme], rest)
+
+
+# Json Response helper
+# compression is (encoding, levels, minimum size) when the client accepts a compressed body
+async def send_json(send, body, status=HTTPStatus.OK, compression=None):
+    payload = json.dumps(body).encode()
+    headers = [(b'content-type', b'application/json')]
+    if compression is not None:
+        encoding, level, min_size = compression
+        headers.append((b'vary', b'Accept-Encoding'))
+        if encoding is not None and len(payload) >= min_size:
+            payload = compress(payload, encoding, level)
+            headers.append((b'content-encoding', encoding.encode()))
+    headers.append((b'content-length', str(len(payload)).encode()))
+    await send({
+        'type': 'http.response.start',
+        'status': int(status),
+        'headers': headers,
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+class AsyncReadApp:
+    '''
+    ASGI application for the read endpoints
+
+    '''
+
+    def __init__(self, config):
+        self.config = config
+        self.tenants = getattr(config, 'TENANTS', None) or {}
+        # Engines and session factories by tenant, None for the default database
+        self.engines = {}
+        self.session_factories = {}
+        self.routes = [
+            (re.compile(r'^/courses/?$'), self.get_courses),
+            (re.compile(r'^/courses/course/(\d+)$'), self.get_course),
+            (re.compile(r'^/students/student/(\d+)$'), self.get_student),
+            (re.compile(r'^/students/student/(\d+)/gpa$'), self.get_student_gpa),
+        ]
+
+    async def startup(self):
+        self.engines[None] = create_async_engine(async_database_uri(self.config))
+        for name, options in self.tenants.items():
+            self.engines[name] = create_async_engine(tenant_database_uri(options))
+        self.session_factories = {
+            name: sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            for name, engine in self.engines.items()
+        }
+
+    async def shutdown(self):
+        for engine in self.engines.values():
+            await engine.dispose()
+        self.engines, self.session_factories = {}, {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+
+        if scope['type'] != 'http':
+            return
+
+        if scope['method'] != 'GET':
+            await send_json(send, {'error': 'Method Not Allowed'}, HTTPStatus.METHOD_NOT_ALLOWED)
+            return
+
+        for pattern, handler in self.routes:
+            match = pattern.match(scope['path'])
+            if match:
+                token = self.get_token(scope)
+                if token is None:
+                    await send_json(send, {'msg': 'Missing or invalid Authorization Header'}, HTTPStatus.UNAUTHORIZED)
+                    return
+                tenant, error = self.resolve_tenant(scope, token)
+                if error:
+                    await send_json(send, *error)
+                    return
+                identity = token.get('sub')
+                query = {key: values[0] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+                async with self.session_factories[tenant]() as session:
+                    body, status = await handler(session, identity, query, *(int(arg) for arg in match.groups()))
+                await send_json(send, body, status, self.compression(scope))
+                return
+
+        await send_json(send, {'error': 'Not Found'}, HTTPStatus.NOT_FOUND)
+
+    # Compression settings for the response, None when compression is off
+    def compression(self, scope):
+        if not getattr(self.config, 'COMPRESS_ENABLED', False):
+            return None
+        headers = dict(scope.get('headers') or [])
+        encoding = negotiate(headers.get(b'accept-encoding', b'').decode('latin-1'))
+        level = {'gzip': self.config.COMPRESS_GZIP_LEVEL, 'br': self.config.COMPRESS_BROTLI_QUALITY}
+        return encoding, level, self.config.COMPRESS_MIN_SIZE
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # Decode the access token the Flask app issued, returns its claims
+    def get_token(self, scope):
+        headers = dict(scope['headers'])
+        auth = headers.get(b'authorization', b'').decode()
+        if not auth.startswith('Bearer '):
+            return None
+        try:
+            token = jwt.decode(auth[len('Bearer '):], self.config.JWT_SECRET_KEY, algorithms=['HS256'])
+        except jwt.PyJWTError:
+            return None
+        if token.get('type') != 'access':
+            return None
+        return token
+
+    # Tenant of the request, as Tenancy.resolve: the token's claim, which the host or header must not contradict
+    # Returns (tenant, None) or (None, error response)
+    def resolve_tenant(self, scope, token):
+        headers = dict(scope.get('headers') or [])
+        host = headers.get(b'host', b'').decode('latin-1')
+        tenancy = {'TENANTS': self.tenants, 'TENANT_HOSTS': getattr(self.config, 'TENANT_HOSTS', None) or {}}
+        requested = (host_tenant(host, tenancy) if host else None) \
+            or headers.get(getattr(self.config, 'TENANT_HEADER', 'X-Tenant').lower().encode(), b'').decode('latin-1') or None
+        if requested is not None and requested not in self.tenants:
+            return None, ({'message': 'Unknown school'}, HTTPStatus.NOT_FOUND)
+
+        # A token without a tenant was issued by the default database
+        claimed = token.get('tenant')
+        if requested is not None and claimed != requested:
+            return None, ({'message': 'The token was issued for another school'}, HTTPStatus.FORBIDDEN)
+        if claimed is not None and claimed not in self.tenants:
+            return None, ({'message': 'Unknown school'}, HTTPStatus.NOT_FOUND)
+        return claimed, None
+
+    # Check if the user can view the student (same rules as the Flask app)
+    async def can_view_student(self, session, identity, student_id):
+        admin = await session.scalar(select(Admin.id).filter_by(id=identity, is_active=True))
+        if admin:
+            return True
+        return identity == student_id
+
+    async def load_student(self, session, student_id):
+        return await session.scalar(select(Student).filter_by(id=student_id, deleted_at=None))
+
+    # Enrollments of the student in the ?term= term, as students.views.term_enrollments
+    # Returns (enrollments, None) or (None, error response)
+    async def load_enrollments(self, session, student_id, query):
+        value = query.get('term', 'current')
+        if value == ALL_TERMS:
+            term = ALL_TERMS
+        elif value == 'current':
+            term = await session.scalar(select(Term).filter_by(is_current=True).order_by(Term.id.desc()).limit(1))
+        elif not value.isdigit():
+            return None, ({'message': 'term must be a term id, current or all'}, HTTPStatus.BAD_REQUEST)
+        else:
+            term = await session.get(Term, int(value))
+            if term is None:
+                return None, ({'message': 'Term not found'}, HTTPStatus.NOT_FOUND)
+
+        enrollments = []
+        if term is None:
+            return enrollments, None
+        for model, archived in ((Enrollment, False), (ArchivedEnrollment, True)):
+            if term != ALL_TERMS and bool(term.archived_at) != archived:
+                continue
+            statement = select(model).filter(model.student_id == student_id)
+            if term != ALL_TERMS:
+                statement = statement.filter(model.term_id == term.id)
+            result = await session.scalars(statement.options(selectinload(model.course)).order_by(model.term_id, model.id))
+            enrollments.extend(result.all())
+        return enrollments, None
+
+    async def get_courses(self, session, identity, query):
+        result = await session.scalars(select(Course).filter_by(deleted_at=None))
+        return marshal(result.all(), course_catalogue_model), HTTPStatus.OK
+
+    async def get_course(self, session, identity, query, course_id):
+        course = await session.scalar(
+            select(Course).filter_by(id=course_id, deleted_at=None).options(selectinload(Course.students))
+        )
+        if not course:
+            return {'error': 'Not Found'}, HTTPStatus.NOT_FOUND
+        return marshal(course, course_model), HTTPStatus.OK
+
+    async def get_student(self, session, identity, query, student_id):
+        student = await self.load_student(session, student_id)
+        if not student:
+            return {'message': 'Student not found'}, HTTPStatus.NOT_FOUND
+
+        if not await self.can_view_student(session, identity, student_id):
+            return {'message': 'You can\'t View this student'}, HTTPStatus.UNAUTHORIZED
+
+        enrollments, error = await self.load_enrollments(session, student_id, query)
+        if error:
+            return error
+
+        response = {
+            'full_name': student.full_name,
+            'email': student.email,
+            'enrollments': transcript_enrollments(student, enrollments),
+            'gpa': calculate_gpa(student, enrollments)
+        }
+        return response, HTTPStatus.OK
+
+    async def get_student_gpa(self, session, identity, query, student_id):
+        student = await self.load_student(session, student_id)
+        if not student:
+            return {'message': 'Student not found'}, HTTPStatus.NOT_FOUND
+
+        if not await self.can_view_student(session, identity, student_id):
+            return {'message': 'You can\'t View this student'}, HTTPStatus.UNAUTHORIZED
+
+        enrollments, error = await self.load_enrollments(session, student_id, query)
+        if error:
+            return error
+
+        return {'id': student.id, 'gpa': calculate_gpa(student, enrollments)}, HTTPStatus.OK
+
+
+# ASGI App Factory
+def create_asgi_app(config=config_dict['prod']):
+    if isinstance(config, str):
+        config = config_dict[config]
+    return AsyncReadApp(config)
@@ -0,0 +1,74 @@
+from flask import request
+from flask_restx import Namespace, Resource, fields
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from http import HTTPStatus
+from ..models import Admin, GradeAudit
+
+# Audit Endpoint
+
+# Largest page of audit rows
+MAX_AUDIT_LIMIT = 500
+
+# Audit Namespace
+audit_namespace = Namespace('audit', description='Grade change history')
+
+# Grade Audit Model
+grade_audit_model = audit_namespace.model('GradeAudit', {
+    'id': fields.Integer(description='Audit row id'),
+    'enrollment_id': fields.Integer(description='Enrollment whose grade changed'),
+    'student_id': fields.Integer(description='Student id'),
+    'course_id': fields.Integer(description='Course id'),
+    'term_id': fields.Integer(description='Term of the enrollment'),
+    'actor_id': fields.Integer(description='Admin who made the change, empty for system changes'),
+    'old_grade': fields.Float(description='Grade before the change, empty for the first grade'),
+    'new_grade': fields.Float(description='Grade after the change'),
+    'changed_at': fields.DateTime(),
+})
+
+# Grade Audit Page Model
+grade_audit_page_model = audit_namespace.model('GradeAuditPage', {
+    'changes': fields.List(fields.Nested(grade_audit_model)),
+    'cursor': fields.Integer(description='Pass as ?before= for the next (older) page, empty on the last page'),
+})
+
+
+# Grade changes, newest first, admin only
+@audit_namespace.route('/grades')
+class GradeAuditList(Resource):
+    @audit_namespace.doc('get_grade_audit', params={
+        'enrollment_id': 'Only changes of this enrollment',
+        'student_id': 'Only changes of this student',
+        'course_id': 'Only changes in this course',
+        'term_id': 'Only changes in this term',
+        'actor_id': 'Only changes made by this admin',
+        'before': 'Only changes older than this audit row id',
+        'limit': 'Page size (default 100, at most {})'.format(MAX_AUDIT_LIMIT),
+    })
+    @audit_namespace.marshal_with(grade_audit_page_model)
+    @jwt_required()
+    def get(self):
+        '''
+        Get the grade change history
+            by admin only
+        '''
+        admin = Admin.query.filter_by(id=get_jwt_identity(), is_active=True).first()
+        if not admin:
+            audit_namespace.abort(HTTPStatus.UNAUTHORIZED, 'You are not authorized to perform this action')
+
+        limit = min(max(request.args.get('limit', 100, type=int), 1), MAX_AUDIT_LIMIT)
+        query = GradeAudit.query
+        for name in ('enrollment_id', 'student_id', 'course_id', 'term_id', 'actor_id'):
+            value = request.args.get(name, type=int)
+            if value is not None:
+                query = query.filter(getattr(GradeAudit, name) == value)
+        before = request.args.get('before', type=int)
+        if before is not None:
+            query = query.filter(GradeAudit.id < before)
+
+        changes = query.order_by(GradeAudit.id.desc()).limit(limit + 1).all()
+        page = changes[:limit]
+        response = {
+            'changes': page,
+            'cursor': page[-1].id if len(changes) > limit else None,
+        }
+        return response, HTTPStatus.OK
@@ -4,7 +4,7 @@ from ..utils import db
 from ..models import Student, Admin
 from werkzeug.security import generate_password_hash, check_password_hash
 from http import HTTPStatus
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt, get_jwt_identity
 
 #  Auth Endpoints
 
@@ -54,11 +54,11 @@ class Login(Resource):
     @auth_namespace.expect(login_model)
     def post(self):
         data = request.get_json()
-        user = Student.query.filter_by(email=data['email']).first()
+        user = Student.query.filter_by(email=data['email'], deleted_at=None).first()
         if not user or not check_password_hash(user.password_hash, data['password']):
             return {'message': 'Invalid credentials'}, HTTPStatus.UNAUTHORIZED
-        access_token = create_access_token(identity=user.id)
-        refresh_token = create_refresh_token(identity=user.id)
+        access_token = create_access_token(identity=user.id, additional_claims={'role': 'student'})
+        refresh_token = create_refresh_token(identity=user.id, additional_claims={'role': 'student'})
         return {
             'message': 'Logged in as {}'.format(user.full_name),
             'access_token': access_token,
@@ -75,8 +75,8 @@ class LoginAdmin(Resource):
         user = Admin.query.filter_by(username=data['username']).first()
         if not user or not check_password_hash(user.password, data['password']):
             return {'message': 'Invalid credentials'}, HTTPStatus.UNAUTHORIZED
-        access_token = create_access_token(identity=user.id)
-        refresh_token = create_refresh_token(identity=user.id)
+        access_token = create_access_token(identity=user.id, additional_claims={'role': 'admin'})
+        refresh_token = create_refresh_token(identity=user.id, additional_claims={'role': 'admin'})
         return {
             'message': 'Logged in as {}'.format(user.username),
             'access_token': access_token,
@@ -89,7 +89,9 @@ class Refresh(Resource):
     @jwt_required(refresh=True)
     def post(self):
         current_user = get_jwt_identity()
-        new_token = create_access_token(identity=current_user)
+        # Tokens carry the role they were issued for, admin or student
+        role = get_jwt().get('role')
+        new_token = create_access_token(identity=current_user, additional_claims={'role': role} if role else None)
         return {'access_token': new_token}, HTTPStatus.OK
     
 
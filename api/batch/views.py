@@ -0,0 +1,124 @@
+from flask import current_app, g, request
+from flask.globals import app_ctx
+from flask_restx import Namespace, Resource, fields
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+from flask_jwt_extended import jwt_required
+from http import HTTPStatus
+from ..utils import db
+
+# Batch Endpoint
+
+# Batch Namespace
+batch_namespace = Namespace('batch', description='Run several API calls in one request')
+
+# Largest number of sub-requests in one batch
+MAX_BATCH_REQUESTS = 20
+
+# Sub-request Model
+sub_request_model = batch_namespace.model('SubRequest', {
+    'method': fields.String(required=True, description='HTTP method', enum=['GET', 'POST', 'PUT', 'DELETE']),
+    'path': fields.String(required=True, description='Path of the call, e.g. /students/student/1'),
+    'body': fields.Raw(description='JSON body of the call'),
+})
+
+# Batch Model
+batch_model = batch_namespace.model('Batch', {
+    'requests': fields.List(fields.Nested(sub_request_model), required=True),
+    'atomic': fields.Boolean(default=False, description='Commit all calls together or none of them'),
+})
+
+
+# Run one sub-request through the app inside the current app context,
+# so it shares the db session of the batch request. It gets a g of its own,
+# holding the batch's already verified token, and the batch's host and
+# tenant header, so it resolves the same school.
+def dispatch(sub_request, verified_jwt):
+    config = current_app.config
+    headers = {'Authorization': request.headers.get('Authorization', '')}
+    if config['TENANT_HEADER'] in request.headers:
+        headers[config['TENANT_HEADER']] = request.headers[config['TENANT_HEADER']]
+    builder = EnvironBuilder(
+        path=sub_request['path'],
+        base_url=request.host_url,
+        method=sub_request['method'].upper(),
+        json=sub_request.get('body'),
+        headers=headers,
+    )
+    context = app_ctx._get_current_object()
+    batch_g = context.g
+    context.g = current_app.app_ctx_globals_class()
+    context.g.verified_jwt = verified_jwt
+    try:
+        with current_app.request_context(builder.get_environ()):
+            response = current_app.full_dispatch_request()
+    finally:
+        context.g = batch_g
+    body = response.get_json(silent=True)
+    if body is None:
+        body = response.get_data(as_text=True)
+    return {'status': response.status_code, 'body': body}
+
+
+# Whether a sub-request can run in a batch
+# Resources set batchable = False when they can't: the batch endpoint itself,
+# and the event streams, which would hold the batch and its thread until they end.
+def is_batchable(sub_request):
+    adapter = current_app.create_url_adapter(request)
+    try:
+        endpoint, _ = adapter.match(sub_request['path'].split('?', 1)[0], method=sub_request['method'].upper())
+    except HTTPException:
+        # Dispatched to get the app's own error response
+        return True
+    resource = getattr(current_app.view_functions[endpoint], 'view_class', None)
+    return getattr(resource, 'batchable', True)
+
+
+@batch_namespace.route('/')
+class Batch(Resource):
+    batchable = False
+
+    @batch_namespace.doc('run_batch')
+    @batch_namespace.expect(batch_model)
+    @jwt_required()
+    def post(self):
+        '''
+        Run several API calls in one request
+            in order, with the caller's token. With atomic they run in one
+            transaction that is rolled back at the first failing call
+        '''
+        data = batch_namespace.payload
+        sub_requests = data['requests']
+        atomic = data.get('atomic', False)
+
+        if len(sub_requests) > MAX_BATCH_REQUESTS:
+            return {'message': 'At most {} requests per batch'.format(MAX_BATCH_REQUESTS)}, HTTPStatus.BAD_REQUEST
+
+        # Checked once by jwt_required, the sub-requests reuse the claims
+        verified_jwt = g.verified_jwt
+
+        session = db.session()
+        session.info['defer_commit'] = atomic
+        results = []
+        try:
+            for sub_request in sub_requests:
+                if is_batchable(sub_request):
+                    result = dispatch(sub_request, verified_jwt)
+                else:
+                    result = {'status': int(HTTPStatus.BAD_REQUEST), 'body': {'message': 'This call can not run in a batch'}}
+                results.append(result)
+                if result['status'] >= 400 and atomic:
+                    break
+                if result['status'] >= 500:
+                    db.session.rollback()
+        finally:
+            session.info.pop('defer_commit', None)
+
+        committed = not atomic or all(result['status'] < 400 for result in results)
+        if atomic and committed:
+            db.session.commit()
+        elif atomic:
+            db.session.rollback()
+
+        response = {'results': results, 'committed': committed}
+        return response, HTTPStatus.OK if committed else HTTPStatus.CONFLICT
@@ -0,0 +1,442 @@
+import click
+import csv
+import functools
+import itertools
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from flask import current_app
+from flask_migrate import upgrade
+from sqlalchemy import func, insert, inspect, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+from .models import Admin, ArchivedEnrollment, Course, Enrollment, Student, Term, enrollment_table
+from .utils import db
+from .utils.partitions import create_term_partition, drop_term_partition
+from .utils.tenancy import current_tenant, tenant_context
+
+# Cli Commands
+#
+# Defined once at import so create_app only has to register them
+
+
+# Cli Function to create an admin
+def create_admin(username, password):
+    user = Admin(username=username, password=generate_password_hash(password), is_active=False)
+    user.save()
+
+# Cli Function to delete an admin
+def delete_admin(username):
+    user = Admin.query.filter_by(username=username).first()
+    if user:
+        user.delete()
+
+# Cli Function to activate an admin
+def activate_admin(username):
+    user = Admin.query.filter_by(username=username).first()
+    if user:
+        user.is_active = True
+        user.save()
+
+# Cli Function to deactivate an admin
+def deactivate_admin(username):
+    user = Admin.query.filter_by(username=username).first()
+    if user:
+        user.is_active = False
+        user.save()
+
+# Cli Function to find (and fix) course counters that drifted from the enrollments table
+# Returns a list of (course id, counter, stored value, actual value). The fix is one
+# UPDATE counting the enrollments in the same statement, so enrollments written
+# while it runs aren't overwritten by a stale count. Seats are the current term's.
+def reconcile_course_counters(fix=False):
+    term = Term.current()
+    enrolled = select(func.count(Enrollment.id)).where(
+        Enrollment.course_id == Course.id, Enrollment.term_id == (term.id if term else None)).scalar_subquery()
+    graded = select(func.count(Enrollment.grade)).where(Enrollment.course_id == Course.id).scalar_subquery()
+
+    drift = []
+    rows = db.session.query(Course.id, Course.enrollment_count, enrolled, Course.graded_count, graded).order_by(Course.id)
+    for course_id, enrollment_count, actual_enrolled, graded_count, actual_graded in rows:
+        if enrollment_count != actual_enrolled:
+            drift.append((course_id, 'enrollment_count', enrollment_count, actual_enrolled))
+        if graded_count != actual_graded:
+            drift.append((course_id, 'graded_count', graded_count, actual_graded))
+
+    if fix and drift:
+        db.session.execute(
+            update(Course)
+            .where(or_(Course.enrollment_count != enrolled, Course.graded_count != graded))
+            .values(enrollment_count=enrolled, graded_count=graded)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    return drift
+
+# Cli Function to create a term (and its enrollments partition), optionally making it the current one
+# Course seat counters are the current term's, so they are counted again for a new current term.
+def create_term(name, starts_on=None, ends_on=None, current=False):
+    if current:
+        Term.query.filter_by(is_current=True).update({'is_current': False})
+    term = Term(name=name, starts_on=starts_on, ends_on=ends_on, is_current=current)
+    db.session.add(term)
+    db.session.flush()
+    if current:
+        Course.recount_seats(term.id)
+    create_term_partition(term.id)
+    db.session.commit()
+    return term
+
+# Cli Function to move the enrollments of a closed term to enrollments_archive
+# Rows are moved chunk_size at a time, one transaction each. Returns how many were moved.
+def archive_term(term_id, chunk_size=500):
+    term = db.session.get(Term, term_id)
+    if term is None:
+        raise click.ClickException('Term {} not found'.format(term_id))
+    if term.is_current:
+        raise click.ClickException('The current term can\'t be archived')
+
+    columns = [Enrollment.student_id, Enrollment.course_id, Enrollment.term_id, Enrollment.grade]
+    moved = 0
+    while True:
+        rows = (
+            db.session.query(Enrollment.id, *columns)
+            .filter(Enrollment.term_id == term.id)
+            .order_by(Enrollment.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+        db.session.execute(insert(ArchivedEnrollment.__table__).from_select(
+            [column.name for column in columns], select(*columns).where(Enrollment.id.in_(ids)).order_by(Enrollment.id)
+        ))
+        db.session.execute(Enrollment.__table__.delete().where(Enrollment.id.in_(ids)))
+
+        # Keep the course rosters for pairs still enrolled in another term
+        pairs = {(row.student_id, row.course_id) for row in rows}
+        pairs -= set(db.session.query(Enrollment.student_id, Enrollment.course_id).filter(
+            tuple_(Enrollment.student_id, Enrollment.course_id).in_(pairs)))
+        if pairs:
+            db.session.execute(enrollment_table.delete().where(
+                tuple_(enrollment_table.c.student_id, enrollment_table.c.course_id).in_(pairs)))
+
+        # The moved rows leave the graded counters in the same transaction (seats
+        # are the current term's and an archived term is never current)
+        graded = Counter(row.course_id for row in rows if row.grade is not None)
+        for course_id in {row.course_id for row in rows}:
+            Course.grades_changed(course_id, graded=-graded[course_id])
+        moved += len(rows)
+        db.session.commit()
+
+    term.archived_at = datetime.utcnow()
+    drop_term_partition(term.id)
+    db.session.commit()
+    return moved
+
+# Columns of the student import CSV
+IMPORT_COLUMNS = ('full_name', 'email', 'password')
+
+# Cli Function to import students from a CSV file with full_name, email and password columns
+# The file is read chunk_size rows at a time. Passwords are hashed on a pool of
+# workers processes (in this process with workers=0), emails already taken are
+# found with one query per chunk, and each chunk is one bulk insert and commit.
+# Rejected rows go to error_path with their line number and reason.
+# Returns the counts and the rows per second.
+def import_students(path, error_path, chunk_size=1000, workers=None):
+    started = time.perf_counter()
+    counts = {'rows': 0, 'imported': 0, 'failed': 0}
+    seen = set()
+    executor = None
+    if workers != 0:
+        workers = workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+
+    # Hashing is the slow part of an import, each worker gets a few batches per chunk
+    def hash_passwords(passwords):
+        if executor is None:
+            return map(generate_password_hash, passwords)
+        return executor.map(generate_password_hash, passwords, chunksize=max(len(passwords) // (4 * workers), 1))
+
+    with open(path, newline='') as file, open(error_path, 'w', newline='') as error_file:
+        errors = csv.writer(error_file)
+        errors.writerow(['line', 'email', 'error'])
+        reader = csv.DictReader(file)
+        missing = [column for column in IMPORT_COLUMNS if column not in (reader.fieldnames or ())]
+        if missing:
+            raise click.UsageError('{} is missing the columns {}'.format(path, ', '.join(missing)))
+
+        try:
+            # Line numbers count the header as line 1
+            rows = ((reader.line_num, row) for row in reader)
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                counts['rows'] += len(chunk)
+
+                valid, rejected = [], []
+                for line, row in chunk:
+                    full_name, email, password = ((row.get(column) or '').strip() for column in IMPORT_COLUMNS)
+                    error = None
+                    if not full_name or not email or not password:
+                        error = 'full_name, email and password are required'
+                    elif '@' not in email:
+                        error = 'Invalid email'
+                    elif email in seen:
+                        error = 'Duplicate email in the file'
+                    if error:
+                        rejected.append((line, email, error))
+                    else:
+                        seen.add(email)
+                        valid.append((line, full_name, email, password))
+
+                taken = {email for email, in db.session.query(Student.email).filter(
+                    Student.email.in_([email for _, _, email, _ in valid]))}
+                for line, _, email, _ in valid:
+                    if email in taken:
+                        rejected.append((line, email, 'Email already registered'))
+                errors.writerows(sorted(rejected))
+                valid = [row for row in valid if row[2] not in taken]
+
+                hashes = hash_passwords([password for _, _, _, password in valid])
+                students = [
+                    {'full_name': full_name, 'email': email, 'password_hash': password_hash, 'is_admin': False}
+                    for (_, full_name, email, _), password_hash in zip(valid, hashes)
+                ]
+                if students:
+                    try:
+                        db.session.execute(insert(Student), students)
+                        db.session.commit()
+                    except IntegrityError:
+                        # Someone registered one of the emails since the check, insert the rest one at a time
+                        db.session.rollback()
+                        students = insert_one_by_one(students, valid, errors)
+                counts['imported'] += len(students)
+        finally:
+            if executor:
+                executor.shutdown()
+
+    counts['failed'] = counts['rows'] - counts['imported']
+    counts['seconds'] = time.perf_counter() - started
+    counts['rows_per_second'] = counts['rows'] / counts['seconds'] if counts['seconds'] else 0.0
+    return counts
+
+
+# Insert students one per savepoint, writing the rejected ones to errors, returns the inserted ones
+def insert_one_by_one(students, rows, errors):
+    inserted = []
+    for student, (line, _, email, _) in zip(students, rows):
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Student), [student])
+            inserted.append(student)
+        except IntegrityError:
+            errors.writerow([line, email, 'Email already registered'])
+    db.session.commit()
+    return inserted
+
+
+# Fail with a usage error unless name is in TENANTS
+def check_tenant(name):
+    if name not in current_app.config['TENANTS']:
+        raise click.BadParameter('{} is not in TENANTS'.format(name), param_hint='tenant')
+
+# Cli Function to create a school's database schema, the database must be empty
+def create_tenant(name):
+    check_tenant(name)
+    with tenant_context(name):
+        if inspect(db.session.get_bind()).get_table_names():
+            raise click.UsageError('The database of {} is not empty, use migrate-tenant-command'.format(name))
+        upgrade()
+
+# Cli Function to run the pending migrations on a school's database
+def migrate_tenant(name):
+    check_tenant(name)
+    with tenant_context(name):
+        upgrade()
+
+# Adds --tenant to a command, which then runs against that school's database
+def tenant_option(command):
+    @click.option('--tenant', help='The school to run against, the default database when not given')
+    @functools.wraps(command)
+    def wrapper(*args, tenant=None, **kwargs):
+        if tenant is None:
+            return command(*args, **kwargs)
+        check_tenant(tenant)
+        with tenant_context(tenant):
+            return command(*args, **kwargs)
+    return wrapper
+
+
+# Create Admin
+@click.command()
+@tenant_option
+@click.option('--username', prompt=True, help='The admin username')
+@click.option('--password', prompt=True, hide_input=True, confirmation_prompt=True, help='The admin password')
+def create_admin_command(username, password):
+    create_admin(username, password)
+    click.echo('Admin created!')
+
+# Delete Admin
+@click.command()
+@tenant_option
+@click.option('--username', prompt=True, help='The admin username')
+def delete_admin_command(username):
+    delete_admin(username)
+    click.echo('Admin deleted!')
+
+# Activate Admin
+@click.command()
+@tenant_option
+@click.option('--username', prompt=True, help='The admin username')
+def activate_admin_command(username):
+    activate_admin(username)
+    click.echo('Admin activated!')
+
+# Deactivate Admin
+@click.command()
+@tenant_option
+@click.option('--username', prompt=True, help='The admin username')
+def deactivate_admin_command(username):
+    deactivate_admin(username)
+    click.echo('Admin deactivated!')
+
+# Reconcile Course Counters
+@click.command()
+@tenant_option
+@click.option('--fix', is_flag=True, help='Overwrite the counters that drifted')
+def reconcile_course_counters_command(fix):
+    drift = reconcile_course_counters(fix)
+    for course_id, counter, stored, actual in drift:
+        click.echo('Course {}: {} is {}, enrollments say {}'.format(course_id, counter, stored, actual))
+    if not drift:
+        click.echo('Course counters are in sync!')
+    elif fix:
+        click.echo('Course counters fixed!')
+
+# Create Term
+@click.command()
+@tenant_option
+@click.option('--name', prompt=True, help='The term name, for example 2026-fall')
+@click.option('--starts-on', type=click.DateTime(formats=['%Y-%m-%d']), help='First day of the term')
+@click.option('--ends-on', type=click.DateTime(formats=['%Y-%m-%d']), help='Last day of the term')
+@click.option('--current', is_flag=True, help='Make it the term new enrollments go to')
+def create_term_command(name, starts_on, ends_on, current):
+    term = create_term(name, starts_on and starts_on.date(), ends_on and ends_on.date(), current)
+    click.echo('Term {} created!'.format(term.id))
+
+# Archive Term
+@click.command()
+@tenant_option
+@click.option('--term-id', type=int, prompt=True, help='The closed term to archive')
+@click.option('--chunk-size', default=500, show_default=True, help='Enrollments moved per transaction')
+def archive_term_command(term_id, chunk_size):
+    moved = archive_term(term_id, chunk_size)
+    click.echo('Archived {} enrollments!'.format(moved))
+
+# Import Students
+@click.command()
+@tenant_option
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--errors', 'error_path', type=click.Path(dir_okay=False), help='Rejected rows file, <path>.errors.csv by default')
+@click.option('--chunk-size', default=1000, show_default=True, help='Rows inserted per transaction')
+@click.option('--workers', type=int, help='Password hashing processes, one per CPU by default, 0 to hash in this process')
+def import_students_command(path, error_path, chunk_size, workers):
+    error_path = error_path or path + '.errors.csv'
+    counts = import_students(path, error_path, chunk_size, workers)
+    click.echo('Imported {imported} of {rows} students in {seconds:.1f}s ({rows_per_second:.0f} rows/s)'.format(**counts))
+    if counts['failed']:
+        click.echo('{} rows rejected, see {}'.format(counts['failed'], error_path))
+
+# Export Snapshot
+@click.command()
+@tenant_option
+@click.option('--output', type=click.Path(file_okay=False), help='Snapshot directory, EXPORT_DIR/snapshot-<time> by default')
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows read per query')
+def export_snapshot_command(output, chunk_size):
+    from .analytics.snapshot import snapshot_path, write_snapshot
+
+    output = output or snapshot_path()
+    manifest = write_snapshot(output, chunk_size)
+    rows = ', '.join('{} {}'.format(entry['rows'], table) for table, entry in manifest['tables'].items())
+    click.echo('Snapshot of {} written to {}!'.format(rows, output))
+
+# Run Jobs
+@click.command()
+@tenant_option
+@click.option('--workers', default=2, show_default=True, help='Worker processes')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to wait when the queue is empty')
+@click.option('--once', is_flag=True, help='Run the queued jobs in this process and exit')
+def run_jobs_command(workers, poll_interval, once):
+    from .jobs.worker import run_pending, start_workers
+
+    if once:
+        click.echo('Ran {} jobs!'.format(run_pending()))
+        return
+
+    processes = start_workers(current_app._get_current_object(), workers, poll_interval, current_tenant())
+    click.echo('Started {} job workers, press Ctrl+C to stop'.format(len(processes)))
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+# Dispatch Outbox
+@click.command()
+@tenant_option
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to wait when there is nothing to send')
+@click.option('--batch-size', type=int, help='Events per round, OUTBOX_BATCH_SIZE by default')
+@click.option('--once', is_flag=True, help='Run one round and exit')
+def dispatch_outbox_command(poll_interval, batch_size, once):
+    from .outbox.dispatcher import dispatch, run_dispatcher
+
+    if once:
+        sequenced, delivered = dispatch(batch_size)
+        click.echo('Sequenced {} and delivered {} events!'.format(sequenced, delivered))
+        return
+
+    click.echo('Dispatching outbox events, press Ctrl+C to stop')
+    try:
+        run_dispatcher(poll_interval, batch_size)
+    except KeyboardInterrupt:
+        pass
+
+# Create Tenant
+@click.command()
+@click.argument('name')
+def create_tenant_command(name):
+    create_tenant(name)
+    click.echo('Tenant {} created!'.format(name))
+
+# Migrate Tenants
+@click.command()
+@click.argument('names', nargs=-1)
+def migrate_tenant_command(names):
+    for name in names or current_app.config['TENANTS']:
+        migrate_tenant(name)
+        click.echo('Tenant {} migrated!'.format(name))
+
+
+# All commands registered by create_app
+commands = [
+    activate_admin_command,
+    deactivate_admin_command,
+    delete_admin_command,
+    create_admin_command,
+    import_students_command,
+    reconcile_course_counters_command,
+    create_term_command,
+    archive_term_command,
+    export_snapshot_command,
+    run_jobs_command,
+    dispatch_outbox_command,
+    create_tenant_command,
+    migrate_tenant_command,
+]
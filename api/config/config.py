@@ -1,6 +1,8 @@
+import json
 import os
 import re
-from decouple import config
+import tempfile
+from decouple import config, Csv
 from datetime import timedelta
 
 # Main Config
@@ -19,10 +21,89 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=30)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(minutes=30)
     JWT_SECRET_KEY = config('JWT_SECRET_KEY')
+    # Async database url for asgi.py, derived from SQLALCHEMY_DATABASE_URI when not set
+    ASYNC_DATABASE_URI = config('ASYNC_DATABASE_URL', None)
+    # Comma separated Flask Restx namespaces to mount, all of them when empty
+    API_NAMESPACES = config('API_NAMESPACES', '', cast=Csv())
+    # Lowest passing grade
+    PASS_GRADE = config('PASS_GRADE', 1.0, cast=float)
+    # Seconds without a heartbeat before a running job is picked up by another worker
+    JOB_HEARTBEAT_TIMEOUT = config('JOB_HEARTBEAT_TIMEOUT', 600, cast=int)
+    # Directory for export job files
+    EXPORT_DIR = config('EXPORT_DIR', os.path.join(BASE_DIR, 'exports'))
+    # Comma separated urls the outbox dispatcher posts change events to
+    OUTBOX_WEBHOOK_URLS = config('OUTBOX_WEBHOOK_URLS', '', cast=Csv())
+    # Signs webhook bodies (X-Outbox-Signature, hex HMAC-SHA256) when set
+    OUTBOX_WEBHOOK_SECRET = config('OUTBOX_WEBHOOK_SECRET', None)
+    OUTBOX_WEBHOOK_TIMEOUT = config('OUTBOX_WEBHOOK_TIMEOUT', 10, cast=float)
+    # Events sequenced and delivered per dispatcher round
+    OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', 100, cast=int)
+    # Live streams: events buffered per subscriber, streams per process, seconds between keep-alives and per stream
+    # Every stream holds a gunicorn thread, keep LIVE_MAX_SUBSCRIBERS below GUNICORN_THREADS
+    LIVE_QUEUE_SIZE = config('LIVE_QUEUE_SIZE', 100, cast=int)
+    LIVE_MAX_SUBSCRIBERS = config('LIVE_MAX_SUBSCRIBERS', 24, cast=int)
+    LIVE_KEEPALIVE_SECONDS = config('LIVE_KEEPALIVE_SECONDS', 15, cast=float)
+    LIVE_STREAM_SECONDS = config('LIVE_STREAM_SECONDS', 300, cast=float)
+    # Seconds between polls of the change feed for other processes' writes, off when 0
+    LIVE_FEED_POLL_INTERVAL = config('LIVE_FEED_POLL_INTERVAL', 0, cast=float)
+    # Rate limits by route rule, namespace or 'default' as '<requests>/<period>', an empty limit turns it off.
+    # RATELIMIT_RULES in the environment is a JSON object merged over these.
+    RATELIMIT_ENABLED = config('RATELIMIT_ENABLED', True, cast=bool)
+    # Proxies (load balancers) in front of the app whose X-Forwarded-For, -Proto and -Host are trusted,
+    # 0 when clients connect directly. Per-IP rate limits need it behind a proxy.
+    PROXY_FIX_HOPS = config('PROXY_FIX_HOPS', 0, cast=int)
+    RATELIMIT_STORAGE = config('RATELIMIT_STORAGE', os.path.join(tempfile.gettempdir(), 'school-api-ratelimit.sqlite3'))
+    RATELIMIT_RULES = dict({
+        'default': '600/minute',
+        'auth': '20/minute',
+        '/enrollments/enroll/<int:student_id>/<int:course_id>': '30/minute',
+        '/enrollments/unenroll/<int:student_id>/<int:course_id>': '30/minute',
+        '/healthz': '',
+        '/readyz': '',
+    }, **config('RATELIMIT_RULES', '{}', cast=json.loads))
+    # Response compression: bodies under COMPRESS_MIN_SIZE bytes are sent as they are,
+    # the compressed bodies of the COMPRESS_CACHE_RULES routes are cached per worker
+    COMPRESS_ENABLED = config('COMPRESS_ENABLED', True, cast=bool)
+    COMPRESS_MIN_SIZE = config('COMPRESS_MIN_SIZE', 1024, cast=int)
+    COMPRESS_GZIP_LEVEL = config('COMPRESS_GZIP_LEVEL', 6, cast=int)
+    COMPRESS_BROTLI_QUALITY = config('COMPRESS_BROTLI_QUALITY', 5, cast=int)
+    COMPRESS_MIMETYPES = config('COMPRESS_MIMETYPES', 'application/json,text/csv,text/plain,text/html', cast=Csv())
+    COMPRESS_CACHE_RULES = config('COMPRESS_CACHE_RULES', '/courses/,/courses/stats', cast=Csv())
+    COMPRESS_CACHE_SIZE = config('COMPRESS_CACHE_SIZE', 64, cast=int)
+    # Request profiling: the share of requests profiled, the header an admin sends to profile a request,
+    # where the profiles go and how many are kept
+    PROFILE_ENABLED = config('PROFILE_ENABLED', False, cast=bool)
+    PROFILE_SAMPLE_RATE = config('PROFILE_SAMPLE_RATE', 0.0, cast=float)
+    PROFILE_HEADER = config('PROFILE_HEADER', 'X-Profile')
+    PROFILE_DIR = config('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'school-api-profiles'))
+    PROFILE_KEEP = config('PROFILE_KEEP', 100, cast=int)
+    # Slow query log (per worker, off unless enabled): statements slower than the threshold are kept by
+    # fingerprint with their plan, captured again every SLOW_QUERY_EXPLAIN_INTERVAL seconds they stay slow;
+    # a share of the slow SELECTs on Postgres gets EXPLAIN ANALYZE instead of EXPLAIN
+    SLOW_QUERY_ENABLED = config('SLOW_QUERY_ENABLED', False, cast=bool)
+    SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', 100, cast=float)
+    SLOW_QUERY_ANALYZE_RATE = config('SLOW_QUERY_ANALYZE_RATE', 0.1, cast=float)
+    SLOW_QUERY_MAX_FINGERPRINTS = config('SLOW_QUERY_MAX_FINGERPRINTS', 500, cast=int)
+    SLOW_QUERY_EXPLAIN_INTERVAL = config('SLOW_QUERY_EXPLAIN_INTERVAL', 300, cast=float)
+    # Readiness: seconds a probe result is reused, the slowest acceptable database round trip,
+    # the pool share in use from which a worker is not ready, and whether the Alembic version must be the head
+    READY_CACHE_SECONDS = config('READY_CACHE_SECONDS', 2, cast=float)
+    READY_DB_LATENCY_MS = config('READY_DB_LATENCY_MS', 500, cast=float)
+    READY_POOL_SATURATION = config('READY_POOL_SATURATION', 0.9, cast=float)
+    READY_CHECK_MIGRATIONS = config('READY_CHECK_MIGRATIONS', True, cast=bool)
+    # Schools with a database of their own, a JSON object of name -> database url (or Flask-SQLAlchemy
+    # engine options with a 'url'). A request's school comes from its token, its host (TENANT_HOSTS, a JSON
+    # object of host name -> school, or the first label of the host name) or the TENANT_HEADER
+    TENANTS = config('TENANTS', '{}', cast=json.loads)
+    TENANT_HOSTS = config('TENANT_HOSTS', '{}', cast=json.loads)
+    TENANT_HEADER = config('TENANT_HEADER', 'X-Tenant')
+    # /readyz fails while this file exists (when set), touch it before stopping the server so the load balancer drains it
+    DRAIN_FILE = config('DRAIN_FILE', '')
 
 # Config for Development
 class DevConfig(Config):
     DEBUG = True
+    SLOW_QUERY_ENABLED = config('SLOW_QUERY_ENABLED', True, cast=bool)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///'+os.path.join(BASE_DIR, 'db.sqlite3')
@@ -33,6 +114,8 @@ class TestConfig(Config):
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = True
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    # Buckets per app instance, so tests do not share them
+    RATELIMIT_STORAGE = ':memory:'
 
 
 # Config for Production
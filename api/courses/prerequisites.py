@@ -0,0 +1,119 @@
+import weakref
+from flask import current_app
+from sqlalchemy import or_, select, union
+from ..models import ArchivedEnrollment, CacheVersion, CoursePrerequisite, Enrollment
+from ..utils import db
+
+# Course Prerequisites
+#
+# The prerequisite graph is small and read on every enrolment, so each process
+# keeps its transitive closure (course -> every course needed before it) in
+# memory. The closure is rebuilt from one query of the edges whenever the
+# 'prerequisites' cache version, bumped by every prerequisite edit, moves on.
+# Checking a student then takes two queries whatever the depth of the chain:
+# the version, and the student's passed courses among the required ones.
+
+CACHE_NAME = 'prerequisites'
+
+# engine -> (version, {course id: frozenset of prerequisite ids})
+_caches = weakref.WeakKeyDictionary()
+
+
+# Transitive closure of a {course: direct prerequisites} graph
+def transitive_closure(graph):
+    closure = {}
+
+    def visit(course_id, path):
+        if course_id in closure:
+            return closure[course_id]
+        needed = set()
+        for prerequisite_id in graph.get(course_id, ()):
+            # Cycles are refused when edges are saved, skip any that got in another way
+            if prerequisite_id in path:
+                continue
+            needed.add(prerequisite_id)
+            needed |= visit(prerequisite_id, path | {prerequisite_id})
+        closure[course_id] = frozenset(needed)
+        return closure[course_id]
+
+    for course_id in graph:
+        visit(course_id, frozenset([course_id]))
+    return closure
+
+
+# Transitive closure of the prerequisite edges in the database
+def load_closure():
+    graph = {}
+    for course_id, prerequisite_id in db.session.query(CoursePrerequisite.course_id, CoursePrerequisite.prerequisite_id):
+        graph.setdefault(course_id, set()).add(prerequisite_id)
+    return transitive_closure(graph)
+
+
+# Closure of the current prerequisite graph, from the cache while its version holds
+def prerequisite_closure():
+    engine = db.session.get_bind()
+    version = CacheVersion.get(CACHE_NAME)
+    cached = _caches.get(engine)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    closure = load_closure()
+    _caches[engine] = (version, closure)
+    return closure
+
+
+# Whether making prerequisite_ids the prerequisites of course_id would close a cycle
+# Bumps the cache version first: its row stays locked until the transaction ends, so
+# concurrent edits (say A -> B and B -> A) are checked one after the other, each
+# against the edges the other committed. The closure is read past the cache, whose
+# version is not committed yet.
+def creates_cycle(course_id, prerequisite_ids):
+    CacheVersion.bump(CACHE_NAME)
+    closure = load_closure()
+    return any(
+        prerequisite_id == course_id or course_id in closure.get(prerequisite_id, ())
+        for prerequisite_id in prerequisite_ids
+    )
+
+
+# Replace the prerequisites of a course, the caller checks for cycles in the same transaction and commits
+def set_prerequisites(course_id, prerequisite_ids):
+    CoursePrerequisite.query.filter_by(course_id=course_id).delete(synchronize_session=False)
+    db.session.add_all(
+        CoursePrerequisite(course_id=course_id, prerequisite_id=prerequisite_id) for prerequisite_id in prerequisite_ids
+    )
+    CacheVersion.bump(CACHE_NAME)
+
+
+# Remove the edges to and from a purged course, the caller commits
+def remove_prerequisite_edges(course_id):
+    CoursePrerequisite.query.filter(
+        or_(CoursePrerequisite.course_id == course_id, CoursePrerequisite.prerequisite_id == course_id)
+    ).delete(synchronize_session=False)
+    CacheVersion.bump(CACHE_NAME)
+
+
+# Prerequisites of course_id each student has not passed, {student_id: [course ids]}
+# A course is passed with a grade of at least PASS_GRADE in any term, archived ones included.
+def missing_prerequisites(course_id, student_ids):
+    required = prerequisite_closure().get(course_id)
+    if not required or not student_ids:
+        return {}
+
+    pass_grade = current_app.config['PASS_GRADE']
+    passed_rows = union(*(
+        select(model.student_id, model.course_id).where(
+            model.student_id.in_(student_ids), model.course_id.in_(required), model.grade >= pass_grade
+        )
+        for model in (Enrollment, ArchivedEnrollment)
+    ))
+    passed = {}
+    for student_id, passed_id in db.session.execute(passed_rows):
+        passed.setdefault(student_id, set()).add(passed_id)
+
+    missing = {}
+    for student_id in student_ids:
+        not_passed = required - passed.get(student_id, set())
+        if not_passed:
+            missing[student_id] = sorted(not_passed)
+    return missing
@@ -0,0 +1,90 @@
+import math
+import weakref
+from flask import current_app
+from sqlalchemy import func
+from ..models import Course, Enrollment
+from ..utils import db
+
+# Course Grade Statistics
+#
+# Grades are read as (course, grade, count) rows from one grouped query, so
+# the work per course depends on the number of distinct grades, not on the
+# number of enrollments. Results are cached per database engine and course
+# until the course grade_version changes.
+
+
+# Histogram bins, the last one includes the top grade
+HISTOGRAM_BINS = [(0.0, 1.0), (1.0, 2.0), (2.0, 3.0), (3.0, 4.0), (4.0, 5.0)]
+
+# engine -> {course id: (grade_version, stats)}
+_caches = weakref.WeakKeyDictionary()
+
+
+# Grade distributions as {course_id: [(grade, count), ...]} sorted by grade
+def grade_distributions(course_ids):
+    query = (
+        db.session.query(Enrollment.course_id, Enrollment.grade, func.count())
+        .filter(Enrollment.course_id.in_(course_ids), Enrollment.grade.isnot(None))
+        .group_by(Enrollment.course_id, Enrollment.grade)
+        .order_by(Enrollment.course_id, Enrollment.grade)
+    )
+    distributions = {course_id: [] for course_id in course_ids}
+    for course_id, grade, count in query:
+        distributions[course_id].append((grade, count))
+    return distributions
+
+
+# Weighted median of a sorted (value, count) distribution
+def median(distribution, total):
+    def value_at(index):
+        seen = 0
+        for value, count in distribution:
+            seen += count
+            if index < seen:
+                return value
+
+    if total % 2:
+        return value_at(total // 2)
+    return (value_at(total // 2 - 1) + value_at(total // 2)) / 2
+
+
+# Summarise one course distribution
+def summarise(distribution, pass_grade):
+    total = sum(count for _, count in distribution)
+    histogram = []
+    for low, high in HISTOGRAM_BINS:
+        last = high == HISTOGRAM_BINS[-1][1]
+        histogram.append({
+            'range': '{:g}-{:g}'.format(low, high),
+            'count': sum(count for grade, count in distribution if low <= grade < high or (last and grade == high)),
+        })
+
+    if not total:
+        return {'count': 0, 'mean': None, 'median': None, 'std_dev': None, 'pass_rate': None, 'histogram': histogram}
+
+    mean = sum(grade * count for grade, count in distribution) / total
+    variance = sum(count * (grade - mean) ** 2 for grade, count in distribution) / total
+    passed = sum(count for grade, count in distribution if grade >= pass_grade)
+    return {
+        'count': total,
+        'mean': mean,
+        'median': median(distribution, total),
+        'std_dev': math.sqrt(variance),
+        'pass_rate': passed / total,
+        'histogram': histogram,
+    }
+
+
+# Stats for the given courses, only recomputing the ones graded since they were cached
+def course_stats(courses):
+    pass_grade = current_app.config['PASS_GRADE']
+    cache = _caches.setdefault(db.session.get_bind(), {})
+    stale = [course.id for course in courses if cache.get(course.id, (None,))[0] != course.grade_version]
+
+    if stale:
+        distributions = grade_distributions(stale)
+        versions = {course.id: course.grade_version for course in courses}
+        for course_id in stale:
+            cache[course_id] = (versions[course_id], summarise(distributions[course_id], pass_grade))
+
+    return [dict(cache[course.id][1], course_id=course.id, course_name=course.name) for course in courses]
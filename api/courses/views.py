@@ -1,5 +1,8 @@
 from flask_restx import Namespace, Resource, fields
-from ..models import Course, Admin
+from ..models import Course, CoursePrerequisite, CourseSlot, Admin, OutboxEvent
+from .stats import course_stats
+from .prerequisites import creates_cycle, prerequisite_closure, set_prerequisites
+from ..jobs.tasks import enqueue
 from ..utils import db
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.exceptions import NotFound, MethodNotAllowed
@@ -10,23 +13,88 @@ from http import HTTPStatus
 # Course Namespace
 course_namespace = Namespace('courses', description='Courses related operations')
 
-# Course Model or Schema
-course_model = course_namespace.model('Course', {
+# Course Catalogue Model, only reads the courses table
+course_catalogue_model = course_namespace.model('CourseCatalogue', {
     'id': fields.String(required=True, description='Course id'),
     'name': fields.String(required=True, description='Course name'),
     'description': fields.String(required=True, description='Course description'),
     'credits': fields.Integer(required=True, description='Course credits'),
     'lecturer': fields.String(required=True, description='Course lecturer'),
+    'capacity': fields.Integer(description='Seat limit, no limit when empty'),
+    'enrollment_count': fields.Integer(readonly=True, description='Enrolled students'),
+    'graded_count': fields.Integer(readonly=True, description='Enrolled students with a grade'),
+})
+
+# Course Model or Schema
+course_model = course_namespace.clone('Course', course_catalogue_model, {
     'students': fields.List(fields.String, required=True, description='Course students'),
 })
 
+# Course Input Model, for creating and updating a course
+course_input_model = course_namespace.model('CourseInput', {
+    'name': fields.String(required=True, min_length=1, max_length=80, description='Course name'),
+    'description': fields.String(required=True, max_length=80, description='Course description'),
+    'credits': fields.Integer(required=True, min=0, description='Course credits'),
+    'lecturer': fields.String(required=True, max_length=80, description='Course lecturer'),
+    'capacity': fields.Integer(min=1, description='Seat limit, no limit when empty'),
+})
+
+# Course Grade Statistics Model
+course_stats_model = course_namespace.model('CourseStats', {
+    'course_id': fields.Integer(description='Course id'),
+    'course_name': fields.String(description='Course name'),
+    'count': fields.Integer(description='Graded enrollments'),
+    'mean': fields.Float(description='Mean grade'),
+    'median': fields.Float(description='Median grade'),
+    'std_dev': fields.Float(description='Standard deviation of the grades'),
+    'pass_rate': fields.Float(description='Share of grades at or above PASS_GRADE'),
+    'histogram': fields.List(fields.Raw, description='Grade counts per range'),
+})
+
+# Course Slot Model, a weekly meeting time
+slot_model = course_namespace.model('CourseSlot', {
+    'day': fields.Integer(required=True, min=0, max=6, description='Day of the week, 0 is Monday'),
+    'starts_at': fields.String(required=True, pattern=r'^([01]\d|2[0-3]):[0-5]\d$', description='Start time, HH:MM'),
+    'ends_at': fields.String(required=True, pattern=r'^([01]\d|2[0-3]):[0-5]\d$|^24:00$', description='End time, HH:MM'),
+})
+
+# Course Timetable Model
+course_slots_model = course_namespace.model('CourseSlots', {
+    'slots': fields.List(fields.Nested(slot_model), required=True, description='Weekly meeting times'),
+})
+
+# Course Prerequisites Model
+prerequisites_model = course_namespace.model('CoursePrerequisites', {
+    'prerequisite_ids': fields.List(fields.Integer, required=True, description='Courses to pass first'),
+    'all_prerequisite_ids': fields.List(fields.Integer, readonly=True, description='Direct and indirect prerequisites'),
+})
+
+
+# Minutes since midnight of a HH:MM time
+def parse_time(value):
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+# Outbox event for a course write
+def course_event(topic, course):
+    payload = {
+        'course_id': course.id,
+        'name': course.name,
+        'description': course.description,
+        'lecturer': course.lecturer,
+        'credits': course.credits,
+        'capacity': course.capacity,
+    }
+    return OutboxEvent.record(topic, payload)
+
 
 # Course Get and Create to get all courses and create a new course 
 @course_namespace.route('/')
 class CourseGetCreate(Resource):
     # Get all courses
     @course_namespace.doc('get_courses')
-    @course_namespace.marshal_list_with(course_model)
+    @course_namespace.marshal_list_with(course_catalogue_model)
     @jwt_required()
     def get(self):
         '''
@@ -37,7 +105,7 @@ class CourseGetCreate(Resource):
     
     # Create a new course by admin only
     @course_namespace.doc('create_course')
-    @course_namespace.expect(course_model)
+    @course_namespace.expect(course_input_model)
     @course_namespace.response(HTTPStatus.CREATED, 'Course created')
     @jwt_required()
     def post(self):
@@ -65,10 +133,13 @@ class CourseGetCreate(Resource):
             description=data['description'],
             lecturer=data['lecturer'],
             credits=data['credits'],
+            capacity=data.get('capacity'),
         )
 
-
-        new_course.save()
+        db.session.add(new_course)
+        db.session.flush()
+        course_event('course.created', new_course)
+        db.session.commit()
 
         return {'message': 'Course created successfully'}, HTTPStatus.CREATED
 
@@ -89,12 +160,12 @@ class CourseGetUpdateDelete(Resource):
         if not user_jwt:
             return {'message': 'User not found'}, HTTPStatus.NOT_FOUND
         
-        course = Course.query.get_or_404(course_id)
+        course = Course.get_by_id(course_id)
         return course, HTTPStatus.OK
     
     # Update a course by admin only
     @course_namespace.doc('update_course')
-    @course_namespace.expect(course_model)
+    @course_namespace.expect(course_input_model)
     @course_namespace.response(HTTPStatus.OK, 'Course updated')
     @jwt_required()
     def put(self, course_id):
@@ -114,12 +185,14 @@ class CourseGetUpdateDelete(Resource):
 
 
         
-        course = Course.query.get_or_404(course_id)
+        course = Course.get_by_id(course_id)
         data = course_namespace.payload
         course.name = data['name']
         course.description = data['description']
         course.lecturer = data['lecturer']
         course.credits = data['credits']
+        course.capacity = data.get('capacity', course.capacity)
+        course_event('course.updated', course)
         course.save()
 
         return {'message': 'Course updated successfully'}, HTTPStatus.OK
@@ -144,6 +217,133 @@ class CourseGetUpdateDelete(Resource):
             return {'message': 'You are not authorized to perform this action'}, HTTPStatus.UNAUTHORIZED
 
         
-        Course.delete_by_id(course_id)
+        # Hide the course now and remove its enrollments in the background
+        course = Course.delete_by_id(course_id)
+        enqueue('purge_course', {'course_id': course.id}, created_by=current_user.id)
+        OutboxEvent.record('course.deleted', {'course_id': course.id})
+        db.session.commit()
         return {'message': 'Course deleted successfully'}, HTTPStatus.NO_CONTENT
 
+
+# Grade statistics for every course
+@course_namespace.route('/stats')
+class CoursesStats(Resource):
+    @course_namespace.doc('get_courses_stats')
+    @course_namespace.marshal_list_with(course_stats_model)
+    @jwt_required()
+    def get(self):
+        """
+        Get grade statistics for all courses
+        """
+        return course_stats(Course.get_all()), HTTPStatus.OK
+
+
+# Grade statistics for a course
+@course_namespace.route('/course/<int:course_id>/stats')
+class CourseStats(Resource):
+    @course_namespace.doc('get_course_stats')
+    @course_namespace.marshal_with(course_stats_model)
+    @jwt_required()
+    def get(self, course_id):
+        """
+        Get grade statistics for a course
+        """
+        course = Course.get_by_id(course_id)
+        return course_stats([course])[0], HTTPStatus.OK
+
+
+# Weekly meeting times of a course
+@course_namespace.route('/course/<int:course_id>/slots')
+class CourseSlots(Resource):
+    @course_namespace.doc('get_course_slots')
+    @course_namespace.marshal_with(course_slots_model)
+    @jwt_required()
+    def get(self, course_id):
+        """
+        Get the weekly meeting times of a course
+        """
+        Course.get_by_id(course_id)
+        slots = CourseSlot.query.filter_by(course_id=course_id).order_by(CourseSlot.day, CourseSlot.starts_at)
+        return {'slots': [slot.to_dict() for slot in slots]}, HTTPStatus.OK
+
+    @course_namespace.doc('set_course_slots')
+    @course_namespace.expect(course_slots_model)
+    @jwt_required()
+    def put(self, course_id):
+        """
+        Replace the weekly meeting times of a course
+         by admin only
+        """
+        admin = Admin.query.filter_by(id=get_jwt_identity(), is_active=True).first()
+        if not admin:
+            return {'message': 'You are not authorized to perform this action'}, HTTPStatus.UNAUTHORIZED
+
+        Course.get_by_id(course_id)
+        slots = [
+            CourseSlot(course_id=course_id, day=slot['day'],
+                       starts_at=parse_time(slot['starts_at']), ends_at=parse_time(slot['ends_at']))
+            for slot in course_namespace.payload['slots']
+        ]
+
+        # Sorted by start, a slot overlaps an earlier one when it starts before the latest end so far
+        latest = None
+        for slot in sorted(slots, key=CourseSlot.week_range):
+            if slot.ends_at <= slot.starts_at:
+                return {'message': 'A slot must end after it starts', 'slot': slot.to_dict()}, HTTPStatus.BAD_REQUEST
+            if latest is not None and slot.week_range()[0] < latest.week_range()[1]:
+                response = {'message': 'The course slots overlap', 'slots': [latest.to_dict(), slot.to_dict()]}
+                return response, HTTPStatus.BAD_REQUEST
+            if latest is None or slot.week_range()[1] > latest.week_range()[1]:
+                latest = slot
+
+        # Students already enrolled keep their seats even if the new times clash with their other courses
+        CourseSlot.query.filter_by(course_id=course_id).delete(synchronize_session=False)
+        db.session.add_all(slots)
+        db.session.commit()
+        return {'slots': [slot.to_dict() for slot in slots]}, HTTPStatus.OK
+
+
+# Prerequisites of a course
+@course_namespace.route('/course/<int:course_id>/prerequisites')
+class CoursePrerequisites(Resource):
+    @course_namespace.doc('get_course_prerequisites')
+    @course_namespace.marshal_with(prerequisites_model)
+    @jwt_required()
+    def get(self, course_id):
+        """
+        Get the prerequisites of a course
+        """
+        Course.get_by_id(course_id)
+        direct = CoursePrerequisite.query.filter_by(course_id=course_id).order_by(CoursePrerequisite.prerequisite_id)
+        response = {
+            'prerequisite_ids': [edge.prerequisite_id for edge in direct],
+            'all_prerequisite_ids': sorted(prerequisite_closure().get(course_id, ())),
+        }
+        return response, HTTPStatus.OK
+
+    @course_namespace.doc('set_course_prerequisites')
+    @course_namespace.expect(prerequisites_model)
+    @jwt_required()
+    def put(self, course_id):
+        """
+        Replace the prerequisites of a course
+         by admin only
+        """
+        admin = Admin.query.filter_by(id=get_jwt_identity(), is_active=True).first()
+        if not admin:
+            return {'message': 'You are not authorized to perform this action'}, HTTPStatus.UNAUTHORIZED
+
+        Course.get_by_id(course_id)
+        prerequisite_ids = list(dict.fromkeys(course_namespace.payload['prerequisite_ids']))
+        found = {id for id, in db.session.query(Course.id).filter(Course.id.in_(prerequisite_ids), Course.deleted_at.is_(None))}
+        unknown = [id for id in prerequisite_ids if id not in found]
+        if unknown:
+            return {'message': 'Courses not found', 'course_ids': unknown}, HTTPStatus.NOT_FOUND
+
+        if creates_cycle(course_id, prerequisite_ids):
+            db.session.rollback()
+            return {'message': 'The prerequisites would form a cycle'}, HTTPStatus.CONFLICT
+
+        set_prerequisites(course_id, prerequisite_ids)
+        db.session.commit()
+        return {'prerequisite_ids': prerequisite_ids}, HTTPStatus.OK
@@ -1,8 +1,11 @@
 from flask import request
-from flask_restx import Namespace, Resource, fields, reqparse
+from flask_restx import Namespace, Resource, fields
 from http import HTTPStatus
-from ..models import Admin, Course, Enrollment, Student
+from sqlalchemy import and_, delete, exists, literal, select
+from sqlalchemy.exc import IntegrityError
+from ..models import Admin, Course, CourseSlot, Enrollment, OutboxEvent, Student, Term, Waitlist, enrollment_table
 from ..utils import db
+from ..courses.prerequisites import missing_prerequisites
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 #  Enrollments API endpoints
@@ -16,47 +19,165 @@ grade_model = enrollment_namespace.model('Grade', {
     'id': fields.Integer(readOnly=True),
     'student_id': fields.Integer(required=True),
     'course_id': fields.Integer(required=True),
-    'grade': fields.Float(required=True),
+    'term_id': fields.Integer(description='Term of the enrollment, the current term when empty'),
+    'grade': fields.Float(required=True, min=0.0, max=5.0),
 })
 
-#  add_grade_parser is used to parse the request body
-add_grade_parser = reqparse.RequestParser()
-add_grade_parser.add_argument('student_id', type=int, required=True, location='json')
-add_grade_parser.add_argument('course_id', type=int, required=True, location='json')
-add_grade_parser.add_argument('grade', type=float, required=True, location='json')
+# Term model
+term_model = enrollment_namespace.model('Term', {
+    'id': fields.Integer(readOnly=True),
+    'name': fields.String(),
+    'starts_on': fields.Date(),
+    'ends_on': fields.Date(),
+    'is_current': fields.Boolean(),
+    'archived_at': fields.DateTime(),
+})
+
+# Bulk Enrollment model
+bulk_enroll_model = enrollment_namespace.model('BulkEnroll', {
+    'course_id': fields.Integer(required=True),
+    'student_ids': fields.List(fields.Integer, required=True),
+})
+
+
+# Id of the current term, None before the first term exists
+def current_term_id():
+    term = Term.current()
+    return term.id if term else None
+
+
+# Course roster rows (enrollment_table) are kept once per student and course,
+# whatever the number of terms the student is enrolled in
+def roster_pair(student_id, course_id):
+    return and_(enrollment_table.c.student_id == student_id, enrollment_table.c.course_id == course_id)
+
+
+def add_to_roster(student_id, course_id):
+    db.session.execute(enrollment_table.insert().from_select(
+        ['student_id', 'course_id'],
+        select(literal(student_id), literal(course_id)).where(~exists().where(roster_pair(student_id, course_id)))
+    ))
+
+
+def remove_from_roster(student_id, course_id):
+    enrolled = exists().where(Enrollment.student_id == student_id, Enrollment.course_id == course_id)
+    db.session.execute(enrollment_table.delete().where(roster_pair(student_id, course_id), ~enrolled))
+
+
+# Outbox payload of an enrollment or waitlist change
+def enrollment_event(topic, row):
+    payload = {'student_id': row.student_id, 'course_id': row.course_id}
+    if isinstance(row, Enrollment):
+        payload.update(enrollment_id=row.id, term_id=row.term_id)
+    return OutboxEvent.record(topic, payload)
+
+
+# Enroll a student in an open seat or put them on the course waitlist
+# Returns the new Enrollment (in the current term), or the Waitlist entry when
+# the course is full. The caller commits.
+def enroll_student(student_id, course_id):
+    if Course.claim_seat(course_id):
+        enrollment = Enrollment(student_id=student_id, course_id=course_id)
+        db.session.add(enrollment)
+        add_to_roster(student_id, course_id)
+        db.session.flush()
+        enrollment_event('enrollment.created', enrollment)
+        return enrollment
+
+    entry = Waitlist(student_id=student_id, course_id=course_id)
+    db.session.add(entry)
+    enrollment_event('waitlist.joined', entry)
+    return entry
+
+
+# Remove an enrollment and give its seat to the next waitlisted student
+# Returns the promoted student id, if any. The caller commits.
+# A repeated or concurrent drop of the same enrollment deletes nothing and
+# leaves the seat alone. Seats and the waitlist are the current term's, so
+# dropping an enrollment of another term frees no seat. Waitlisted students
+# who miss a prerequisite or whose timetable clashes with the course are
+# passed over and keep their place.
+def drop_enrollment(enrollment):
+    course_id, term_id = enrollment.course_id, enrollment.term_id
+    db.session.flush()
+    deleted = db.session.execute(delete(Enrollment).where(Enrollment.id == enrollment.id)).rowcount
+    db.session.expunge(enrollment)
+    if deleted != 1:
+        return None
+
+    if enrollment.grade is not None:
+        Course.grades_changed(course_id, graded=-1)
+    enrollment_event('enrollment.dropped', enrollment)
+    remove_from_roster(enrollment.student_id, course_id)
+    if term_id != current_term_id():
+        return None
+    Course.release_seat(course_id)
+
+    entry = Waitlist.next_for_course(course_id)
+    while entry and (missing_prerequisites(course_id, [entry.student_id]).get(entry.student_id)
+                     or CourseSlot.clashes(course_id, [entry.student_id], term_id).get(entry.student_id)):
+        entry = Waitlist.next_for_course(course_id, after=entry.id)
+    if not entry or not Course.claim_seat(course_id):
+        return None
+
+    db.session.delete(entry)
+    promoted = Enrollment(student_id=entry.student_id, course_id=course_id, term_id=term_id)
+    db.session.add(promoted)
+    add_to_roster(entry.student_id, course_id)
+    db.session.flush()
+    enrollment_event('enrollment.created', promoted)
+    return entry.student_id
 
 
 #  Enroll a student to a course API endpoint can be accessed by a particular student or admin
 @enrollment_namespace.route('/enroll/<int:student_id>/<int:course_id>')
 @enrollment_namespace.response(HTTPStatus.NO_CONTENT, 'Enrolled')
 class EnrollCourse(Resource):
+    @enrollment_namespace.response(HTTPStatus.ACCEPTED, 'Course is full, added to the waitlist')
     def post(self, student_id, course_id):
         '''
         Enroll a student to a course
+            or add them to the waitlist when the course is full
 
         '''
 
         # Check if student and course exist
-        student = Student.query.filter_by(id=student_id).first()
-        course = Course.query.filter_by(id=course_id).first()
+        student = Student.query.filter_by(id=student_id, deleted_at=None).first()
+        course = Course.query.filter_by(id=course_id, deleted_at=None).first()
 
         if not student or not course:
             return {'message': 'Student or course not found'}, HTTPStatus.NOT_FOUND
 
-        # Check if student is already enrolled in the course
-        if student in course.students:
+        # Check if student is already enrolled (this term) or waitlisted in the course
+        if Enrollment.query.filter_by(term_id=current_term_id(), student_id=student_id, course_id=course_id).first():
             return {'message': 'Student is already enrolled in the course'}, HTTPStatus.CONFLICT
 
-        # Enroll student to course
-        course.students.append(student)
-        db.session.commit()
+        entry = Waitlist.query.filter_by(student_id=student_id, course_id=course_id).first()
+        if entry:
+            response = {'message': 'Student is already on the course waitlist', 'waitlist_position': entry.position()}
+            return response, HTTPStatus.CONFLICT
 
-        # create enrollment
-        enrollment = Enrollment(student_id=student_id, course_id=course_id)
-        db.session.add(enrollment)
-        db.session.commit()
+        missing = missing_prerequisites(course_id, [student_id]).get(student_id)
+        if missing:
+            response = {'message': 'The student has not passed the course prerequisites', 'missing_prerequisites': missing}
+            return response, HTTPStatus.CONFLICT
+
+        clashes = CourseSlot.clashes(course_id, [student_id], current_term_id()).get(student_id)
+        if clashes:
+            return {'message': 'The course clashes with the student\'s timetable', 'clashes': clashes}, HTTPStatus.CONFLICT
+
+        # Claim a seat or join the waitlist
+        try:
+            result = enroll_student(student_id, course_id)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return {'message': 'Student is already enrolled or waitlisted in the course'}, HTTPStatus.CONFLICT
+
+        if isinstance(result, Waitlist):
+            response = {'message': 'Course is full, student added to the waitlist', 'waitlist_position': result.position()}
+            return response, HTTPStatus.ACCEPTED
 
-      
         return {'message': 'Student enrolled in the course successfully'}, HTTPStatus.OK
 
 
@@ -66,40 +187,123 @@ class EnrollCourse(Resource):
 @enrollment_namespace.route('/unenroll/<int:student_id>/<int:course_id>')
 @enrollment_namespace.response(HTTPStatus.NO_CONTENT, 'Unenrolled')
 class UnEnroll(Resource):
+    @enrollment_namespace.doc('unenroll', params={
+        'term_id': 'Term of the enrollment, the current term when empty',
+    })
     def delete(self, student_id, course_id):
         '''
         Unenroll a student from a course
+            or remove them from the course waitlist
 
         '''
 
         # Check if student and course exist
-        student = Student.query.filter_by(id=student_id).first()
-        course = Course.query.filter_by(id=course_id).first()
+        student = Student.query.filter_by(id=student_id, deleted_at=None).first()
+        course = Course.query.filter_by(id=course_id, deleted_at=None).first()
 
         if not student or not course:
             return {'message': 'Student or course not found'}, HTTPStatus.NOT_FOUND
 
-        # Check if student is enrolled in the course
-        if student in [enrollment.student for enrollment in course.enrollments]:
-            return {'message': 'Student is not enrolled in the course'}, HTTPStatus.CONFLICT
+        term_id = request.args.get('term_id', type=int) or current_term_id()
+        enrollment = Enrollment.query.filter_by(term_id=term_id, student_id=student_id, course_id=course_id).first()
 
-        # Unenroll student from course
-        course.students.remove(student)
+        # Leaving the waitlist does not free a seat, the waitlist is the current term's
+        if not enrollment:
+            entry = None
+            if term_id == current_term_id():
+                entry = Waitlist.query.filter_by(student_id=student_id, course_id=course_id).first()
+            if not entry:
+                return {'message': 'Student is not enrolled in the course'}, HTTPStatus.CONFLICT
+            enrollment_event('waitlist.left', entry)
+            db.session.delete(entry)
+            db.session.commit()
+            return {'message': 'Student removed from the course waitlist'}, HTTPStatus.OK
+
+        # Unenroll student and promote the next waitlisted student in the same transaction
+        promoted = drop_enrollment(enrollment)
         db.session.commit()
 
-        # delete enrollment
-        enrollment = Enrollment.query.filter_by(student_id=student_id, course_id=course_id).first()
-        db.session.delete(enrollment)
-        db.session.commit()
+        response = {'message': 'Student unenrolled from the course successfully'}
+        if promoted:
+            response['promoted_student_id'] = promoted
+        return response, HTTPStatus.OK 
+    
+
+# Enroll many students to a course in one transaction, admin only
+@enrollment_namespace.route('/enroll/bulk')
+class BulkEnroll(Resource):
+    @enrollment_namespace.expect(bulk_enroll_model)
+    @enrollment_namespace.response(HTTPStatus.OK, 'Students enrolled or waitlisted')
+    @enrollment_namespace.response(HTTPStatus.CONFLICT, 'Students were enrolled meanwhile, nothing was saved')
+    @jwt_required()
+    def post(self):
+        '''
+        Enroll many students to a course
+            by admin only
+        '''
+        admin = Admin.query.filter_by(id=get_jwt_identity(), is_active=True).first()
 
+        if not admin:
+            return {'message': 'You are not authorized to perform this action'}, HTTPStatus.UNAUTHORIZED
+
+        data = enrollment_namespace.payload
+        course_id = data['course_id']
+        student_ids = list(dict.fromkeys(data['student_ids']))
+
+        if not Course.query.filter_by(id=course_id, deleted_at=None).first():
+            return {'message': 'Course not found'}, HTTPStatus.NOT_FOUND
+
+        # One query each for the students that exist and the ones already enrolled or waitlisted
+        found = {id for id, in db.session.query(Student.id).filter(Student.id.in_(student_ids), Student.deleted_at.is_(None))}
+        taken = {id for id, in db.session.query(Enrollment.student_id).filter(
+            Enrollment.term_id == current_term_id(), Enrollment.course_id == course_id,
+            Enrollment.student_id.in_(student_ids))}
+        taken |= {id for id, in db.session.query(Waitlist.student_id).filter(
+            Waitlist.course_id == course_id, Waitlist.student_id.in_(student_ids))}
+        missing = missing_prerequisites(course_id, list(found - taken))
+        clashes = CourseSlot.clashes(course_id, list(found - taken - set(missing)), current_term_id())
+
+        response = {'enrolled': [], 'waitlisted': [], 'skipped': []}
+        for student_id in student_ids:
+            if student_id not in found:
+                response['skipped'].append({'student_id': student_id, 'reason': 'Student not found'})
+            elif student_id in taken:
+                response['skipped'].append({'student_id': student_id, 'reason': 'Already enrolled or waitlisted'})
+            elif student_id in missing:
+                response['skipped'].append({
+                    'student_id': student_id, 'reason': 'Missing prerequisites', 'missing_prerequisites': missing[student_id]
+                })
+            elif student_id in clashes:
+                response['skipped'].append({
+                    'student_id': student_id, 'reason': 'Timetable clash', 'clashes': clashes[student_id]
+                })
+            else:
+                # One savepoint per student, a concurrent enroll of the same student only skips them
+                try:
+                    with db.session.begin_nested():
+                        result = enroll_student(student_id, course_id)
+                        db.session.flush()
+                except IntegrityError:
+                    response['skipped'].append({'student_id': student_id, 'reason': 'Already enrolled or waitlisted'})
+                    continue
+                response['waitlisted' if isinstance(result, Waitlist) else 'enrolled'].append(student_id)
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            response = {
+                'message': 'Students were enrolled or waitlisted in the course meanwhile, nothing was saved',
+                'student_ids': response['enrolled'] + response['waitlisted'],
+            }
+            return response, HTTPStatus.CONFLICT
+        return response, HTTPStatus.OK
 
-        return {'message': 'Student unenrolled from the course successfully'}, HTTPStatus.OK 
-    
 
 # Add grade to a student API endpoint can be accessed by admin only
 @enrollment_namespace.route('/add-grade')
 class AddGradeResource(Resource):
-    @enrollment_namespace.expect(add_grade_parser)
+    @enrollment_namespace.expect(grade_model)
     @enrollment_namespace.response(HTTPStatus.OK, 'Grade added')
     @jwt_required()
     def post(self):
@@ -107,10 +311,12 @@ class AddGradeResource(Resource):
         Add grade to a student
             by admin only
         """
-        args = add_grade_parser.parse_args()
-        student_id = args['student_id']
-        course_id = args['course_id']
-        grade = args['grade']
+        # Checked against grade_model before the view runs
+        data = enrollment_namespace.payload
+        student_id = data['student_id']
+        course_id = data['course_id']
+        grade = data['grade']
+        term_id = data.get('term_id') or current_term_id()
 
         # Check if admin
         admin_id = get_jwt_identity()
@@ -126,7 +332,7 @@ class AddGradeResource(Resource):
 
 
         # Check if student and course exist
-        enrollment = Enrollment.query.filter_by(student_id=student_id, course_id=course_id).first()
+        enrollment = Enrollment.query.filter_by(term_id=term_id, student_id=student_id, course_id=course_id).first()
 
 
     
@@ -134,11 +340,20 @@ class AddGradeResource(Resource):
         if not enrollment:
             return {'message': 'Student is not enrolled in the course'}, HTTPStatus.NOT_FOUND
 
-        if grade < 0.0 or grade > 5.0:
-            return {'message': 'Invalid grade'}, HTTPStatus.BAD_REQUEST
-
-        enrollment.grade = grade
+        enrollment.set_grade(grade, actor_id=admin.id)
         db.session.commit()
 
         return {"message": "graded added"}, HTTPStatus.OK
-    
\ No newline at end of file
+
+
+# List the terms, the current one first
+@enrollment_namespace.route('/terms')
+class TermList(Resource):
+    @enrollment_namespace.marshal_list_with(term_model)
+    @jwt_required()
+    def get(self):
+        '''
+        Get all terms
+
+        '''
+        return Term.query.order_by(Term.is_current.desc(), Term.id.desc()).all(), HTTPStatus.OK
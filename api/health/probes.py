@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+from ..utils import db
+
+# Readiness Probes
+#
+# Each database engine is probed for its round trip time, how much of its
+# connection pool is checked out, and whether its Alembic version is the head
+# of the migrations directory. The results are cached for READY_CACHE_SECONDS
+# so a load balancer polling every worker does not add database load.
+
+
+# Set when this worker got SIGTERM (see gunicorn.conf.py), /readyz fails from then on
+draining = threading.Event()
+
+
+def drain():
+    draining.set()
+
+
+# Whether this worker should be taken out of the load balancer
+def is_draining(app):
+    drain_file = app.config['DRAIN_FILE']
+    return draining.is_set() or bool(drain_file and os.path.exists(drain_file))
+
+
+# Heads of the migrations directory, None without one
+def migration_heads(app):
+    from alembic.script import ScriptDirectory
+
+    directory = app.extensions['migrate'].directory
+    if not os.path.isabs(directory):
+        directory = os.path.join(os.path.dirname(app.root_path), directory)
+    if not os.path.isdir(directory):
+        return None
+    return set(ScriptDirectory(directory).get_heads())
+
+
+# Share of the pool in use, None for pools without a fixed size (SQLite)
+def pool_usage(engine):
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {'ok': True, 'checked_out': None, 'capacity': None, 'saturation': None}
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    return {'checked_out': checked_out, 'capacity': capacity, 'saturation': round(checked_out / capacity, 3)}
+
+
+class ReadinessProbe:
+    '''
+    Cached readiness of the app's databases
+    '''
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.checked_at = None
+        self.result = None
+        self.heads = migration_heads(app) if app.config['READY_CHECK_MIGRATIONS'] else None
+
+    def check(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.checked_at is None or now - self.checked_at >= self.app.config['READY_CACHE_SECONDS']:
+                self.result = self.probe()
+                self.checked_at = now
+            return self.result
+
+    def probe(self):
+        config = self.app.config
+        databases = {}
+        for bind, engine in db.engines.items():
+            pool = pool_usage(engine)
+            if pool['saturation'] is not None:
+                pool['ok'] = pool['saturation'] < config['READY_POOL_SATURATION']
+            database = {'pool': pool}
+            # A full pool would make the probe wait for a connection, it is not ready anyway
+            if pool['ok']:
+                database.update(self.probe_database(engine))
+            else:
+                database['ok'] = False
+            databases[bind or 'default'] = database
+
+        ready = all(database['ok'] and database['pool']['ok'] for database in databases.values())
+        return {'status': 'ready' if ready else 'not ready', 'databases': databases}
+
+    def probe_database(self, engine):
+        config = self.app.config
+        started = time.perf_counter()
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+                latency_ms = round((time.perf_counter() - started) * 1000, 3)
+                versions = self.migration_versions(connection)
+        except Exception as error:
+            return {'ok': False, 'error': str(error)}
+
+        result = {'latency_ms': latency_ms, 'ok': latency_ms <= config['READY_DB_LATENCY_MS']}
+        if self.heads is not None:
+            result['migrations'] = {'head': sorted(self.heads), 'current': sorted(versions)}
+            result['ok'] = result['ok'] and versions == self.heads
+        return result
+
+    def migration_versions(self, connection):
+        if self.heads is None:
+            return set()
+        try:
+            return {row[0] for row in connection.execute(text('SELECT version_num FROM alembic_version'))}
+        except Exception:
+            # Not migrated at all
+            return set()
@@ -0,0 +1,36 @@
+import os
+import time
+from flask import Blueprint, current_app
+from http import HTTPStatus
+from .probes import ReadinessProbe, is_draining
+
+# Health Endpoints
+#
+# Plain Flask routes, outside of the Flask Restx Api, so probes skip JWT and
+# the Swagger spec. /healthz only says the process answers, /readyz says
+# whether this worker should get traffic.
+
+health_blueprint = Blueprint('health', __name__)
+
+STARTED_AT = time.time()
+
+
+# The process is up
+@health_blueprint.route('/healthz')
+def healthz():
+    return {'status': 'ok', 'pid': os.getpid(), 'uptime_seconds': round(time.time() - STARTED_AT, 3)}, HTTPStatus.OK
+
+
+# The worker can serve requests
+@health_blueprint.route('/readyz')
+def readyz():
+    app = current_app._get_current_object()
+    if is_draining(app):
+        return {'status': 'draining'}, HTTPStatus.SERVICE_UNAVAILABLE
+
+    probe = app.extensions.get('readiness')
+    if probe is None:
+        probe = app.extensions['readiness'] = ReadinessProbe(app)
+    result = probe.check()
+    status = HTTPStatus.OK if result['status'] == 'ready' else HTTPStatus.SERVICE_UNAVAILABLE
+    return result, status
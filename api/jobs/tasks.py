@@ -0,0 +1,215 @@
+import csv
+import json
+import os
+from flask import current_app
+from sqlalchemy import tuple_
+from sqlalchemy.orm import selectinload
+from ..models import ArchivedEnrollment, Course, CourseSlot, Enrollment, Job, Student, Term, Waitlist, enrollment_table
+from ..utils import db
+from ..courses.prerequisites import remove_prerequisite_edges
+from ..analytics.snapshot import snapshot_path, write_snapshot
+
+# Background Job Handlers
+#
+# Each handler takes the job payload and a JobContext and returns a JSON
+# serialisable result. Handlers report progress between chunks and, since
+# failed jobs are retried, must either resume from context.checkpoint or be
+# safe to run again from the start.
+
+# Rows handled between progress reports
+CHUNK_SIZE = 500
+
+# kind -> handler(payload, context)
+handlers = {}
+
+
+# Register a job handler
+def job(kind):
+    def register(func):
+        handlers[kind] = func
+        return func
+    return register
+
+
+# Queue a job, the caller commits (so the job is saved with the request's own changes)
+def enqueue(kind, payload=None, created_by=None, max_attempts=3):
+    if kind not in handlers:
+        raise ValueError('Unknown job kind {}'.format(kind))
+    new_job = Job(kind=kind, payload=json.dumps(payload or {}), created_by=created_by, max_attempts=max_attempts)
+    db.session.add(new_job)
+    return new_job
+
+
+# Set many grades, payload {'grades': [{'student_id', 'course_id', 'grade'}, ...], 'term_id'}
+# Grades go to the enrollments of the current term when term_id is not given.
+# Every chunk is committed with a checkpoint, so a retry doesn't set (and audit
+# and publish) the grades of the chunks already done again.
+@job('bulk_grades')
+def bulk_grades(payload, context):
+    grades = payload['grades']
+    term_id = payload.get('term_id')
+    if term_id is None:
+        term = Term.current()
+        term_id = term.id if term else None
+    # Audited as made by the admin who queued the job
+    actor_id = db.session.get(Job, context.job_id).created_by
+    checkpoint = context.checkpoint or {'done': 0, 'result': {'updated': 0, 'not_enrolled': [], 'invalid': []}}
+    result = checkpoint['result']
+
+    for start in range(checkpoint['done'], len(grades), CHUNK_SIZE):
+        chunk = grades[start:start + CHUNK_SIZE]
+        pairs = [(item['student_id'], item['course_id']) for item in chunk]
+        enrollments = {
+            (enrollment.student_id, enrollment.course_id): enrollment
+            for enrollment in Enrollment.query.filter(
+                Enrollment.term_id == term_id, tuple_(Enrollment.student_id, Enrollment.course_id).in_(pairs))
+        }
+        for item in chunk:
+            enrollment = enrollments.get((item['student_id'], item['course_id']))
+            if not enrollment:
+                result['not_enrolled'].append(item)
+            elif not 0.0 <= item['grade'] <= 5.0:
+                result['invalid'].append(item)
+            else:
+                enrollment.set_grade(item['grade'], actor_id=actor_id)
+                result['updated'] += 1
+        done = start + len(chunk)
+        context.progress(done / len(grades), checkpoint={'done': done, 'result': result})
+
+    return result
+
+
+# Recompute the GPA of every student who is not deleted
+# The GPAs are computed on read, the result only keeps the counts and the mean
+# so it stays small whatever the number of students.
+@job('gpa_rebuild')
+def gpa_rebuild(payload, context):
+    from ..students.views import calculate_gpa
+
+    students_query = Student.query.filter(Student.deleted_at.is_(None))
+    total = students_query.count()
+    result = {'students': 0, 'with_gpa': 0, 'mean_gpa': None}
+    gpa_sum = 0.0
+    last_id = 0
+    while True:
+        students = (
+            students_query.filter(Student.id > last_id)
+            .order_by(Student.id)
+            .options(selectinload(Student.enrollments).selectinload(Enrollment.course))
+            .limit(CHUNK_SIZE)
+            .all()
+        )
+        if not students:
+            break
+        for student in students:
+            gpa = calculate_gpa(student)
+            result['students'] += 1
+            if gpa is not None:
+                result['with_gpa'] += 1
+                gpa_sum += gpa
+        last_id = students[-1].id
+        context.progress(result['students'] / total)
+
+    if result['with_gpa']:
+        result['mean_gpa'] = gpa_sum / result['with_gpa']
+    return result
+
+
+# Export every enrollment with its student and course to a CSV file in EXPORT_DIR
+@job('export')
+def export(payload, context):
+    export_dir = current_app.config['EXPORT_DIR']
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, 'export-{}.csv'.format(context.job_id))
+
+    total = Enrollment.query.count()
+    query = (
+        db.session.query(
+            Enrollment.id, Student.id, Student.full_name, Student.email, Course.id, Course.name, Enrollment.term_id,
+            Enrollment.grade
+        )
+        .join(Student, Student.id == Enrollment.student_id)
+        .join(Course, Course.id == Enrollment.course_id)
+        .order_by(Enrollment.id)
+    )
+
+    rows = 0
+    last_id = 0
+    with open(path, 'w', newline='') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['student_id', 'full_name', 'email', 'course_id', 'course_name', 'term_id', 'grade'])
+        while True:
+            chunk = query.filter(Enrollment.id > last_id).limit(CHUNK_SIZE).all()
+            if not chunk:
+                break
+            writer.writerows(row[1:] for row in chunk)
+            rows += len(chunk)
+            last_id = chunk[-1][0]
+            context.progress(rows / total)
+
+    return {'path': path, 'rows': rows}
+
+
+# Write a columnar analytics snapshot to EXPORT_DIR, see analytics/snapshot.py
+@job('snapshot')
+def snapshot(payload, context):
+    path = snapshot_path(str(context.job_id))
+    manifest = write_snapshot(path, progress=context.progress)
+    return {'path': path, 'rows': {table: entry['rows'] for table, entry in manifest['tables'].items()}}
+
+
+# Delete rows of a table matching a condition, CHUNK_SIZE rows per transaction
+def delete_in_chunks(table, key, condition, context):
+    while True:
+        keys = [row[0] for row in db.session.query(key).filter(condition).limit(CHUNK_SIZE)]
+        if not keys:
+            return
+        db.session.execute(table.delete().where(condition, key.in_(keys)))
+        context.progress()
+
+
+# Remove a deleted course and everything that points at it, payload {'course_id'}
+@job('purge_course')
+def purge_course(payload, context):
+    course = db.session.get(Course, payload['course_id'])
+    if not course or not course.deleted_at:
+        return {'purged': False}
+
+    delete_in_chunks(Enrollment.__table__, Enrollment.id, Enrollment.course_id == course.id, context)
+    delete_in_chunks(ArchivedEnrollment.__table__, ArchivedEnrollment.id, ArchivedEnrollment.course_id == course.id, context)
+    delete_in_chunks(Waitlist.__table__, Waitlist.id, Waitlist.course_id == course.id, context)
+    delete_in_chunks(CourseSlot.__table__, CourseSlot.id, CourseSlot.course_id == course.id, context)
+    remove_prerequisite_edges(course.id)
+    delete_in_chunks(enrollment_table, enrollment_table.c.student_id, enrollment_table.c.course_id == course.id, context)
+
+    db.session.delete(course)
+    return {'purged': True}
+
+
+# Remove a deleted student, giving their seats to waitlisted students, payload {'student_id'}
+@job('purge_student')
+def purge_student(payload, context):
+    from ..enrollments.views import drop_enrollment
+
+    student = db.session.get(Student, payload['student_id'])
+    if not student or not student.deleted_at:
+        return {'purged': False}
+
+    delete_in_chunks(Waitlist.__table__, Waitlist.id, Waitlist.student_id == student.id, context)
+    delete_in_chunks(ArchivedEnrollment.__table__, ArchivedEnrollment.id, ArchivedEnrollment.student_id == student.id, context)
+
+    total = Enrollment.query.filter_by(student_id=student.id).count()
+    dropped = 0
+    while True:
+        enrollments = Enrollment.query.filter_by(student_id=student.id).limit(CHUNK_SIZE).all()
+        if not enrollments:
+            break
+        for enrollment in enrollments:
+            drop_enrollment(enrollment)
+        dropped += len(enrollments)
+        context.progress(dropped / total)
+
+    delete_in_chunks(enrollment_table, enrollment_table.c.course_id, enrollment_table.c.student_id == student.id, context)
+
+    db.session.delete(student)
+    return {'purged': True, 'enrollments': dropped}
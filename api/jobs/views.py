@@ -0,0 +1,122 @@
+import json
+from flask_restx import Namespace, Resource, fields
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from http import HTTPStatus
+from ..models import Admin, Job
+from ..utils import db
+from .tasks import enqueue, handlers
+
+# Jobs Endpoint
+
+# Jobs Namespace
+job_namespace = Namespace('jobs', description='Background job operations')
+
+# Submit Job Model
+submit_job_model = job_namespace.model('SubmitJob', {
+    'kind': fields.String(required=True, description='Job kind', enum=sorted(handlers)),
+    'payload': fields.Raw(description='Job payload'),
+    'max_attempts': fields.Integer(default=3, description='Runs before the job is marked failed'),
+})
+
+# Job Status Model
+job_model = job_namespace.model('Job', {
+    'id': fields.Integer(description='Job id'),
+    'kind': fields.String(description='Job kind'),
+    'status': fields.String(description='queued, running, succeeded or failed'),
+    'progress': fields.Float(description='Progress from 0 to 1'),
+    'attempts': fields.Integer(description='Runs so far'),
+    'max_attempts': fields.Integer(description='Runs before the job is marked failed'),
+    'error': fields.String(description='Error of the last failed run'),
+    'created_at': fields.DateTime(),
+    'started_at': fields.DateTime(),
+    'finished_at': fields.DateTime(),
+})
+
+
+# Get the active admin making the request
+def current_admin():
+    return Admin.query.filter_by(id=get_jwt_identity(), is_active=True).first()
+
+
+# Submit a job, admin only
+@job_namespace.route('/')
+class JobSubmit(Resource):
+    @job_namespace.doc('submit_job')
+    @job_namespace.expect(submit_job_model)
+    @job_namespace.response(HTTPStatus.ACCEPTED, 'Job queued')
+    @jwt_required()
+    def post(self):
+        '''
+        Queue a background job
+            by admin only
+        '''
+        admin = current_admin()
+        if not admin:
+            return {'message': 'You are not authorized to perform this action'}, HTTPStatus.UNAUTHORIZED
+
+        data = job_namespace.payload
+        if data['kind'] not in handlers:
+            return {'message': 'Unknown job kind'}, HTTPStatus.BAD_REQUEST
+
+        new_job = enqueue(data['kind'], data.get('payload'), created_by=admin.id, max_attempts=data.get('max_attempts', 3))
+        db.session.commit()
+        return {'id': new_job.id, 'status': new_job.status}, HTTPStatus.ACCEPTED
+
+
+# Job status, admin only
+@job_namespace.route('/<int:job_id>')
+class JobStatus(Resource):
+    @job_namespace.doc('get_job')
+    @job_namespace.marshal_with(job_model)
+    @jwt_required()
+    def get(self, job_id):
+        '''
+        Get the status of a job
+            by admin only
+        '''
+        if not current_admin():
+            job_namespace.abort(HTTPStatus.UNAUTHORIZED, 'You are not authorized to perform this action')
+        return Job.query.get_or_404(job_id), HTTPStatus.OK
+
+
+# Job result, admin only
+@job_namespace.route('/<int:job_id>/result')
+class JobResult(Resource):
+    @job_namespace.doc('get_job_result')
+    @jwt_required()
+    def get(self, job_id):
+        '''
+        Get the result of a finished job
+            by admin only
+        '''
+        if not current_admin():
+            return {'message': 'You are not authorized to perform this action'}, HTTPStatus.UNAUTHORIZED
+
+        found = Job.query.get_or_404(job_id)
+        if found.status != 'succeeded':
+            return {'message': 'Job is {}'.format(found.status)}, HTTPStatus.CONFLICT
+        return {'id': found.id, 'result': json.loads(found.result)}, HTTPStatus.OK
+
+
+# Retry a failed job, admin only
+@job_namespace.route('/<int:job_id>/retry')
+class JobRetry(Resource):
+    @job_namespace.doc('retry_job')
+    @jwt_required()
+    def post(self, job_id):
+        '''
+        Queue a failed job again
+            by admin only
+        '''
+        if not current_admin():
+            return {'message': 'You are not authorized to perform this action'}, HTTPStatus.UNAUTHORIZED
+
+        found = Job.query.get_or_404(job_id)
+        if found.status != 'failed':
+            return {'message': 'Only failed jobs can be retried'}, HTTPStatus.CONFLICT
+
+        found.status = 'queued'
+        found.attempts = 0
+        found.finished_at = None
+        db.session.commit()
+        return {'id': found.id, 'status': found.status}, HTTPStatus.ACCEPTED
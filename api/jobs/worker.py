@@ -0,0 +1,116 @@
+import json
+import logging
+import multiprocessing
+import time
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update
+from ..models import Job
+from ..utils import db
+from ..utils.tenancy import tenant_context
+from .tasks import handlers
+
+# Background Job Worker
+#
+# Runs the handlers registered in tasks.py in worker processes started with
+# run-jobs-command. Jobs are claimed with a conditional update, so any number
+# of workers can poll the same table.
+
+logger = logging.getLogger(__name__)
+
+class JobContext:
+    '''
+    Passed to job handlers to report progress
+
+    progress() commits the work done so far together with the progress and
+    the heartbeat, so handlers call it between chunks. A checkpoint given to
+    progress() is committed with that work and handed back to the next
+    attempt as context.checkpoint, so a retried job can resume after its last
+    committed chunk. Without one the job must be safe to run again from the start.
+    '''
+
+    def __init__(self, job_id, checkpoint=None):
+        self.job_id = job_id
+        self.checkpoint = checkpoint
+
+    def progress(self, fraction=None, checkpoint=None):
+        values = {'heartbeat_at': datetime.utcnow()}
+        if fraction is not None:
+            values['progress'] = min(max(fraction, 0.0), 1.0)
+        if checkpoint is not None:
+            values['result'] = json.dumps(checkpoint)
+            self.checkpoint = checkpoint
+        db.session.execute(
+            update(Job)
+            .where(Job.id == self.job_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+
+# Run a claimed job and record the outcome, failed jobs are queued again until max_attempts
+def run_job(claimed):
+    handler = handlers.get(claimed.kind)
+    try:
+        if handler is None:
+            raise ValueError('Unknown job kind {}'.format(claimed.kind))
+        checkpoint = json.loads(claimed.result) if claimed.result else None
+        result = handler(json.loads(claimed.payload), JobContext(claimed.id, checkpoint))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.exception('Job %s failed', claimed.id)
+        claimed = db.session.get(Job, claimed.id)
+        claimed.error = traceback.format_exc()
+        claimed.status = 'queued' if claimed.attempts < claimed.max_attempts else 'failed'
+        claimed.finished_at = None if claimed.status == 'queued' else datetime.utcnow()
+        db.session.commit()
+        return claimed
+
+    claimed = db.session.get(Job, claimed.id)
+    claimed.status = 'succeeded'
+    claimed.result = json.dumps(result)
+    claimed.error = None
+    claimed.progress = 1.0
+    claimed.finished_at = datetime.utcnow()
+    db.session.commit()
+    return claimed
+
+
+# Run queued jobs until none are left (or limit is reached), returns how many ran
+def run_pending(limit=None):
+    stale_before = datetime.utcnow() - timedelta(seconds=current_app.config['JOB_HEARTBEAT_TIMEOUT'])
+    count = 0
+    while limit is None or count < limit:
+        claimed = Job.claim_next(stale_before)
+        if claimed is None:
+            break
+        run_job(claimed)
+        count += 1
+    return count
+
+
+# Worker process loop, runs the jobs of tenant's database (the default one when None)
+def work(app, poll_interval, tenant=None):
+    with tenant_context(tenant, app):
+        # Connections inherited from the parent process must not be reused
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+        while True:
+            if not run_pending():
+                time.sleep(poll_interval)
+
+
+# Start worker processes for the app, returns them
+def start_workers(app, count, poll_interval, tenant=None):
+    # Workers are forked so they can share the already built app
+    context = multiprocessing.get_context('fork')
+    processes = [
+        context.Process(target=work, args=(app, poll_interval, tenant), name='job-worker-{}'.format(i), daemon=True)
+        for i in range(count)
+    ]
+    for process in processes:
+        process.start()
+    return processes
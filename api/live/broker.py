@@ -0,0 +1,184 @@
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from sqlalchemy import event, func
+from ..models import OutboxEvent
+from ..utils import Session, db
+from ..utils.tenancy import current_tenant
+
+# Live Update Broker
+#
+# In process pub/sub for the live streams. Outbox events flushed by a session
+# are published once the session commits (and dropped on rollback), so the
+# streams only ever show committed changes. Every subscriber has a bounded
+# queue; a subscriber that falls behind is cut off (and told so) instead of
+# buffering without limit.
+#
+# Other processes' writes are picked up by polling the outbox change feed
+# (LIVE_FEED_POLL_INTERVAL), which needs dispatch-outbox-command running.
+# Subscription keys start with the school (None for the default database),
+# the poller only follows the default database.
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    '''
+    One live stream, receives the events of its keys
+    '''
+
+    def __init__(self, keys, maxsize):
+        self.keys = keys
+        self.queue = queue.Queue(maxsize)
+        # Set when the queue was full, the stream ends and the client has to reload
+        self.overflowed = False
+
+    # Next event, None after timeout seconds without one
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Broker:
+    def __init__(self, seen_size=10000):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+        self.count = 0
+        # Ids of the events published lately, with the poller an event comes from both it and the commit hook
+        self.seen = set()
+        self.seen_order = deque(maxlen=seen_size)
+        self.poller = None
+
+    def subscribe(self, keys, maxsize, limit):
+        with self.lock:
+            if self.count >= limit:
+                return None
+            subscription = Subscription(keys, maxsize)
+            for key in keys:
+                self.subscribers[key].add(subscription)
+            self.count += 1
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            removed = False
+            for key in subscription.keys:
+                subscribers = self.subscribers.get(key)
+                if subscribers and subscription in subscribers:
+                    subscribers.discard(subscription)
+                    removed = True
+                    if not subscribers:
+                        del self.subscribers[key]
+            if removed:
+                self.count -= 1
+
+    # Drop a subscriber that fell behind
+    def overflow(self, subscription):
+        subscription.overflowed = True
+        self.unsubscribe(subscription)
+
+    # Events of the tenant's database
+    def publish(self, events, tenant=None):
+        with self.lock:
+            deliveries = []
+            for live_event in events:
+                if self.poller is not None:
+                    event_id = (tenant, live_event['event_id'])
+                    if event_id in self.seen:
+                        continue
+                    if len(self.seen_order) == self.seen_order.maxlen:
+                        self.seen.discard(self.seen_order[0])
+                    self.seen_order.append(event_id)
+                    self.seen.add(event_id)
+
+                targets = set()
+                for key in event_keys(live_event):
+                    targets |= self.subscribers.get((tenant,) + key, set())
+                deliveries.extend((subscription, live_event) for subscription in targets)
+
+        for subscription, live_event in deliveries:
+            try:
+                subscription.queue.put_nowait(live_event)
+            except queue.Full:
+                self.overflow(subscription)
+
+    # Start polling the outbox change feed once per process
+    def start_poller(self, app, interval):
+        with self.lock:
+            if self.poller is not None:
+                return
+            self.poller = threading.Thread(target=poll_feed, args=(self, app, interval), name='live-feed', daemon=True)
+        self.poller.start()
+
+
+# Keys a live event is published to
+def event_keys(live_event):
+    payload = live_event['payload']
+    keys = []
+    if 'student_id' in payload:
+        keys.append(('student', payload['student_id']))
+    if 'course_id' in payload:
+        keys.append(('course', payload['course_id']))
+    return keys
+
+
+# Live event of an outbox event
+def live_event(outbox_event):
+    data = outbox_event.to_dict()
+    del data['sequence']
+    return data
+
+
+# Process wide broker
+broker = Broker()
+
+
+# Collect the outbox events of a flush, only when someone is listening
+@event.listens_for(Session, 'after_flush')
+def collect_events(session, flush_context):
+    if not broker.count:
+        return
+    events = [live_event(obj) for obj in session.new if isinstance(obj, OutboxEvent)]
+    if events:
+        session.info.setdefault('live_events', []).extend(events)
+
+
+@event.listens_for(Session, 'after_commit')
+def publish_events(session):
+    events = session.info.pop('live_events', None)
+    if events:
+        broker.publish(events, current_tenant())
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_events(session, previous_transaction):
+    session.info.pop('live_events', None)
+
+
+# Publish the events other processes wrote, in change feed order
+def poll_feed(broker, app, interval):
+    with app.app_context():
+        after = db.session.query(func.max(OutboxEvent.sequence)).scalar() or 0
+        db.session.remove()
+        while True:
+            time.sleep(interval)
+            try:
+                if broker.count:
+                    events = (
+                        OutboxEvent.query.filter(OutboxEvent.sequence > after)
+                        .order_by(OutboxEvent.sequence)
+                        .limit(500)
+                        .all()
+                    )
+                    if events:
+                        after = events[-1].sequence
+                        broker.publish([live_event(outbox_event) for outbox_event in events])
+                else:
+                    after = db.session.query(func.max(OutboxEvent.sequence)).scalar() or after
+            except Exception:
+                logger.exception('Polling the outbox change feed failed')
+            finally:
+                db.session.remove()
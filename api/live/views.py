@@ -0,0 +1,116 @@
+import json
+import time
+from flask import Response, current_app
+from flask_restx import Namespace, Resource
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from http import HTTPStatus
+from ..models import Admin, Course, Student, enrollment_table
+from ..utils import db
+from ..utils.tenancy import current_tenant
+from .broker import broker
+
+# Live Updates Endpoint
+
+# Live Namespace
+live_namespace = Namespace('live', description='Server-Sent Events streams of grade and enrollment changes')
+
+
+# Whether a stream limited to student_id may see an event
+# Events about a student (grades, enrollments, drops, waitlist) are only shown
+# for that student, course wide events are shown to everyone.
+def shows(live_event, student_id):
+    payload = live_event['payload']
+    if student_id is None or 'student_id' not in payload:
+        return True
+    return payload['student_id'] == student_id
+
+
+# Subscribe and stream the events as text/event-stream
+# With student_id set, the stream leaves out the events about other students
+def event_stream(keys, student_id=None):
+    config = current_app.config
+    if config['LIVE_FEED_POLL_INTERVAL'] > 0:
+        broker.start_poller(current_app._get_current_object(), config['LIVE_FEED_POLL_INTERVAL'])
+
+    # Schools share ids, the keys are the school's
+    keys = [(current_tenant(),) + key for key in keys]
+    subscription = broker.subscribe(keys, config['LIVE_QUEUE_SIZE'], config['LIVE_MAX_SUBSCRIBERS'])
+    if subscription is None:
+        live_namespace.abort(HTTPStatus.SERVICE_UNAVAILABLE, 'Too many live streams, try again later')
+
+    keepalive = config['LIVE_KEEPALIVE_SECONDS']
+    # Streams are closed after a while so workers are not held forever, EventSource reconnects on its own
+    ends_at = time.monotonic() + config['LIVE_STREAM_SECONDS']
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while time.monotonic() < ends_at:
+                live_event = subscription.get(min(keepalive, max(ends_at - time.monotonic(), 0)))
+                if subscription.overflowed:
+                    yield 'event: overflow\ndata: {}\n\n'
+                    return
+                if live_event is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                if not shows(live_event, student_id):
+                    continue
+                yield 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+                    live_event['event_id'], live_event['topic'], json.dumps(live_event)
+                )
+        finally:
+            broker.unsubscribe(subscription)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(generate(), mimetype='text/event-stream', headers=headers)
+
+
+# Live changes of a student
+@live_namespace.route('/student/<int:student_id>')
+class StudentStream(Resource):
+    batchable = False
+
+    @live_namespace.doc('stream_student')
+    @live_namespace.produces(['text/event-stream'])
+    @jwt_required()
+    def get(self, student_id):
+        '''
+        Stream grade and enrollment changes of a student
+            by admin or student(only if it is the current student)
+        '''
+        user_jwt = get_jwt_identity()
+        Student.get_by_id(student_id)
+
+        admin = Admin.query.filter_by(id=user_jwt, is_active=True).first()
+        if user_jwt != student_id and not admin:
+            return {'message': 'You can\'t View this student'}, HTTPStatus.UNAUTHORIZED
+
+        # End the transaction so the connection goes back to the pool before the stream starts
+        db.session.commit()
+        return event_stream([('student', student_id)])
+
+
+# Live changes of a course
+@live_namespace.route('/course/<int:course_id>')
+class CourseStream(Resource):
+    batchable = False
+
+    @live_namespace.doc('stream_course')
+    @live_namespace.produces(['text/event-stream'])
+    @jwt_required()
+    def get(self, course_id):
+        '''
+        Stream grade, enrollment and course changes of a course
+            by admin or a student enrolled in the course (who only gets the changes about themselves)
+        '''
+        user_jwt = get_jwt_identity()
+        Course.get_by_id(course_id)
+
+        admin = Admin.query.filter_by(id=user_jwt, is_active=True).first()
+        enrolled = db.session.query(enrollment_table).filter_by(student_id=user_jwt, course_id=course_id).first()
+        if not admin and not enrolled:
+            return {'message': 'You can\'t View this course'}, HTTPStatus.UNAUTHORIZED
+
+        # End the transaction so the connection goes back to the pool before the stream starts
+        db.session.commit()
+        return event_stream([('course', course_id)], student_id=None if admin else user_jwt)
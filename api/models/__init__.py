@@ -1,6 +1,10 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Table
-from sqlalchemy.orm import relationship
-from ..utils import db
+from sqlalchemy import Column, Integer, String, ForeignKey, Table, UniqueConstraint, and_, event, func, insert, select, update, or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased, relationship
+from datetime import datetime
+import json
+from ..utils import Session, db
 from werkzeug.security import generate_password_hash
 
 # Main Database Model
@@ -41,6 +45,8 @@ class Student(db.Model):
     email = Column(String(255), unique=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
     is_admin = Column(db.Boolean, default=False, nullable=False)
+    # Set when the student is deleted, the rows are removed later by the purge_student job
+    deleted_at = Column(db.DateTime, nullable=True)
     enrollments = relationship('Enrollment', back_populates='student')
 
     #Relationship with Course model
@@ -58,15 +64,14 @@ class Student(db.Model):
 
     @classmethod
     def get_by_id(model, id):
-        return model.query.get_or_404(id)
+        return model.query.filter_by(id=id, deleted_at=None).first_or_404()
     
     @classmethod
     def get_students(model):
-        return model.query.all()
+        return model.query.filter_by(deleted_at=None).all()
     
-    @classmethod
-    def set_password(model, password):
-        model.password_hash = generate_password_hash(password)
+    def set_password(self, password):
+        self.password_hash = generate_password_hash(password)
     
 
 # Course Model
@@ -77,6 +82,16 @@ class Course(db.Model):
     description = db.Column(db.String(80), nullable=False)
     lecturer= db.Column(db.String(80), nullable=False)
     credits = db.Column(db.Integer, nullable=False)
+    # Seat limit, no limit when empty
+    capacity = db.Column(db.Integer, nullable=True)
+    # Seats taken in the current term, only changed through claim_seat, release_seat and recount_seats
+    enrollment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Enrollments with a grade, only changed through grades_changed
+    graded_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped on every grade write, cached grade statistics are keyed by it
+    grade_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Set when the course is deleted, the rows are removed later by the purge_course job
+    deleted_at = db.Column(db.DateTime, nullable=True)
     enrollments = db.relationship('Enrollment', back_populates='course')
 
     # Relationship with Student model
@@ -91,27 +106,447 @@ class Course(db.Model):
 
     @classmethod
     def get_by_id(model, id):
-        return model.query.get_or_404(id)
+        return model.query.filter_by(id=id, deleted_at=None).first_or_404()
     
     @classmethod
     def get_all(model):
-        return model.query.all()
+        return model.query.filter_by(deleted_at=None).all()
     
+    # Hide the course at once, the caller queues the purge_course job and commits
     @classmethod
     def delete_by_id(model, id):
         model = model.get_by_id(id)
-        db.session.delete(model)
-        db.session.commit()
+        model.deleted_at = datetime.utcnow()
         return model
+
+    # Take a seat with one conditional update, False when the course is full
+    @classmethod
+    def claim_seat(model, id):
+        result = db.session.execute(
+            update(model)
+            .where(model.id == id, or_(model.capacity.is_(None), model.enrollment_count < model.capacity))
+            .values(enrollment_count=model.enrollment_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    # Count the seats taken in a term again, when it becomes the current term
+    @classmethod
+    def recount_seats(model, term_id):
+        db.session.execute(
+            update(model)
+            .values(enrollment_count=select(func.count(Enrollment.id)).where(
+                Enrollment.course_id == model.id, Enrollment.term_id == term_id).scalar_subquery())
+            .execution_options(synchronize_session=False)
+        )
+
+    # Give a seat back
+    @classmethod
+    def release_seat(model, id):
+        db.session.execute(
+            update(model)
+            .where(model.id == id, model.enrollment_count > 0)
+            .values(enrollment_count=model.enrollment_count - 1)
+            .execution_options(synchronize_session=False)
+        )
+
+    # Record a grade write, graded is the change in graded enrollments
+    @classmethod
+    def grades_changed(model, id, graded=0):
+        db.session.execute(
+            update(model)
+            .where(model.id == id)
+            .values(graded_count=model.graded_count + graded, grade_version=model.grade_version + 1)
+            .execution_options(synchronize_session=False)
+        )
     
 
+# Term Model, enrollments belong to a term and closed terms are archived
+class Term(db.Model):
+    __tablename__ = 'terms'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False, unique=True)
+    starts_on = db.Column(db.Date, nullable=True)
+    ends_on = db.Column(db.Date, nullable=True)
+    # New enrollments go to the current term
+    is_current = db.Column(db.Boolean, nullable=False, default=False)
+    # Set when the term enrollments are moved to enrollments_archive
+    archived_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Term {self.name}>"
+
+    @classmethod
+    def current(model):
+        return model.query.filter_by(is_current=True).order_by(model.id.desc()).first()
+
+
+# A current 'Default' term comes with the terms table, so enrollments have a term
+# before any was set up. Migrated databases get it from the default term migration.
+@event.listens_for(Term.__table__, 'after_create')
+def create_default_term(table, connection, **kwargs):
+    connection.execute(insert(Term).values(name='Default', is_current=True))
+
+
+# Default term of a new enrollment, the current term
+def current_term_id(context):
+    return context.connection.execute(
+        select(Term.id).where(Term.is_current.is_(True)).order_by(Term.id.desc()).limit(1)
+    ).scalar()
+
+
 # Enrollment Model
+# On Postgres the table is partitioned by term_id (see the terms migration),
+# so queries filtered on one term only read that term's partition.
 class Enrollment(db.Model):
     __tablename__ = 'enrollments'
+    __table_args__ = (
+        UniqueConstraint('student_id', 'course_id', 'term_id', name='uq_enrollments_student_course_term'),
+        db.Index('ix_enrollments_term_student', 'term_id', 'student_id'),
+        db.Index('ix_enrollments_term_course', 'term_id', 'course_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
     course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    term_id = db.Column(db.Integer, db.ForeignKey('terms.id'), nullable=False, default=current_term_id)
     grade = db.Column(db.Float)
     student = db.relationship('Student', back_populates='enrollments')
-    course = db.relationship('Course', back_populates='enrollments')
\ No newline at end of file
+    course = db.relationship('Course', back_populates='enrollments')
+
+    # Set the grade, counting the enrollment as graded on its first grade
+    # actor_id is the admin making the change, for the grade audit log.
+    def set_grade(self, grade, actor_id=None):
+        previous = self.grade
+        first_grade = db.session.execute(
+            update(Enrollment)
+            .where(Enrollment.id == self.id, Enrollment.grade.is_(None))
+            .values(grade=grade)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+
+        if first_grade:
+            db.session.expire(self, ['grade'])
+        else:
+            self.grade = grade
+        Course.grades_changed(self.course_id, graded=1 if first_grade else 0)
+        GradeAudit.buffer(self, None if first_grade else previous, grade, actor_id)
+        OutboxEvent.record('grade.set', {
+            'enrollment_id': self.id,
+            'student_id': self.student_id,
+            'course_id': self.course_id,
+            'term_id': self.term_id,
+            'grade': grade,
+        })
+
+
+# Archived Enrollment Model, enrollments of archived terms
+# The student and course ids are not foreign keys so the purge jobs can remove
+# the rows in any order. Ids are the archive's own, SQLite can hand the ids of
+# moved rows out again.
+class ArchivedEnrollment(db.Model):
+    __tablename__ = 'enrollments_archive'
+    __table_args__ = (db.Index('ix_enrollments_archive_term_student', 'term_id', 'student_id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, nullable=False, index=True)
+    course_id = db.Column(db.Integer, nullable=False, index=True)
+    term_id = db.Column(db.Integer, nullable=False)
+    grade = db.Column(db.Float)
+    course = db.relationship('Course', primaryjoin='foreign(ArchivedEnrollment.course_id) == Course.id', viewonly=True)
+
+
+# Waitlist Model, entries are served in id order
+class Waitlist(db.Model):
+    __tablename__ = 'waitlist'
+    __table_args__ = (UniqueConstraint('student_id', 'course_id', name='uq_waitlist_student_course'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Position in the course waitlist, starting at 1
+    def position(self):
+        return Waitlist.query.filter(Waitlist.course_id == self.course_id, Waitlist.id <= self.id).count()
+
+    # Oldest entry for a course (after the entry id after), locked so concurrent drops promote different students
+    @classmethod
+    def next_for_course(model, course_id, after=None):
+        query = model.query.filter_by(course_id=course_id)
+        if after is not None:
+            query = query.filter(model.id > after)
+        return (
+            query
+            .join(Student, Student.id == model.student_id)
+            .filter(Student.deleted_at.is_(None))
+            .order_by(model.id)
+            .with_for_update(skip_locked=True, of=model)
+            .first()
+        )
+
+
+# Minutes in a day, slots are placed on the week as day * MINUTES_PER_DAY + minute
+MINUTES_PER_DAY = 24 * 60
+
+
+# Course Slot Model, a weekly meeting time of a course
+# day is 0 (Monday) to 6, starts_at and ends_at are minutes since midnight.
+class CourseSlot(db.Model):
+    __tablename__ = 'course_slots'
+    __table_args__ = (db.Index('ix_course_slots_course_day', 'course_id', 'day'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    day = db.Column(db.Integer, nullable=False)
+    starts_at = db.Column(db.Integer, nullable=False)
+    ends_at = db.Column(db.Integer, nullable=False)
+
+    # Minutes since the start of the week
+    def week_range(self):
+        return self.day * MINUTES_PER_DAY + self.starts_at, self.day * MINUTES_PER_DAY + self.ends_at
+
+    def to_dict(self):
+        return {
+            'day': self.day,
+            'starts_at': '{:02d}:{:02d}'.format(*divmod(self.starts_at, 60)),
+            'ends_at': '{:02d}:{:02d}'.format(*divmod(self.ends_at, 60)),
+        }
+
+    # Clashes of a course's slots with the courses the students are enrolled in this term
+    # Returns {student_id: [clash, ...]} for the students with a clash. One query
+    # starts from the students' enrollments of the term (ix_enrollments_term_student),
+    # reads the slots of those courses on each day the course meets
+    # (ix_course_slots_course_day) and keeps the overlapping ones, so the work
+    # follows the students' timetables, not the size of the catalogue.
+    @classmethod
+    def clashes(model, course_id, student_ids, term_id):
+        if not student_ids:
+            return {}
+
+        other = aliased(model)
+        rows = (
+            db.session.query(Enrollment.student_id, model, Course.id, Course.name, other)
+            .select_from(Enrollment)
+            .join(Course, Course.id == Enrollment.course_id)
+            .join(model, model.course_id == course_id)
+            .join(other, and_(
+                other.course_id == Enrollment.course_id,
+                other.day == model.day,
+                other.starts_at < model.ends_at,
+                other.ends_at > model.starts_at,
+            ))
+            .filter(
+                Enrollment.term_id == term_id,
+                Enrollment.student_id.in_(student_ids),
+                Enrollment.course_id != course_id,
+            )
+            .order_by(Enrollment.student_id, model.day, model.starts_at, other.starts_at)
+            .all()
+        )
+
+        found = {}
+        for student_id, slot, other_id, other_name, other_slot in rows:
+            found.setdefault(student_id, []).append({
+                'slot': slot.to_dict(),
+                'course_id': other_id,
+                'course_name': other_name,
+                'course_slot': other_slot.to_dict(),
+            })
+        return found
+
+
+# Course Prerequisite Model, course_id needs prerequisite_id passed first
+class CoursePrerequisite(db.Model):
+    __tablename__ = 'course_prerequisites'
+
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), primary_key=True)
+    prerequisite_id = db.Column(db.Integer, db.ForeignKey('courses.id'), primary_key=True, index=True)
+
+
+# Cache Version Model, a counter per cached data set bumped on every change to it
+# so each process can tell its cached copy is stale with one small read.
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def get(model, name):
+        return db.session.query(model.version).filter_by(name=name).scalar() or 0
+
+    # The caller commits, the bump is part of the change it invalidates. One upsert, so
+    # concurrent first bumps don't race, and the row stays locked until the commit.
+    @classmethod
+    def bump(model, name):
+        dialect = db.session.get_bind().dialect.name
+        statement = (postgresql_insert if dialect == 'postgresql' else sqlite_insert)(model).values(name=name, version=1)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[model.name], set_={'version': model.version + 1},
+        ))
+
+
+# Job Model, background work run by run-jobs-command
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (db.Index('ix_jobs_status_id', 'status', 'id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    # queued, running, succeeded or failed
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    # Result of a succeeded job, or the checkpoint saved by a running or failed one
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    progress = db.Column(db.Float, nullable=False, default=0.0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    created_by = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} {self.status}>"
+
+    # Claim the oldest queued job, or a running one whose worker stopped sending heartbeats
+    # Stale jobs that already used their attempts are marked failed instead
+    @classmethod
+    def claim_next(model, stale_before):
+        stale = (model.status == 'running') & (model.heartbeat_at < stale_before)
+        db.session.execute(
+            update(model)
+            .where(stale, model.attempts >= model.max_attempts)
+            .values(status='failed', error='The worker stopped sending heartbeats', finished_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        claimable = or_(model.status == 'queued', stale & (model.attempts < model.max_attempts))
+        for (id,) in db.session.query(model.id).filter(claimable).order_by(model.id).limit(10):
+            now = datetime.utcnow()
+            claimed = db.session.execute(
+                update(model)
+                .where(model.id == id, claimable)
+                .values(status='running', started_at=now, heartbeat_at=now, attempts=model.attempts + 1)
+                .execution_options(synchronize_session=False)
+            ).rowcount == 1
+            db.session.commit()
+            if claimed:
+                return db.session.get(model, id)
+        return None
+
+
+# Outbox Event Model, change events saved in the same transaction as the change
+# The dispatcher (dispatch-outbox-command) gives each event its place in the
+# change feed (sequence) in commit order, then delivers it to the webhooks.
+class OutboxEvent(db.Model):
+    __tablename__ = 'outbox_events'
+    __table_args__ = (db.Index('ix_outbox_events_delivered_at_sequence', 'delivered_at', 'sequence'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Change feed cursor, set by the dispatcher
+    sequence = db.Column(db.Integer, nullable=True, unique=True)
+    delivered_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f"<OutboxEvent {self.id} {self.topic}>"
+
+    # Add an event to the session, it is saved (or rolled back) with the caller's changes
+    @classmethod
+    def record(model, topic, payload):
+        event = model(topic=topic, payload=json.dumps(payload))
+        db.session.add(event)
+        return event
+
+    # Event as sent to webhooks and the change feed
+    def to_dict(self):
+        return {
+            'sequence': self.sequence,
+            'event_id': self.id,
+            'topic': self.topic,
+            'payload': json.loads(self.payload),
+            'created_at': self.created_at.isoformat(),
+        }
+
+
+# Grade Audit Model, one row per grade change, never updated or deleted
+# Rows are buffered in the session and written with one executemany when it
+# commits, so a grade write does not pay for its own audit insert. The ids are
+# not foreign keys, the history outlives archived and purged enrollments, so
+# every row carries the student, course and term of its enrollment.
+class GradeAudit(db.Model):
+    __tablename__ = 'grade_audit'
+    __table_args__ = (
+        db.Index('ix_grade_audit_enrollment_id_id', 'enrollment_id', 'id'),
+        db.Index('ix_grade_audit_actor_id_id', 'actor_id', 'id'),
+        db.Index('ix_grade_audit_student_id_id', 'student_id', 'id'),
+        db.Index('ix_grade_audit_course_id_id', 'course_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    enrollment_id = db.Column(db.Integer, nullable=False)
+    student_id = db.Column(db.Integer, nullable=False)
+    course_id = db.Column(db.Integer, nullable=False)
+    # Empty for rows written before terms were audited whose enrollment is gone
+    term_id = db.Column(db.Integer, nullable=True)
+    # Admin who made the change, empty for system changes
+    actor_id = db.Column(db.Integer, nullable=True)
+    old_grade = db.Column(db.Float, nullable=True)
+    new_grade = db.Column(db.Float, nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+    # Queue an audit row, written when the session commits
+    # The row remembers the savepoint it was made in, if any, so rolling that savepoint back drops it.
+    @classmethod
+    def buffer(model, enrollment, old_grade, new_grade, actor_id=None):
+        session = db.session()
+        session.info.setdefault('grade_audit', []).append((session.get_nested_transaction(), {
+            'enrollment_id': enrollment.id,
+            'student_id': enrollment.student_id,
+            'course_id': enrollment.course_id,
+            'term_id': enrollment.term_id,
+            'actor_id': actor_id,
+            'old_grade': old_grade,
+            'new_grade': new_grade,
+            'changed_at': datetime.utcnow(),
+        }))
+
+
+# Write the buffered grade audit rows in the committing transaction
+@event.listens_for(Session, 'before_commit')
+def write_grade_audit(session):
+    buffered = session.info.pop('grade_audit', None)
+    if buffered:
+        session.execute(GradeAudit.__table__.insert(), [row for _, row in buffered])
+
+
+# Whether transaction is savepoint or runs inside it
+def within(transaction, savepoint):
+    while transaction is not None:
+        if transaction is savepoint:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+# Drop the rows of a rolled back transaction, only those of the savepoint when one was rolled back
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_grade_audit(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop('grade_audit', None)
+        return
+    buffered = session.info.get('grade_audit')
+    if buffered:
+        session.info['grade_audit'] = [
+            (transaction, row) for transaction, row in buffered if not within(transaction, previous_transaction)
+        ]
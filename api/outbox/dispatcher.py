@@ -0,0 +1,104 @@
+import hashlib
+import hmac
+import json
+import logging
+import time
+import urllib.request
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from ..models import OutboxEvent
+from ..utils import db
+
+# Outbox Dispatcher
+#
+# Events are written by the request that made the change. The dispatcher first
+# numbers them (sequence) in the order their transactions committed, which is
+# the cursor of the change feed, then posts them in batches to every url in
+# OUTBOX_WEBHOOK_URLS. An event is marked delivered only after all urls
+# accepted the batch, so delivery is at least once and consumers dedupe on
+# event_id.
+
+logger = logging.getLogger(__name__)
+
+
+# Number the committed events that have no sequence yet, returns how many
+# Run one dispatcher per database, a second one gets a unique violation and retries.
+def sequence_events(batch_size):
+    events = (
+        OutboxEvent.query.filter(OutboxEvent.sequence.is_(None))
+        .order_by(OutboxEvent.id)
+        .limit(batch_size)
+        .all()
+    )
+    if not events:
+        return 0
+
+    last = db.session.query(func.max(OutboxEvent.sequence)).scalar() or 0
+    for offset, event in enumerate(events, 1):
+        event.sequence = last + offset
+    db.session.commit()
+    return len(events)
+
+
+# Post a batch to a webhook, raises on errors and non 2xx responses
+def post_events(url, body):
+    headers = {'Content-Type': 'application/json'}
+    secret = current_app.config['OUTBOX_WEBHOOK_SECRET']
+    if secret:
+        headers['X-Outbox-Signature'] = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+    with urllib.request.urlopen(request, timeout=current_app.config['OUTBOX_WEBHOOK_TIMEOUT']):
+        pass
+
+
+# Deliver the oldest undelivered sequenced events, returns how many were delivered
+def deliver_events(batch_size):
+    events = (
+        OutboxEvent.query.filter(OutboxEvent.delivered_at.is_(None), OutboxEvent.sequence.isnot(None))
+        .order_by(OutboxEvent.sequence)
+        .limit(batch_size)
+        .all()
+    )
+    if not events:
+        return 0
+
+    body = json.dumps({'events': [event.to_dict() for event in events]}).encode()
+    try:
+        for url in current_app.config['OUTBOX_WEBHOOK_URLS']:
+            post_events(url, body)
+    except Exception as error:
+        logger.warning('Outbox delivery of %s events failed: %s', len(events), error)
+        for event in events:
+            event.attempts += 1
+            event.last_error = str(error)
+        db.session.commit()
+        return 0
+
+    now = datetime.utcnow()
+    for event in events:
+        event.attempts += 1
+        event.delivered_at = now
+        event.last_error = None
+    db.session.commit()
+    return len(events)
+
+
+# One dispatcher round, returns (sequenced, delivered)
+def dispatch(batch_size=None):
+    batch_size = batch_size or current_app.config['OUTBOX_BATCH_SIZE']
+    try:
+        sequenced = sequence_events(batch_size)
+    except IntegrityError:
+        db.session.rollback()
+        logger.warning('Outbox events were sequenced by another dispatcher')
+        sequenced = 0
+    return sequenced, deliver_events(batch_size)
+
+
+# Dispatcher loop, waits poll_interval seconds when there was nothing to do
+def run_dispatcher(poll_interval, batch_size=None):
+    while True:
+        if not any(dispatch(batch_size)):
+            time.sleep(poll_interval)
@@ -0,0 +1,66 @@
+from flask import request
+from flask_restx import Namespace, Resource, fields
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from http import HTTPStatus
+from ..models import Admin, OutboxEvent
+
+# Change Feed Endpoint
+
+# Largest page of the change feed
+MAX_FEED_LIMIT = 1000
+
+# Changes Namespace
+change_namespace = Namespace('changes', description='Change feed of grade, enrollment and course events')
+
+# Change Event Model
+change_event_model = change_namespace.model('ChangeEvent', {
+    'sequence': fields.Integer(description='Position in the feed, pass the last one as ?after='),
+    'event_id': fields.Integer(description='Event id, the same in webhook deliveries'),
+    'topic': fields.String(description='For example grade.set or enrollment.created'),
+    'payload': fields.Raw(description='Event data'),
+    'created_at': fields.String(description='When the change was made'),
+})
+
+# Change Feed Page Model
+change_feed_model = change_namespace.model('ChangeFeed', {
+    'events': fields.List(fields.Nested(change_event_model)),
+    'cursor': fields.Integer(description='Sequence to pass as ?after= for the next page'),
+    'has_more': fields.Boolean(description='True when the next page is not empty'),
+})
+
+
+# Events after a cursor, admin only
+@change_namespace.route('/')
+class ChangeFeed(Resource):
+    @change_namespace.doc('get_changes', params={
+        'after': 'Return events after this sequence (default 0)',
+        'limit': 'Page size (default 100, at most {})'.format(MAX_FEED_LIMIT),
+        'topic': 'Only events whose topic starts with this, for example grade',
+    })
+    @change_namespace.marshal_with(change_feed_model)
+    @jwt_required()
+    def get(self):
+        '''
+        Get the changes after a cursor
+            by admin only
+        '''
+        admin = Admin.query.filter_by(id=get_jwt_identity(), is_active=True).first()
+        if not admin:
+            change_namespace.abort(HTTPStatus.UNAUTHORIZED, 'You are not authorized to perform this action')
+
+        after = request.args.get('after', 0, type=int)
+        limit = min(max(request.args.get('limit', 100, type=int), 1), MAX_FEED_LIMIT)
+        topic = request.args.get('topic')
+
+        query = OutboxEvent.query.filter(OutboxEvent.sequence > after)
+        if topic:
+            query = query.filter(OutboxEvent.topic.startswith(topic, autoescape=True))
+        events = query.order_by(OutboxEvent.sequence).limit(limit + 1).all()
+
+        page = events[:limit]
+        response = {
+            'events': [event.to_dict() for event in page],
+            'cursor': page[-1].sequence if page else after,
+            'has_more': len(events) > limit,
+        }
+        return response, HTTPStatus.OK
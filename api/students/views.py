@@ -1,6 +1,10 @@
+from datetime import datetime
+from flask import request
 from flask_restx import Namespace, Resource, fields
-from ..models import Student,  Admin
+from sqlalchemy.orm import selectinload
+from ..models import Student,  Admin, ArchivedEnrollment, Enrollment, Term
 from ..utils import db
+from ..jobs.tasks import enqueue
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from http import HTTPStatus
 
@@ -10,9 +14,10 @@ from http import HTTPStatus
 # Student Namespace
 student_namespace = Namespace('students', description='Students related operations')
 
-# Calculate GPA for a student
-def calculate_gpa(student):
-    enrollments = student.enrollments
+# Calculate GPA for a student, over all their live enrollments unless given
+def calculate_gpa(student, enrollments=None):
+    if enrollments is None:
+        enrollments = student.enrollments
     if not enrollments:
         return None
 
@@ -21,16 +26,86 @@ def calculate_gpa(student):
 
     for enrollment in enrollments:
         course = enrollment.course
+        if course.deleted_at:
+            continue
         credits = course.credits
         grade = enrollment.grade or 0.0
 
         total_credits += credits
         total_points += grade * credits
 
+    # Every course of the student was deleted
+    if not total_credits:
+        return None
+
     gpa = total_points / total_credits
     return gpa
 
 
+# Enrollments of a student as shown on the transcript
+def transcript_enrollments(student, enrollments=None):
+    if enrollments is None:
+        enrollments = student.enrollments
+    transcript = []
+    for enrollment in enrollments:
+        course = enrollment.course
+        if course.deleted_at:
+            continue
+        transcript.append({
+            'course_name': course.name,
+            'course_description': course.description,
+            'term_id': enrollment.term_id,
+            'grade': enrollment.grade
+        })
+    return transcript
+
+
+# Value of ?term= for every term, archived ones included
+ALL_TERMS = 'all'
+
+
+# Term asked for with ?term=, the current term by default, a term id or 'all'
+def requested_term():
+    value = request.args.get('term', 'current')
+    if value == ALL_TERMS:
+        return ALL_TERMS
+    if value == 'current':
+        return Term.current()
+    if not value.isdigit():
+        student_namespace.abort(HTTPStatus.BAD_REQUEST, 'term must be a term id, current or all')
+    term = db.session.get(Term, int(value))
+    if term is None:
+        student_namespace.abort(HTTPStatus.NOT_FOUND, 'Term not found')
+    return term
+
+
+# Enrollments of the students in a term as {student_id: [enrollment, ...]}
+# One query on the term (partition) of the live table, or on the archive
+# when the term was archived, both for ALL_TERMS.
+def term_enrollments(student_ids, term):
+    enrollments = {student_id: [] for student_id in student_ids}
+    if term is None:
+        return enrollments
+
+    queries = []
+    for model, archived in ((Enrollment, False), (ArchivedEnrollment, True)):
+        if term != ALL_TERMS and bool(term.archived_at) != archived:
+            continue
+        query = model.query.filter(model.student_id.in_(student_ids))
+        if term != ALL_TERMS:
+            query = query.filter(model.term_id == term.id)
+        queries.append(query.options(selectinload(model.course)).order_by(model.term_id, model.id))
+
+    for query in queries:
+        for enrollment in query:
+            enrollments[enrollment.student_id].append(enrollment)
+    return enrollments
+
+
+# Largest batch for the transcripts endpoint, kept within one selectinload IN query
+MAX_TRANSCRIPT_BATCH = 500
+
+
 # Student Model or Schema
 student_model = student_namespace.model('Student', {
     'id': fields.String(required=True, description='Student id'),
@@ -38,6 +113,25 @@ student_model = student_namespace.model('Student', {
     'email': fields.String(required=True, description='Student email'),
 })
 
+# Student Create Model
+student_create_model = student_namespace.model('StudentCreate', {
+    'full_name': fields.String(required=True, min_length=1, description='Student name'),
+    'email': fields.String(required=True, min_length=3, description='Student email'),
+    'password': fields.String(required=True, min_length=1, description='Student password'),
+})
+
+# Student Update Model
+student_update_model = student_namespace.model('StudentUpdate', {
+    'full_name': fields.String(required=True, min_length=1, description='Student name'),
+    'email': fields.String(required=True, min_length=3, description='Student email'),
+})
+
+
+# Batch Transcripts Model
+transcripts_model = student_namespace.model('Transcripts', {
+    'student_ids': fields.List(fields.Integer, required=True, description='Student ids'),
+})
+
 
 # Student Get and Create to get all students and create a new student
 @student_namespace.route('/')
@@ -53,7 +147,7 @@ class StudentGetCreate(Resource):
         return Student.get_students(), HTTPStatus.OK
     
     @student_namespace.doc('create_student')
-    @student_namespace.expect(student_model)
+    @student_namespace.expect(student_create_model)
     @student_namespace.response(HTTPStatus.CREATED, 'Student created')
     @jwt_required()
     def post(self):
@@ -77,10 +171,12 @@ class StudentGetCreate(Resource):
             return response, HTTPStatus.UNAUTHORIZED
 
         data = student_namespace.payload
+        if Student.query.filter_by(email=data['email']).first():
+            return {'message': 'Student already exists'}, HTTPStatus.CONFLICT
+
         new_student = Student(
-            full_name=data['name'],
+            full_name=data['full_name'],
             email=data['email'],
-            is_student=data['is_student'],
             is_admin=False
         )
         new_student.set_password(data['password'])
@@ -101,16 +197,11 @@ class StudentGetUpdateDelete(Resource):
         user_jwt = get_jwt_identity()
         student = Student.get_by_id(id)
         
-        enrollments = []
-        for enrollment in student.enrollments:
-            course = enrollment.course
-            enrollments.append({
-                'course_name': course.name,
-                'course_description': course.description,
-                'grade': enrollment.grade
-            })
+        term_rows = term_enrollments([student.id], requested_term())[student.id]
+
+        enrollments = transcript_enrollments(student, term_rows)
 
-        gpa = calculate_gpa(student)
+        gpa = calculate_gpa(student, term_rows)
 
         if not student:
             return {'message': 'Student not found'}, HTTPStatus.NOT_FOUND
@@ -139,7 +230,7 @@ class StudentGetUpdateDelete(Resource):
         return response, HTTPStatus.OK
     
     @student_namespace.doc('update_student')
-    @student_namespace.expect(student_model)
+    @student_namespace.expect(student_update_model)
     @student_namespace.response(HTTPStatus.OK, 'Student updated')
     @jwt_required()
     def put(self, id):
@@ -165,9 +256,9 @@ class StudentGetUpdateDelete(Resource):
             return {'message': 'You can\'t update this student'}, HTTPStatus.UNAUTHORIZED
             
         
-        student = Student.query.get_or_404(id)
+        student = Student.get_by_id(id)
         data = student_namespace.payload
-        student.full_name=data['name']
+        student.full_name=data['full_name']
         student.email=data['email']
         student.save()
 
@@ -197,10 +288,78 @@ class StudentGetUpdateDelete(Resource):
             
         
 
-        student = Student.query.get_or_404(id)
-        db.session.delete(student)
+        # Hide the student now and remove their enrollments in the background
+        student = Student.get_by_id(id)
+        student.deleted_at = datetime.utcnow()
+        enqueue('purge_student', {'student_id': student.id}, created_by=current_user.id)
         db.session.commit()
         return {'message': 'Student deleted'}, HTTPStatus.OK
 
 
+@student_namespace.route('/student/<int:id>/gpa')
+class StudentGPA(Resource):
+    @student_namespace.doc('get_student_gpa')
+    @jwt_required()
+    def get(self, id):
+        '''
+        Get a student GPA
+            by admin or student(only if it is the current student)
+        '''
+        user_jwt = get_jwt_identity()
+        student = Student.get_by_id(id)
+
+        admin = Admin.query.filter_by(id=user_jwt, is_active=True).first()
+
+        if user_jwt != student.id and not admin:
+            return {'message': 'You can\'t View this student'}, HTTPStatus.UNAUTHORIZED
+
+        term_rows = term_enrollments([student.id], requested_term())[student.id]
+        return {'id': student.id, 'gpa': calculate_gpa(student, term_rows)}, HTTPStatus.OK
 
+
+# Transcripts for many students with a fixed number of queries
+@student_namespace.route('/transcripts')
+class StudentTranscripts(Resource):
+    @student_namespace.doc('get_student_transcripts')
+    @student_namespace.expect(transcripts_model)
+    @jwt_required()
+    def post(self):
+        '''
+        Get the transcripts of many students
+            by admin or student(only their own)
+        '''
+        user_jwt = get_jwt_identity()
+        student_ids = list(dict.fromkeys(student_namespace.payload['student_ids']))
+
+        if len(student_ids) > MAX_TRANSCRIPT_BATCH:
+            response = {'message': 'At most {} students per request'.format(MAX_TRANSCRIPT_BATCH)}
+            return response, HTTPStatus.BAD_REQUEST
+
+        admin = Admin.query.filter_by(id=user_jwt, is_active=True).first()
+
+        if not admin and student_ids != [user_jwt]:
+            return {'message': 'You can\'t View these students'}, HTTPStatus.UNAUTHORIZED
+
+        # One query for the students, one for their enrollments in the term and one for the courses
+        term = requested_term()
+        students = Student.query.filter(Student.id.in_(student_ids), Student.deleted_at.is_(None)).all()
+        found = {student.id: student for student in students}
+        enrollments = term_enrollments(list(found), term)
+
+        transcripts = []
+        for student_id in student_ids:
+            student = found.get(student_id)
+            if student:
+                transcripts.append({
+                    'id': student.id,
+                    'full_name': student.full_name,
+                    'email': student.email,
+                    'enrollments': transcript_enrollments(student, enrollments[student_id]),
+                    'gpa': calculate_gpa(student, enrollments[student_id])
+                })
+
+        response = {
+            'transcripts': transcripts,
+            'not_found': [student_id for student_id in student_ids if student_id not in found]
+        }
+        return response, HTTPStatus.OK
@@ -0,0 +1,86 @@
+import tempfile
+import unittest
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from ..models import Admin, Course, Student
+from flask_jwt_extended import create_access_token
+
+# Test Fixtures
+#
+# ApiTestCase gives every test an app with empty tables, its app context
+# pushed and a test client. Subclasses change the config with app_config()
+# and add the rows they need with the add_* helpers, which commit.
+
+
+# Authorization header with an access token for identity
+def auth_headers(identity, **claims):
+    return {'Authorization': 'Bearer {}'.format(create_access_token(identity=identity, additional_claims=claims))}
+
+
+class ApiTestCase(unittest.TestCase):
+
+    # Config class of the app, called before the app is created
+    def app_config(self):
+        return config_dict['test']
+
+    def setUp(self):
+        self.app = create_app(config=self.app_config())
+
+        self.appctx = self.app.app_context()
+
+        self.appctx.push()
+
+        self.client = self.app.test_client()
+
+        db.create_all()
+
+    def tearDown(self):
+        db.drop_all()
+
+        self.appctx.pop()
+
+        self.app = None
+
+        self.client = None
+
+    # Directory removed after the test
+    def temp_dir(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return directory.name
+
+    # Active admin, self.headers carries its token
+    def add_admin(self):
+        admin = Admin(username='admin', password='x', is_active=True)
+        db.session.add(admin)
+        db.session.commit()
+        self.headers = auth_headers(admin.id)
+        return admin
+
+    def add_course(self, name='Test Course', **columns):
+        return self.add_courses(1, name=name, **columns)[0]
+
+    # Courses named 'Course 0', 'Course 1'... unless name is given, columns override the defaults
+    def add_courses(self, count, name=None, **columns):
+        columns = dict({'description': 'Test', 'lecturer': 'Test', 'credits': 3}, **columns)
+        courses = [Course(name=name or 'Course {}'.format(i), **columns) for i in range(count)]
+        db.session.add_all(courses)
+        db.session.commit()
+        return courses
+
+    def add_student(self, full_name='Test Student', email='test@mail.com'):
+        student = Student(full_name=full_name, email=email, password_hash='x')
+        db.session.add(student)
+        db.session.commit()
+        return student
+
+    # Students named 'Student <i>' with the email 's<i>@mail.com', for i from start
+    def add_students(self, count, start=0):
+        students = [
+            Student(full_name='Student {}'.format(i), email='s{}@mail.com'.format(i), password_hash='x')
+            for i in range(start, start + count)
+        ]
+        db.session.add_all(students)
+        db.session.commit()
+        return students
@@ -1,34 +1,9 @@
-import unittest
-from .. import create_app
-from ..config.config import config_dict
-from ..utils import db
-from ..models import Admin
+from . import ApiTestCase
 
 
 
-class TestAuthAdmin(unittest.TestCase):
+class TestAuthAdmin(ApiTestCase):
 
-    def setUp(self):
-        self.app = create_app(config=config_dict['test'])
-
-        self.appctx = self.app.app_context()
-
-        self.appctx.push()
-
-        self.client = self.app.test_client()
-
-        db.create_all()
-
-    def tearDown(self):
-        db.drop_all()
-
-        self.appctx.pop()
-
-        self.app = None
-
-        self.client = None
-
-        
     def test_login_admin(self):
         data = {
             "username": "Test Admin",
@@ -0,0 +1,26 @@
+import unittest
+from .. import create_app
+from ..config.config import config_dict
+
+
+class TestAppFactory(unittest.TestCase):
+
+    def test_mount_selected_namespaces(self):
+        app = create_app(config=config_dict['test'], namespaces=['auth'])
+
+        rules = [rule.rule for rule in app.url_map.iter_rules()]
+
+        self.assertIn('/auth/login', rules)
+
+        self.assertNotIn('/courses/', rules)
+
+    def test_swagger_spec_is_shared_between_apps(self):
+        first = create_app(config=config_dict['test'])
+        second = create_app(config=config_dict['test'])
+
+        first_spec = first.test_client().get('/swagger.json').json
+        second_spec = second.test_client().get('/swagger.json').json
+
+        self.assertEqual(first_spec, second_spec)
+
+        self.assertIs(first.extensions['restx_api'].__schema__, second.extensions['restx_api'].__schema__)
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import os
+from . import ApiTestCase, auth_headers
+from ..asgi import create_asgi_app
+from ..config.config import config_dict
+from ..utils import db, tenant_bind_key
+from ..utils.tenancy import tenant_context
+
+
+# Run a GET through an ASGI app, returns (status, headers, json body)
+async def asgi_get(app, path, headers=None, query_string=b''):
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': query_string,
+        'headers': [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start, body = messages
+    return start['status'], dict(start['headers']), json.loads(body['body'])
+
+
+# Run the requests between the ASGI lifespan startup and shutdown, in one event loop
+def run_asgi(app, requests):
+    async def run():
+        inbox, outbox = asyncio.Queue(), asyncio.Queue()
+        lifespan = asyncio.create_task(app({'type': 'lifespan'}, inbox.get, outbox.put))
+        await inbox.put({'type': 'lifespan.startup'})
+        assert (await outbox.get())['type'] == 'lifespan.startup.complete'
+        try:
+            return [await asgi_get(app, *request) for request in requests]
+        finally:
+            await inbox.put({'type': 'lifespan.shutdown'})
+            await outbox.get()
+            await lifespan
+    return asyncio.run(run())
+
+
+class TestAsgi(ApiTestCase):
+
+    # The async engine needs a database file it can open next to the Flask app's
+    def app_config(self):
+        class AsgiConfig(config_dict['test']):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.temp_dir(), 'school.db')
+            SQLALCHEMY_ECHO = False
+
+        self.config = AsgiConfig
+        return AsgiConfig
+
+    def setUp(self):
+        super().setUp()
+        self.add_admin()
+        # Admins and students share token identities, keep the ids apart
+        _, self.student, other = self.add_students(3)
+        self.course = self.add_course()
+        self.student_headers = auth_headers(self.student.id)
+        self.other_headers = auth_headers(other.id)
+
+    def test_reads_need_a_token(self):
+        (status, _, body), = run_asgi(create_asgi_app(self.config), [('/courses/', {})])
+        self.assertEqual(status, 401)
+
+        (status, _, body), = run_asgi(create_asgi_app(self.config), [
+            ('/courses/', {'Authorization': 'Bearer not-a-token'}),
+        ])
+        self.assertEqual(status, 401)
+
+    def test_reads_match_the_flask_app(self):
+        student_path = '/students/student/{}'.format(self.student.id)
+        results = run_asgi(create_asgi_app(self.config), [
+            ('/courses/', self.student_headers),
+            (student_path, self.student_headers),
+            (student_path + '/gpa', self.student_headers),
+            (student_path, self.other_headers),
+            ('/courses/course/999', self.student_headers),
+        ])
+
+        (courses_status, _, courses), (student_status, _, student), (gpa_status, _, gpa), \
+            (other_status, _, _), (missing_status, _, _) = results
+        self.assertEqual((courses_status, [course['name'] for course in courses]), (200, ['Test Course']))
+        self.assertEqual((student_status, student['email'], student['gpa']), (200, self.student.email, None))
+        self.assertEqual((gpa_status, gpa['id']), (200, self.student.id))
+        self.assertEqual(other_status, 401)
+        self.assertEqual(missing_status, 404)
+
+        flask_student = self.app.test_client().get(student_path, headers=self.student_headers).json
+        self.assertEqual(student, flask_student)
+
+
+class TestAsgiTenants(ApiTestCase):
+
+    def app_config(self):
+        directory = self.temp_dir()
+
+        class TenantConfig(config_dict['test']):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(directory, 'school.db')
+            SQLALCHEMY_ECHO = False
+            TENANTS = {name: 'sqlite:///' + os.path.join(directory, name + '.db') for name in ('north', 'south')}
+            TENANT_HOSTS = {'south.example.org': 'south'}
+
+        self.config = TenantConfig
+        return TenantConfig
+
+    def setUp(self):
+        super().setUp()
+        self.headers = {}
+        for name in ('north', 'south'):
+            db.metadata.create_all(db.engines[tenant_bind_key(name)])
+            with tenant_context(name):
+                student = self.add_student('{} Student'.format(name.title()), 'student@{}.org'.format(name))
+                self.headers[name] = auth_headers(student.id)
+        self.headers[None] = auth_headers(1)
+
+    def test_reads_use_the_token_tenant(self):
+        results = run_asgi(create_asgi_app(self.config), [
+            ('/students/student/1', self.headers['north']),
+            ('/students/student/1', self.headers['south']),
+            ('/students/student/1', dict(self.headers['north'], **{'X-Tenant': 'south'})),
+            ('/students/student/1', dict(self.headers['north'], Host='south.example.org')),
+            ('/students/student/1', dict(self.headers['north'], **{'X-Tenant': 'west'})),
+            # A token of the default database is no good for a school
+            ('/students/student/1', dict(self.headers[None], **{'X-Tenant': 'north'})),
+            ('/students/student/1', self.headers[None]),
+        ])
+
+        statuses = [status for status, _, _ in results]
+        self.assertEqual(statuses, [200, 200, 403, 403, 404, 403, 404])
+        self.assertEqual(results[0][2]['email'], 'student@north.org')
+        self.assertEqual(results[1][2]['email'], 'student@south.org')
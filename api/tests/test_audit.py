@@ -0,0 +1,70 @@
+from . import ApiTestCase
+from ..utils import db
+from ..models import Enrollment, GradeAudit
+from ..jobs.worker import run_pending
+from sqlalchemy import event
+
+
+class TestAudit(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = self.add_admin()
+        self.course = self.add_course()
+        self.students = self.add_students(3)
+        db.session.add_all([Enrollment(student_id=student.id, course_id=self.course.id) for student in self.students])
+        db.session.commit()
+
+    def grade(self, student, grade):
+        response = self.client.post('/enrollments/add-grade', headers=self.headers, json={
+            'student_id': student.id, 'course_id': self.course.id, 'grade': grade
+        })
+        self.assertEqual(response.status_code, 200)
+
+    def test_grade_changes_are_audited(self):
+        self.grade(self.students[0], 2.0)
+        self.grade(self.students[0], 3.5)
+
+        enrollment = Enrollment.query.filter_by(student_id=self.students[0].id).one()
+        response = self.client.get('/audit/grades', query_string={'enrollment_id': enrollment.id, 'limit': 1}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        page = response.json
+        self.assertEqual([(row['old_grade'], row['new_grade'], row['actor_id']) for row in page['changes']], [(2.0, 3.5, self.admin.id)])
+
+        page = self.client.get('/audit/grades', query_string={'enrollment_id': enrollment.id, 'before': page['cursor']}, headers=self.headers).json
+        self.assertEqual([(row['old_grade'], row['new_grade']) for row in page['changes']], [(None, 2.0)])
+        self.assertIsNone(page['cursor'])
+
+    def test_audit_rows_are_written_in_one_batch(self):
+        self.client.post('/jobs/', headers=self.headers, json={'kind': 'bulk_grades', 'payload': {'grades': [
+            {'student_id': student.id, 'course_id': self.course.id, 'grade': 4.0} for student in self.students
+        ]}})
+
+        inserts = []
+        def count(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO grade_audit'):
+                inserts.append(executemany)
+        event.listen(db.engine, 'before_cursor_execute', count)
+        self.addCleanup(event.remove, db.engine, 'before_cursor_execute', count)
+
+        run_pending()
+
+        self.assertEqual(inserts, [True])
+        self.assertEqual(GradeAudit.query.filter_by(actor_id=self.admin.id).count(), 3)
+
+    def test_rolled_back_savepoint_only_drops_its_own_rows(self):
+        first, second = [Enrollment.query.filter_by(student_id=student.id).one() for student in self.students[:2]]
+
+        first.set_grade(2.0, actor_id=self.admin.id)
+        savepoint = db.session.begin_nested()
+        second.set_grade(3.0, actor_id=self.admin.id)
+        savepoint.rollback()
+        db.session.commit()
+
+        self.assertEqual(
+            [(row.student_id, row.course_id, row.term_id, row.new_grade) for row in GradeAudit.query],
+            [(first.student_id, self.course.id, first.term_id, 2.0)],
+        )
+
+        response = self.client.get('/audit/grades', query_string={'term_id': first.term_id}, headers=self.headers)
+        self.assertEqual([row['student_id'] for row in response.json['changes']], [first.student_id])
@@ -0,0 +1,113 @@
+import os
+from unittest import mock
+from . import ApiTestCase
+from ..config.config import config_dict
+from ..utils import db, tenant_bind_key
+from ..utils.tenancy import tenant_context
+from ..models import Course, Enrollment
+from flask_jwt_extended import JWTManager as BaseJWTManager
+
+
+class TestBatch(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_admin()
+        self.course_id = self.add_course().id
+        self.student_id = self.add_student().id
+
+    def test_batch_runs_requests_in_order(self):
+        data = {'requests': [
+            {'method': 'POST', 'path': '/enrollments/enroll/{}/{}'.format(self.student_id, self.course_id)},
+            {'method': 'GET', 'path': '/courses/course/{}/stats'.format(self.course_id)},
+            {'method': 'GET', 'path': '/students/student/{}'.format(self.student_id)},
+        ]}
+
+        response = self.client.post('/batch/', json=data, headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual([result['status'] for result in response.json['results']], [200, 200, 200])
+
+        self.assertEqual(len(response.json['results'][2]['body']['enrollments']), 1)
+
+    def test_atomic_batch_rolls_back(self):
+        data = {'atomic': True, 'requests': [
+            {'method': 'POST', 'path': '/enrollments/enroll/{}/{}'.format(self.student_id, self.course_id)},
+            {'method': 'POST', 'path': '/enrollments/enroll/999/{}'.format(self.course_id)},
+        ]}
+
+        response = self.client.post('/batch/', json=data, headers=self.headers)
+
+        self.assertEqual(response.status_code, 409)
+
+        self.assertFalse(response.json['committed'])
+
+        self.assertIsNone(Enrollment.query.first())
+
+        self.assertEqual(db.session.get(Course, self.course_id).enrollment_count, 0)
+
+    def test_batch_verifies_the_token_once(self):
+        data = {'requests': [
+            {'method': 'GET', 'path': '/students/student/{}'.format(self.student_id)},
+            {'method': 'GET', 'path': '/courses/course/{}'.format(self.course_id)},
+            {'method': 'GET', 'path': '/courses/'},
+        ]}
+        decode = BaseJWTManager._decode_jwt_from_config
+
+        with mock.patch.object(BaseJWTManager, '_decode_jwt_from_config', autospec=True, side_effect=decode) as verify:
+            response = self.client.post('/batch/', json=data, headers=self.headers)
+
+        self.assertEqual([result['status'] for result in response.json['results']], [200, 200, 200])
+        self.assertEqual(verify.call_count, 1)
+
+    def test_nested_batches_are_refused(self):
+        for path in ('/batch/', '/batch/?atomic=1'):
+            data = {'requests': [{'method': 'POST', 'path': path, 'body': {'requests': []}}, {'method': 'GET', 'path': '/courses/'}]}
+
+            response = self.client.post('/batch/', json=data, headers=self.headers)
+
+            self.assertEqual([result['status'] for result in response.json['results']], [400, 200])
+
+        # Only the batch endpoint itself is refused, not every path starting with /batch
+        data = {'requests': [{'method': 'GET', 'path': '/batchy'}]}
+        response = self.client.post('/batch/', json=data, headers=self.headers)
+        self.assertEqual(response.json['results'][0]['status'], 404)
+
+    def test_streams_are_refused(self):
+        data = {'requests': [
+            {'method': 'GET', 'path': '/live/course/1'},
+            {'method': 'GET', 'path': '/live/student/1'},
+            {'method': 'GET', 'path': '/courses/'},
+        ]}
+
+        response = self.client.post('/batch/', json=data, headers=self.headers)
+
+        self.assertEqual([result['status'] for result in response.json['results']], [400, 400, 200])
+        self.assertEqual(response.json['results'][0]['body'], {'message': 'This call can not run in a batch'})
+
+
+class TestTenantBatch(ApiTestCase):
+
+    def app_config(self):
+        class TenantConfig(config_dict['test']):
+            TENANTS = {'north': 'sqlite:///' + os.path.join(self.temp_dir(), 'north.db')}
+
+        return TenantConfig
+
+    def setUp(self):
+        super().setUp()
+        db.metadata.create_all(db.engines[tenant_bind_key('north')])
+        with tenant_context('north'):
+            self.add_admin()
+            self.student_id = self.add_student('North Student', 'student@north.org').id
+        self.headers['X-Tenant'] = 'north'
+
+    def test_sub_requests_run_in_the_batch_school(self):
+        path = '/students/student/{}'.format(self.student_id)
+        data = {'requests': [{'method': 'GET', 'path': path}, {'method': 'GET', 'path': path}]}
+
+        response = self.client.post('/batch/', json=data, headers=self.headers)
+
+        self.assertEqual([result['status'] for result in response.json['results']], [200, 200])
+        self.assertEqual({result['body']['email'] for result in response.json['results']}, {'student@north.org'})
@@ -0,0 +1,63 @@
+import brotli
+import gzip
+import json
+from flask import Response
+from . import ApiTestCase
+
+
+class TestCompression(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_admin()
+        self.add_courses(30)
+
+    def test_catalogue_is_compressed_and_cached(self):
+        plain = self.client.get('/courses/', headers=self.headers)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(plain.headers['Vary'], 'Accept-Encoding')
+
+        headers = dict(self.headers, **{'Accept-Encoding': 'br;q=0.5, gzip'})
+        response = self.client.get('/courses/', headers=headers)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertLess(int(response.headers['Content-Length']), len(plain.data))
+        self.assertEqual(json.loads(gzip.decompress(response.data)), plain.json)
+
+        # The second request is served from the compressed body cache
+        self.assertEqual(self.client.get('/courses/', headers=headers).data, response.data)
+        self.assertEqual(len(self.app.extensions['compression'].bodies), 1)
+
+        # Small bodies and refused encodings are left alone
+        response = self.client.get('/courses/course/1', headers=headers)
+        self.assertNotIn('Content-Encoding', response.headers)
+        response = self.client.get('/courses/', headers=dict(self.headers, **{'Accept-Encoding': 'gzip;q=0'}))
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_brotli_is_preferred(self):
+        plain = self.client.get('/courses/', headers=self.headers)
+
+        response = self.client.get('/courses/', headers=dict(self.headers, **{'Accept-Encoding': 'br, gzip'}))
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertEqual(json.loads(brotli.decompress(response.data)), plain.json)
+
+    def test_streamed_response_is_compressed_in_chunks(self):
+        @self.app.route('/stream')
+        def stream():
+            return Response((json.dumps({'row': i}) + '\n' for i in range(1000)), mimetype='text/plain')
+
+        @self.app.route('/events')
+        def events():
+            return Response(iter(['data: {}\n\n']), mimetype='text/event-stream')
+
+        response = self.client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response.headers)
+        lines = gzip.decompress(response.data).decode().splitlines()
+        self.assertEqual(len(lines), 1000)
+        self.assertEqual(json.loads(lines[-1]), {'row': 999})
+
+        response = self.client.get('/events', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.data, b'data: {}\n\n')
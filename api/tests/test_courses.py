@@ -1,34 +1,11 @@
-import unittest
-from .. import create_app
-from ..config.config import config_dict
+from unittest import mock
+from . import ApiTestCase
 from ..utils import db
-from ..models import Course
-
-
-class TestCourse(unittest.TestCase):
-    def setUp(self):
-        self.app = create_app(config=config_dict['test'])
-
-        self.appctx = self.app.app_context()
-
-        self.appctx.push()
-
-        self.client = self.app.test_client()
-
-        db.create_all()
-
-
-
-    def tearDown(self):
-        db.drop_all()
-
-        self.appctx.pop()
-
-        self.app = None
-
-        self.client = None
+from ..models import Course, CourseSlot, Enrollment
+from ..commands import reconcile_course_counters
 
 
+class TestCourse(ApiTestCase):
     def test_create_course(self):
         data = {
             "name": "Test Course",
@@ -60,4 +37,81 @@ class TestCourse(unittest.TestCase):
 
         self.assertEqual(response.status_code, 200)
 
-        self.assertEqual(response.json['course']['name'], 'Test Course')
\ No newline at end of file
+        self.assertEqual(response.json['course']['name'], 'Test Course')
+
+    def test_course_counters(self):
+        self.add_admin()
+        course = self.add_course()
+        students = self.add_students(2)
+
+        response = self.client.post('/enrollments/enroll/bulk', json={
+            'course_id': course.id, 'student_ids': [students[0].id, students[1].id]
+        }, headers=self.headers)
+        self.assertEqual(response.json['enrolled'], [students[0].id, students[1].id])
+
+        for grade in (4.0, 3.0):
+            self.client.post('/enrollments/add-grade', json={
+                'student_id': students[0].id, 'course_id': course.id, 'grade': grade
+            }, headers=self.headers)
+
+        response = self.client.get('/courses/', headers=self.headers)
+        self.assertEqual(response.json[0]['enrollment_count'], 2)
+        self.assertEqual(response.json[0]['graded_count'], 1)
+        self.assertNotIn('students', response.json[0])
+
+        self.client.delete('/enrollments/unenroll/{}/{}'.format(students[0].id, course.id))
+
+        db.session.expire_all()
+        self.assertEqual((course.enrollment_count, course.graded_count), (1, 0))
+
+        course.graded_count = 5
+        db.session.commit()
+
+        self.assertEqual(reconcile_course_counters(fix=True), [(course.id, 'graded_count', 5, 0)])
+
+        self.assertEqual(reconcile_course_counters(), [])
+
+    def test_bulk_enroll_skips_concurrent_enrollments(self):
+        self.add_admin()
+        course = self.add_course()
+        students = self.add_students(2)
+
+        # Another request enrolls the first student after the bulk enroll read the enrollments
+        def enroll_meanwhile(*args):
+            db.session.execute(Enrollment.__table__.insert().values(student_id=students[0].id, course_id=course.id))
+            return {}
+
+        with mock.patch.object(CourseSlot, 'clashes', side_effect=enroll_meanwhile):
+            response = self.client.post('/enrollments/enroll/bulk', json={
+                'course_id': course.id, 'student_ids': [students[0].id, students[1].id]
+            }, headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['enrolled'], [students[1].id])
+        self.assertEqual(response.json['skipped'], [{'student_id': students[0].id, 'reason': 'Already enrolled or waitlisted'}])
+        db.session.expire_all()
+        # The skipped student's seat claim was rolled back with its savepoint
+        self.assertEqual(course.enrollment_count, 1)
+        self.assertEqual(Enrollment.query.filter_by(course_id=course.id).count(), 2)
+
+    def test_course_stats(self):
+        self.add_admin()
+        course = self.add_course('Stats Course')
+        students = self.add_students(4)
+        db.session.add_all([
+            Enrollment(student_id=student.id, course_id=course.id, grade=grade)
+            for student, grade in zip(students, [0.0, 2.0, 4.0, None])
+        ])
+        db.session.commit()
+
+        stats = self.client.get('/courses/course/{}/stats'.format(course.id), headers=self.headers).json
+        self.assertEqual((stats['count'], stats['mean'], stats['median']), (3, 2.0, 2.0))
+        self.assertAlmostEqual(stats['pass_rate'], 2 / 3)
+
+        self.client.post('/enrollments/add-grade', json={
+            'student_id': students[3].id, 'course_id': course.id, 'grade': 5.0
+        }, headers=self.headers)
+
+        stats = self.client.get('/courses/stats', headers=self.headers).json[0]
+        self.assertEqual((stats['count'], stats['mean'], stats['median']), (4, 2.75, 3.0))
+        self.assertEqual([item['count'] for item in stats['histogram']], [1, 0, 1, 0, 2])
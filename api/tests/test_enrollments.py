@@ -1,34 +1,10 @@
-import unittest
-from .. import create_app
-from ..config.config import config_dict
+from . import ApiTestCase
 from ..utils import db
-from ..models import Enrollment
+from ..models import Course, Enrollment, Waitlist
 
 #  Code For Testing Enrollments
 
-class TestEnrollment(unittest.TestCase):
-
-    def setUp(self):
-        self.app = create_app(config=config_dict['test'])
-
-        self.appctx = self.app.app_context()
-
-        self.appctx.push()
-
-        self.client = self.app.test_client()
-
-        db.create_all()
-
-
-    def tearDown(self):
-        db.drop_all()
-
-        self.appctx.pop()
-
-        self.app = None
-
-        self.client = None
-
+class TestEnrollment(ApiTestCase):
 
     def test_create_enrollment(self):
 
@@ -75,5 +51,77 @@ class TestEnrollment(unittest.TestCase):
 
         self.assertIsNone(enrollment)
 
+    def test_full_course_waitlist_and_promotion(self):
+        '''
+            Test that a full course waitlists students and a drop promotes the next one
+        '''
+        course = self.add_course(capacity=1)
+        students = self.add_students(3)
+
+        response = self.client.post('/enrollments/enroll/{}/{}'.format(students[0].id, course.id))
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post('/enrollments/enroll/{}/{}'.format(students[1].id, course.id))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json['waitlist_position'], 1)
+
+        response = self.client.post('/enrollments/enroll/{}/{}'.format(students[2].id, course.id))
+        self.assertEqual(response.json['waitlist_position'], 2)
+
+        response = self.client.delete('/enrollments/unenroll/{}/{}'.format(students[0].id, course.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['promoted_student_id'], students[1].id)
+
+        db.session.expire_all()
+        self.assertEqual(Course.query.get(course.id).enrollment_count, 1)
+        self.assertEqual(Enrollment.query.filter_by(course_id=course.id).one().student_id, students[1].id)
+        self.assertEqual(Waitlist.query.filter_by(course_id=course.id).one().student_id, students[2].id)
+
+    def test_repeated_drop_releases_the_seat_once(self):
+        '''
+            Test that dropping an enrollment another request already dropped leaves the seat alone
+        '''
+        from ..enrollments.views import drop_enrollment
+
+        course = self.add_course(capacity=1)
+        students = self.add_students(2)
+
+        self.client.post('/enrollments/enroll/{}/{}'.format(students[0].id, course.id))
+        self.client.post('/enrollments/enroll/{}/{}'.format(students[1].id, course.id))
+
+        # Loaded before a concurrent unenroll removed the row
+        stale = Enrollment.query.filter_by(student_id=students[0].id, course_id=course.id).one()
+        db.session.execute(Enrollment.__table__.delete().where(Enrollment.__table__.c.id == stale.id))
+
+        self.assertIsNone(drop_enrollment(stale))
+        db.session.commit()
+
+        self.assertEqual(Course.query.get(course.id).enrollment_count, 1)
+        self.assertEqual(Waitlist.query.filter_by(course_id=course.id).one().student_id, students[1].id)
+
+    def test_seats_are_counted_per_term(self):
+        '''
+            Test that a new current term starts with free seats and dropping an old term enrollment keeps them
+        '''
+        from ..commands import create_term
+
+        course = self.add_course(capacity=1)
+        students = self.add_students(3)
+
+        self.client.post('/enrollments/enroll/{}/{}'.format(students[0].id, course.id))
+        spring = Enrollment.query.one().term_id
+
+        create_term('2026-fall', current=True)
+        self.assertEqual(Course.query.get(course.id).enrollment_count, 0)
+
+        self.assertEqual(self.client.post('/enrollments/enroll/{}/{}'.format(students[1].id, course.id)).status_code, 200)
+        self.assertEqual(self.client.post('/enrollments/enroll/{}/{}'.format(students[2].id, course.id)).status_code, 202)
+
+        response = self.client.delete('/enrollments/unenroll/{}/{}?term_id={}'.format(students[0].id, course.id, spring))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('promoted_student_id', response.json)
 
-    
\ No newline at end of file
+        db.session.expire_all()
+        self.assertEqual(Course.query.get(course.id).enrollment_count, 1)
+        self.assertEqual(Enrollment.query.one().student_id, students[1].id)
+        self.assertEqual(Waitlist.query.one().student_id, students[2].id)
@@ -0,0 +1,50 @@
+import os
+import tempfile
+from sqlalchemy import text
+from . import ApiTestCase
+from ..utils import db
+from ..health import probes
+
+
+class TestHealth(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.app.config['READY_CACHE_SECONDS'] = 0
+
+    def test_healthz_needs_no_token(self):
+        response = self.client.get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['status'], 'ok')
+
+    def test_readyz_checks_the_migration_head(self):
+        # create_all does not stamp the database
+        response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 503)
+        migrations = response.json['databases']['default']['migrations']
+        self.assertEqual(migrations['current'], [])
+
+        with db.engine.begin() as connection:
+            connection.execute(text('CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)'))
+            connection.execute(text('INSERT INTO alembic_version VALUES (:head)'), {'head': migrations['head'][0]})
+        response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['status'], 'ready')
+        self.assertIn('latency_ms', response.json['databases']['default'])
+
+    def test_readyz_fails_while_draining(self):
+        self.app.config['READY_CHECK_MIGRATIONS'] = False
+        self.assertEqual(self.client.get('/readyz').status_code, 200)
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.app.config['DRAIN_FILE'] = os.path.join(directory, 'drain')
+            open(self.app.config['DRAIN_FILE'], 'w').close()
+            response = self.client.get('/readyz')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.json['status'], 'draining')
+
+        try:
+            probes.drain()
+            self.assertEqual(self.client.get('/readyz').status_code, 503)
+        finally:
+            probes.draining.clear()
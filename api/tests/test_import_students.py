@@ -0,0 +1,53 @@
+import csv
+import os
+from . import ApiTestCase
+from ..commands import import_students
+from ..models import Student
+from werkzeug.security import check_password_hash
+
+
+class TestImportStudents(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_student('Existing Student', 'existing@mail.com')
+
+        self.path = os.path.join(self.temp_dir(), 'students.csv')
+        self.error_path = self.path + '.errors.csv'
+        with open(self.path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['full_name', 'email', 'password'])
+            writer.writerows([
+                ['First Student', 'first@mail.com', 'secret1'],
+                ['Second Student', 'second@mail.com', 'secret2'],
+                ['', 'noname@mail.com', 'secret'],
+                ['Bad Email', 'not-an-email', 'secret'],
+                ['Existing Again', 'existing@mail.com', 'secret'],
+                ['First Again', 'first@mail.com', 'secret'],
+                ['Third Student', 'third@mail.com', 'secret3'],
+            ])
+
+    def test_import_students(self):
+        counts = import_students(self.path, self.error_path, chunk_size=2, workers=0)
+
+        self.assertEqual((counts['rows'], counts['imported'], counts['failed']), (7, 3, 4))
+        emails = {student.email for student in Student.query}
+        self.assertEqual(emails, {'existing@mail.com', 'first@mail.com', 'second@mail.com', 'third@mail.com'})
+        third = Student.query.filter_by(email='third@mail.com').first()
+        self.assertTrue(check_password_hash(third.password_hash, 'secret3'))
+
+        with open(self.error_path, newline='') as file:
+            errors = list(csv.DictReader(file))
+        self.assertEqual([(row['line'], row['error']) for row in errors], [
+            ('4', 'full_name, email and password are required'),
+            ('5', 'Invalid email'),
+            ('6', 'Email already registered'),
+            ('7', 'Duplicate email in the file'),
+        ])
+
+    def test_import_hashes_on_a_process_pool(self):
+        counts = import_students(self.path, self.error_path, workers=2)
+
+        self.assertEqual(counts['imported'], 3)
+        second = Student.query.filter_by(email='second@mail.com').first()
+        self.assertTrue(check_password_hash(second.password_hash, 'secret2'))
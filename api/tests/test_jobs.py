@@ -0,0 +1,143 @@
+import json
+from datetime import datetime, timedelta
+from unittest import mock
+from . import ApiTestCase
+from ..utils import db
+from ..models import Course, Enrollment, GradeAudit, Job, OutboxEvent, Student, Waitlist
+from ..jobs import tasks
+from ..jobs.tasks import enqueue, handlers, job
+from ..jobs.worker import run_pending
+
+
+class TestJobs(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_admin()
+
+    def test_bulk_grades_job(self):
+        course = self.add_course()
+        student = self.add_student()
+        db.session.add(Enrollment(student_id=student.id, course_id=course.id))
+        db.session.commit()
+
+        response = self.client.post('/jobs/', json={'kind': 'bulk_grades', 'payload': {'grades': [
+            {'student_id': student.id, 'course_id': course.id, 'grade': 4.0},
+            {'student_id': student.id, 'course_id': 999, 'grade': 4.0},
+        ]}}, headers=self.headers)
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json['id']
+
+        self.assertEqual(self.client.get('/jobs/{}/result'.format(job_id), headers=self.headers).status_code, 409)
+
+        self.assertEqual(run_pending(), 1)
+
+        status = self.client.get('/jobs/{}'.format(job_id), headers=self.headers).json
+        self.assertEqual((status['status'], status['progress']), ('succeeded', 1.0))
+
+        result = self.client.get('/jobs/{}/result'.format(job_id), headers=self.headers).json['result']
+        self.assertEqual(result['updated'], 1)
+        self.assertEqual(len(result['not_enrolled']), 1)
+        self.assertEqual(Enrollment.query.one().grade, 4.0)
+
+    def test_gpa_rebuild_leaves_out_deleted_students(self):
+        course = self.add_course()
+        students = self.add_students(3)
+        students[2].deleted_at = datetime.utcnow()
+        db.session.add_all([
+            Enrollment(student_id=students[0].id, course_id=course.id, grade=4.0),
+            Enrollment(student_id=students[2].id, course_id=course.id, grade=1.0),
+        ])
+        gpa_job = enqueue('gpa_rebuild')
+        db.session.commit()
+
+        self.assertEqual(run_pending(), 1)
+
+        db.session.expire_all()
+        self.assertEqual(json.loads(gpa_job.result), {'students': 2, 'with_gpa': 1, 'mean_gpa': 4.0})
+
+    def test_failed_job_is_retried(self):
+        @job('always_fails')
+        def always_fails(payload, context):
+            raise RuntimeError('boom')
+        self.addCleanup(handlers.pop, 'always_fails')
+
+        failed = enqueue('always_fails', max_attempts=2)
+        db.session.commit()
+
+        self.assertEqual(run_pending(), 2)
+
+        db.session.expire_all()
+        self.assertEqual((failed.status, failed.attempts), ('failed', 2))
+        self.assertIn('boom', failed.error)
+
+        response = self.client.post('/jobs/{}/retry'.format(failed.id), headers=self.headers)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(db.session.get(Job, failed.id).status, 'queued')
+
+    def test_stale_job_out_of_attempts_fails(self):
+        stale = enqueue('gpa_rebuild', max_attempts=1)
+        db.session.commit()
+        stale.status, stale.attempts, stale.heartbeat_at = 'running', 1, datetime.utcnow() - timedelta(hours=1)
+        db.session.commit()
+
+        self.assertEqual(run_pending(), 0)
+
+        db.session.expire_all()
+        self.assertEqual((stale.status, stale.attempts), ('failed', 1))
+        self.assertIsNotNone(stale.finished_at)
+
+    def test_retried_bulk_grades_resume_after_the_last_chunk(self):
+        course = self.add_course()
+        students = self.add_students(3)
+        db.session.add_all([Enrollment(student_id=student.id, course_id=course.id) for student in students])
+        db.session.commit()
+
+        enqueue('bulk_grades', {'grades': [
+            {'student_id': student.id, 'course_id': course.id, 'grade': 4.0} for student in students
+        ]})
+        db.session.commit()
+
+        # The first attempt fails in its second chunk
+        set_grade = Enrollment.set_grade
+        calls = []
+
+        def flaky_set_grade(enrollment, *args, **kwargs):
+            calls.append(enrollment.student_id)
+            if len(calls) == 2:
+                raise RuntimeError('boom')
+            return set_grade(enrollment, *args, **kwargs)
+
+        with mock.patch.object(tasks, 'CHUNK_SIZE', 1), mock.patch.object(Enrollment, 'set_grade', flaky_set_grade):
+            self.assertEqual(run_pending(), 2)
+
+        finished = Job.query.one()
+        self.assertEqual((finished.status, finished.attempts), ('succeeded', 2))
+        self.assertEqual(json.loads(finished.result)['updated'], 3)
+        self.assertEqual(GradeAudit.query.count(), 3)
+        self.assertEqual(OutboxEvent.query.filter_by(topic='grade.set').count(), 3)
+
+    def test_delete_hides_then_purges(self):
+        course = self.add_course(capacity=1)
+        students = self.add_students(2)
+        course_id, first_id, second_id = course.id, students[0].id, students[1].id
+        self.client.post('/enrollments/enroll/{}/{}'.format(first_id, course_id))
+        self.client.post('/enrollments/enroll/{}/{}'.format(second_id, course_id))
+
+        response = self.client.delete('/students/student/{}'.format(first_id), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/students/student/{}'.format(first_id), headers=self.headers).status_code, 404)
+
+        self.assertEqual(run_pending(), 1)
+        self.assertIsNone(db.session.get(Student, first_id))
+        self.assertEqual(Enrollment.query.one().student_id, second_id)
+        self.assertIsNone(Waitlist.query.first())
+
+        response = self.client.delete('/courses/course/{}'.format(course_id), headers=self.headers)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/courses/', headers=self.headers).json, [])
+        self.assertEqual(self.client.get('/courses/course/{}'.format(course_id), headers=self.headers).status_code, 404)
+
+        self.assertEqual(run_pending(), 1)
+        self.assertIsNone(db.session.get(Course, course_id))
+        self.assertIsNone(Enrollment.query.first())
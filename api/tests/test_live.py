@@ -0,0 +1,89 @@
+from . import ApiTestCase, auth_headers
+from ..live.broker import broker
+
+
+class TestLive(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.app.config.update(LIVE_KEEPALIVE_SECONDS=0.1, LIVE_STREAM_SECONDS=5)
+        self.add_admin()
+        self.course = self.add_course()
+        self.student = self.add_student()
+
+    def stream(self, path):
+        response = self.client.get(path, headers=self.headers, buffered=False)
+        self.assertEqual(response.status_code, 200)
+        self.addCleanup(response.close)
+        chunks = iter(response.response)
+        self.assertEqual(next(chunks), b'retry: 3000\n\n')
+        return chunks
+
+    def next_event(self, chunks):
+        for chunk in chunks:
+            if not chunk.startswith(b':'):
+                return chunk.decode()
+
+    def test_student_stream_gets_committed_changes(self):
+        chunks = self.stream('/live/student/{}'.format(self.student.id))
+        self.assertEqual(broker.count, 1)
+
+        self.client.post('/enrollments/enroll/{}/{}'.format(self.student.id, self.course.id))
+        self.assertIn('event: enrollment.created', self.next_event(chunks))
+
+        self.client.post('/enrollments/add-grade', headers=self.headers, json={
+            'student_id': self.student.id, 'course_id': self.course.id, 'grade': 4.0
+        })
+        event = self.next_event(chunks)
+        self.assertIn('event: grade.set', event)
+        self.assertIn('"grade": 4.0', event)
+
+    def test_slow_subscriber_is_cut_off(self):
+        self.app.config['LIVE_QUEUE_SIZE'] = 1
+        chunks = self.stream('/live/course/{}'.format(self.course.id))
+
+        self.client.post('/enrollments/enroll/{}/{}'.format(self.student.id, self.course.id))
+        self.client.delete('/enrollments/unenroll/{}/{}'.format(self.student.id, self.course.id))
+
+        self.assertEqual(self.next_event(chunks), 'event: overflow\ndata: {}\n\n')
+        self.assertEqual(broker.count, 0)
+
+    def test_course_stream_only_shows_a_student_their_own_grades(self):
+        mine = self.add_student('Mine Student', 'mine@mail.com')
+        other = self.add_student('Other Student', 'other@mail.com')
+        for student in (mine, other):
+            self.client.post('/enrollments/enroll/{}/{}'.format(student.id, self.course.id))
+
+        response = self.client.get('/live/course/{}'.format(self.course.id), buffered=False, headers=auth_headers(mine.id))
+        self.assertEqual(response.status_code, 200)
+        self.addCleanup(response.close)
+        chunks = iter(response.response)
+        next(chunks)
+
+        for student, grade in ((other, 2.0), (mine, 4.0)):
+            self.client.post('/enrollments/add-grade', headers=self.headers, json={
+                'student_id': student.id, 'course_id': self.course.id, 'grade': grade
+            })
+
+        event = self.next_event(chunks)
+        self.assertIn('event: grade.set', event)
+        self.assertIn('"student_id": {}'.format(mine.id), event)
+
+    def test_course_stream_withholds_other_students_enrollments(self):
+        mine = self.add_student('Mine Student', 'mine@mail.com')
+        other = self.add_student('Other Student', 'other@mail.com')
+        self.client.post('/enrollments/enroll/{}/{}'.format(mine.id, self.course.id))
+
+        response = self.client.get('/live/course/{}'.format(self.course.id), buffered=False, headers=auth_headers(mine.id))
+        self.assertEqual(response.status_code, 200)
+        self.addCleanup(response.close)
+        chunks = iter(response.response)
+        next(chunks)
+
+        self.client.post('/enrollments/enroll/{}/{}'.format(other.id, self.course.id))
+        self.client.delete('/enrollments/unenroll/{}/{}'.format(other.id, self.course.id))
+        self.client.delete('/enrollments/unenroll/{}/{}'.format(mine.id, self.course.id))
+
+        event = self.next_event(chunks)
+        self.assertIn('event: enrollment.dropped', event)
+        self.assertIn('"student_id": {}'.format(mine.id), event)
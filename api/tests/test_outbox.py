@@ -0,0 +1,58 @@
+from . import ApiTestCase
+from ..models import OutboxEvent
+from ..outbox.dispatcher import dispatch
+
+
+class TestOutbox(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_admin()
+        self.course = self.add_course()
+        self.student = self.add_student()
+
+    def changes(self, after=0, **params):
+        params['after'] = after
+        response = self.client.get('/changes/', query_string=params, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json
+
+    def test_change_feed(self):
+        self.client.post('/enrollments/enroll/{}/{}'.format(self.student.id, self.course.id))
+        self.client.post('/enrollments/add-grade', headers=self.headers, json={
+            'student_id': self.student.id, 'course_id': self.course.id, 'grade': 4.0
+        })
+
+        # Events only show in the feed once the dispatcher numbered them
+        self.assertEqual(self.changes()['events'], [])
+        self.assertEqual(dispatch(), (2, 2))
+
+        page = self.changes(limit=1)
+        self.assertEqual([event['topic'] for event in page['events']], ['enrollment.created'])
+        self.assertTrue(page['has_more'])
+
+        page = self.changes(page['cursor'])
+        self.assertEqual([event['topic'] for event in page['events']], ['grade.set'])
+        self.assertEqual(page['events'][0]['payload']['grade'], 4.0)
+        self.assertFalse(page['has_more'])
+
+        self.client.delete('/enrollments/unenroll/{}/{}'.format(self.student.id, self.course.id))
+        dispatch()
+        self.assertEqual([event['topic'] for event in self.changes(page['cursor'])['events']], ['enrollment.dropped'])
+        self.assertEqual(self.changes(topic='grade')['cursor'], 2)
+
+    def test_failed_delivery_is_retried(self):
+        self.app.config['OUTBOX_WEBHOOK_URLS'] = ['http://127.0.0.1:9/']
+        self.client.post('/enrollments/enroll/{}/{}'.format(self.student.id, self.course.id))
+
+        self.assertEqual(dispatch(), (1, 0))
+        self.assertEqual(dispatch(), (0, 0))
+
+        event = OutboxEvent.query.one()
+        self.assertEqual(event.attempts, 2)
+        self.assertIsNone(event.delivered_at)
+        self.assertIsNotNone(event.last_error)
+
+        self.app.config['OUTBOX_WEBHOOK_URLS'] = []
+        self.assertEqual(dispatch(), (0, 1))
+        self.assertIsNotNone(OutboxEvent.query.one().delivered_at)
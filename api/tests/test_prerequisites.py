@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import tempfile
+from sqlalchemy import event
+from . import ApiTestCase
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from ..courses.prerequisites import CACHE_NAME, creates_cycle, missing_prerequisites, transitive_closure
+from ..models import ArchivedEnrollment, CacheVersion, Course, Enrollment
+
+
+class TestPrerequisites(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_admin()
+        self.student = self.add_student()
+        self.courses = self.add_courses(20)
+
+    def set_prerequisites(self, course, *prerequisites):
+        return self.client.put('/courses/course/{}/prerequisites'.format(course.id), headers=self.headers, json={
+            'prerequisite_ids': [prerequisite.id for prerequisite in prerequisites]
+        })
+
+    def test_transitive_closure(self):
+        closure = transitive_closure({3: {2}, 2: {1}, 4: {1, 3}})
+        self.assertEqual(closure[3], {1, 2})
+        self.assertEqual(closure[4], {1, 2, 3})
+
+    def test_cycles_are_refused(self):
+        first, second, third = self.courses[:3]
+        self.assertEqual(self.set_prerequisites(second, first).status_code, 200)
+        self.assertEqual(self.set_prerequisites(third, second).status_code, 200)
+        self.assertEqual(self.set_prerequisites(first, third).status_code, 409)
+        self.assertEqual(self.set_prerequisites(first, first).status_code, 409)
+
+        response = self.client.get('/courses/course/{}/prerequisites'.format(third.id), headers=self.headers)
+        self.assertEqual(response.json, {'prerequisite_ids': [second.id], 'all_prerequisite_ids': [first.id, second.id]})
+
+        # Edits invalidate the cached closure
+        self.set_prerequisites(second)
+        response = self.client.get('/courses/course/{}/prerequisites'.format(third.id), headers=self.headers)
+        self.assertEqual(response.json['all_prerequisite_ids'], [second.id])
+        self.assertEqual(self.set_prerequisites(first, third).status_code, 200)
+
+    def test_cycle_checks_hold_the_cache_version(self):
+        self.assertEqual(CacheVersion.get(CACHE_NAME), 0)
+        CacheVersion.bump(CACHE_NAME)
+        CacheVersion.bump(CACHE_NAME)
+        db.session.commit()
+        self.assertEqual(CacheVersion.get(CACHE_NAME), 2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'school.db')
+
+            class FileConfig(config_dict['test']):
+                SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+                SQLALCHEMY_ECHO = False
+
+            app = create_app(config=FileConfig)
+            with app.app_context():
+                db.create_all()
+                first, second = Course(name='First', description='Test', lecturer='Test', credits=3), \
+                    Course(name='Second', description='Test', lecturer='Test', credits=3)
+                db.session.add_all([first, second])
+                db.session.commit()
+
+                # Until this check commits or rolls back, a concurrent edit cannot bump the version
+                self.assertFalse(creates_cycle(first.id, [second.id]))
+                other = sqlite3.connect(path, timeout=0)
+                with self.assertRaises(sqlite3.OperationalError):
+                    other.execute('UPDATE cache_versions SET version = version + 1')
+                db.session.rollback()
+                other.execute('UPDATE cache_versions SET version = version + 1')
+                other.rollback()
+                other.close()
+                db.drop_all()
+                db.engine.dispose()
+
+    def test_enrollment_needs_passed_prerequisites(self):
+        for previous, course in zip(self.courses, self.courses[1:]):
+            self.set_prerequisites(course, previous)
+        last = self.courses[-1]
+
+        response = self.client.post('/enrollments/enroll/{}/{}'.format(self.student.id, last.id))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(response.json['missing_prerequisites']), 19)
+
+        # Passed in an archived term, in this term, or failed
+        db.session.add_all(
+            ArchivedEnrollment(student_id=self.student.id, course_id=course.id, term_id=0, grade=3.0)
+            for course in self.courses[:18]
+        )
+        db.session.add(Enrollment(student_id=self.student.id, course_id=self.courses[18].id, grade=0.5))
+        db.session.commit()
+
+        course_id, student_id, failed_id = last.id, self.student.id, self.courses[18].id
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            self.assertEqual(missing_prerequisites(course_id, [student_id]), {student_id: [failed_id]})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        # The cache version and the passed courses, whatever the length of the chain
+        self.assertEqual(len(statements), 2)
+
+        Enrollment.query.filter_by(course_id=self.courses[18].id).one().grade = 4.0
+        db.session.commit()
+        response = self.client.post('/enrollments/enroll/{}/{}'.format(self.student.id, last.id))
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,60 @@
+from . import ApiTestCase, auth_headers
+from .. import create_app
+from ..config.config import config_dict
+
+
+class TestProfiling(ApiTestCase):
+
+    def app_config(self):
+        self.profile_dir = self.temp_dir()
+
+        class ProfileConfig(config_dict['test']):
+            PROFILE_ENABLED = True
+            PROFILE_DIR = self.profile_dir
+            PROFILE_KEEP = 2
+
+        return ProfileConfig
+
+    def setUp(self):
+        super().setUp()
+        self.add_admin()
+        # Admins and students share token identities, keep the ids apart
+        self.add_student('Other Student', 'other@mail.com')
+        self.student_headers = auth_headers(self.add_student().id)
+
+    def profiles(self):
+        response = self.client.get('/admin/profiles', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json
+
+    def test_disabled_profiler_adds_no_hooks(self):
+        app = create_app(config=config_dict['test'])
+        self.assertNotIn('profiler', app.extensions)
+        self.assertEqual(len(app.before_request_funcs[None]), len(self.app.before_request_funcs[None]) - 1)
+
+    def test_admin_header_profiles_the_request(self):
+        # Students can not ask for a profile
+        self.client.get('/courses/', headers=dict(self.student_headers, **{'X-Profile': '1'}))
+        self.assertEqual(self.profiles(), [])
+
+        self.client.get('/courses/', headers=dict(self.headers, **{'X-Profile': '1'}))
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles[0]['endpoint'], 'courses_course_get_create')
+        self.assertEqual(profiles[0]['trigger'], 'header')
+        self.assertEqual(profiles[0]['status'], 200)
+
+        response = self.client.get('/admin/profiles/{}'.format(profiles[0]['id']), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json['functions'])
+        self.assertEqual(self.client.get('/admin/profiles/missing', headers=self.headers).status_code, 404)
+
+    def test_sampled_profiles_are_rotated(self):
+        self.app.config['PROFILE_SAMPLE_RATE'] = 1.0
+        for _ in range(3):
+            self.client.get('/courses/', headers=self.student_headers)
+        self.app.config['PROFILE_SAMPLE_RATE'] = 0.0
+
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual({profile['trigger'] for profile in profiles}, {'sample'})
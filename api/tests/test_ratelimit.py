@@ -0,0 +1,64 @@
+from . import ApiTestCase, auth_headers
+from .. import create_app
+from ..config.config import config_dict
+from ..utils.ratelimit import TokenBucketStore, parse_limit
+
+
+class TestRateLimit(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.app.config['RATELIMIT_RULES'] = {'default': '', 'auth': '2/minute'}
+
+    def test_login_is_limited_per_ip(self):
+        login = {'email': 'nobody@mail.com', 'password': 'x'}
+        self.assertEqual(self.client.post('/auth/login', json=login).status_code, 401)
+        self.assertEqual(self.client.post('/auth/login', json=login).status_code, 401)
+
+        response = self.client.post('/auth/login', json=login)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '30')
+
+        # Other addresses and unlimited namespaces are not affected
+        self.assertEqual(self.client.post('/auth/login', json=login, environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code, 401)
+        self.assertEqual(self.client.get('/courses/').status_code, 401)
+
+    def test_bucket_refills(self):
+        store = TokenBucketStore(':memory:')
+        capacity, rate = parse_limit('2/second')
+        self.assertEqual([store.take('key', capacity, rate, now=100.0) for _ in range(2)], [0, 0])
+        self.assertAlmostEqual(store.take('key', capacity, rate, now=100.0), 0.5)
+        self.assertEqual(store.take('key', capacity, rate, now=100.5), 0)
+
+    def test_no_bucket_is_taken_from_when_one_is_empty(self):
+        store = TokenBucketStore(':memory:')
+        capacity, rate = parse_limit('1/second')
+        self.assertEqual(store.take('principal', capacity, rate, now=100.0), 0)
+
+        self.assertAlmostEqual(store.take_all(['ip', 'principal'], capacity, rate, now=100.0), 1.0)
+        # The IP bucket kept its token
+        self.assertEqual(store.take('ip', capacity, rate, now=100.0), 0)
+
+    def test_admins_and_students_have_separate_buckets(self):
+        self.app.config['RATELIMIT_RULES'] = {'default': '', 'courses': '1/minute'}
+        admin = auth_headers(1, role='admin')
+        student = auth_headers(1, role='student')
+
+        self.assertNotEqual(self.client.get('/courses/', headers=admin, environ_base={'REMOTE_ADDR': '10.0.0.1'}).status_code, 429)
+        self.assertEqual(self.client.get('/courses/', headers=admin, environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code, 429)
+        self.assertNotEqual(self.client.get('/courses/', headers=student, environ_base={'REMOTE_ADDR': '10.0.0.3'}).status_code, 429)
+
+    def test_client_address_comes_from_the_proxy(self):
+        class ProxyConfig(config_dict['test']):
+            PROXY_FIX_HOPS = 1
+
+        app = create_app(config=ProxyConfig)
+        app.config['RATELIMIT_RULES'] = {'default': '', 'courses': '1/minute'}
+        client = app.test_client()
+
+        def status(forwarded_for):
+            return client.get('/courses/', headers={'X-Forwarded-For': forwarded_for}).status_code
+
+        self.assertEqual(status('203.0.113.1'), 401)
+        self.assertEqual(status('203.0.113.1'), 429)
+        self.assertEqual(status('203.0.113.2'), 401)
@@ -0,0 +1,58 @@
+from . import ApiTestCase
+from ..config.config import config_dict
+from ..utils.slowqueries import fingerprint
+
+
+class TestSlowQueries(ApiTestCase):
+
+    def app_config(self):
+        class SlowQueryConfig(config_dict['test']):
+            SLOW_QUERY_ENABLED = True
+            # Record every statement
+            SLOW_QUERY_THRESHOLD_MS = 0
+
+        return SlowQueryConfig
+
+    def setUp(self):
+        super().setUp()
+        self.add_admin()
+        self.add_course()
+        self.app.extensions['slow_queries'].reset()
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM students\n WHERE id IN (?, ?, ?) AND name = 'x' LIMIT 10"),
+            'SELECT * FROM students WHERE id IN (...) AND name = ? LIMIT ?',
+        )
+        self.assertEqual(fingerprint('SELECT * FROM t1 WHERE id = %(id_1)s'), 'SELECT * FROM t1 WHERE id = ?')
+
+    def test_slow_queries_are_aggregated_with_plan(self):
+        for _ in range(2):
+            self.client.get('/courses/course/1', headers=self.headers)
+
+        response = self.client.get('/admin/slow-queries', query_string={'order_by': 'count'}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        course_query = next(query for query in response.json if 'FROM courses' in query['fingerprint'])
+        self.assertEqual(course_query['count'], 2)
+        self.assertEqual(course_query['endpoints'], {'courses_course_get_update_delete': 2})
+        self.assertTrue(any('courses' in line for line in course_query['plan']))
+
+        self.assertEqual(self.client.delete('/admin/slow-queries', headers=self.headers).status_code, 200)
+        self.assertEqual(
+            self.client.get('/admin/slow-queries', query_string={'order_by': 'name'}, headers=self.headers).status_code,
+            400,
+        )
+
+    def test_plans_are_captured_again(self):
+        log = self.app.extensions['slow_queries']
+        self.client.get('/courses/course/1', headers=self.headers)
+        course_query = next(query for query in log.report('count') if 'FROM courses' in query['fingerprint'])
+        first_plan_at = course_query['plan_at']
+
+        # Within the interval the plan is kept, after it the next slow run captures it again
+        self.client.get('/courses/course/1', headers=self.headers)
+        self.assertEqual(log.queries[course_query['fingerprint']]['plan_at'], first_plan_at)
+        log.explain_interval = 0
+        self.client.get('/courses/course/1', headers=self.headers)
+        self.assertGreater(log.queries[course_query['fingerprint']]['plan_at'], first_plan_at)
+        self.assertIsNotNone(log.queries[course_query['fingerprint']]['plan'])
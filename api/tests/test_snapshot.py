@@ -0,0 +1,84 @@
+import math
+import os
+from datetime import datetime
+from . import ApiTestCase
+from ..config.config import config_dict
+from ..utils import db
+from ..analytics.columns import Snapshot
+from ..analytics.queries import course_stats, gpa_distribution, student_gpas
+from ..analytics.snapshot import write_snapshot
+from ..courses.stats import course_stats as live_course_stats
+from ..jobs.tasks import enqueue
+from ..jobs.worker import run_pending
+from ..models import Enrollment, Job
+from ..students.views import calculate_gpa
+from sqlalchemy import event
+
+
+class TestSnapshot(ApiTestCase):
+
+    def app_config(self):
+        self.directory = self.temp_dir()
+
+        class SnapshotConfig(config_dict['test']):
+            EXPORT_DIR = self.directory
+
+        return SnapshotConfig
+
+    def setUp(self):
+        super().setUp()
+        self.courses = [
+            self.add_course('Algebra'),
+            self.add_course('Zoologie', credits=1),
+            self.add_course('Dropped', credits=2, deleted_at=datetime.utcnow()),
+        ]
+        self.students = self.add_students(5)
+        grades = [(0, 0, 4.0), (0, 1, 2.0), (1, 0, 3.5), (1, 2, 5.0), (2, 1, None), (3, 0, 0.5), (3, 1, 5.0)]
+        for student, course, grade in grades:
+            db.session.add(Enrollment(student_id=self.students[student].id, course_id=self.courses[course].id, grade=grade))
+        db.session.commit()
+
+        self.path = os.path.join(self.directory, 'snapshot')
+
+    def test_columns_are_written_in_chunks(self):
+        manifest = write_snapshot(self.path, chunk_size=2)
+
+        self.assertEqual({table: entry['rows'] for table, entry in manifest['tables'].items()},
+                         {'students': 5, 'courses': 3, 'enrollments': 7})
+        self.assertFalse(os.path.exists(self.path + '.partial'))
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(list(snapshot.column('courses', 'name')), ['Algebra', 'Zoologie', 'Dropped'])
+            self.assertEqual(list(snapshot.column('courses', 'deleted')), [0, 0, 1])
+            self.assertEqual(snapshot.column('students', 'full_name')[-1], 'Student 4')
+            grades = snapshot.column('enrollments', 'grade')
+            self.assertEqual(grades[0], 4.0)
+            self.assertTrue(math.isnan(grades[4]))
+
+    def test_queries_match_the_api_without_the_database(self):
+        write_snapshot(self.path)
+        expected_gpas = {student.id: calculate_gpa(student) for student in self.students if student.enrollments}
+        expected_stats = live_course_stats(self.courses[:2])
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        with Snapshot(self.path) as snapshot:
+            gpas = student_gpas(snapshot)
+            stats = course_stats(snapshot)
+            distribution = gpa_distribution(snapshot)
+        self.assertEqual(statements, [])
+
+        self.assertEqual(gpas, expected_gpas)
+        self.assertEqual(stats, expected_stats)
+        self.assertEqual(distribution['count'], 4)
+        self.assertAlmostEqual(distribution['mean'], sum(expected_gpas.values()) / 4)
+
+    def test_snapshot_job(self):
+        enqueue('snapshot')
+        db.session.commit()
+
+        self.assertEqual(run_pending(), 1)
+
+        job = Job.query.one()
+        self.assertEqual(job.status, 'succeeded')
+        with Snapshot(os.path.join(self.directory, 'snapshot-{}'.format(job.id))) as snapshot:
+            self.assertEqual(snapshot.rows('enrollments'), 7)
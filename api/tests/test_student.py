@@ -1,33 +1,12 @@
-import unittest
-from .. import create_app
-from ..config.config import config_dict
+from . import ApiTestCase
 from ..utils import db
-from ..models import Student
+from ..commands import archive_term, create_term
+from ..models import ArchivedEnrollment, Course, Enrollment, Student, Term
+from sqlalchemy import event
 
 
-class TestAuth(unittest.TestCase):
+class TestAuth(ApiTestCase):
   
-    def setUp(self):
-        self.app = create_app(config=config_dict['test'])
-
-        self.appctx = self.app.app_context()
-
-        self.appctx.push()
-
-        self.client = self.app.test_client()
-
-        db.create_all()
-
-
-    def tearDown(self):
-        db.drop_all()
-
-        self.appctx.pop()
-
-        self.app = None
-
-        self.client = None
-
     def test_create_student(self):
         data = {
             "full_name": "Test Student",
@@ -56,8 +35,82 @@ class TestAuth(unittest.TestCase):
 
         assert response.status_code == 200
 
-    
-
-
-
-
+    def test_batch_transcripts_query_count(self):
+        self.add_admin()
+        courses = self.add_courses(3)
+        students = self.add_students(6)
+        db.session.add_all([
+            Enrollment(student_id=student.id, course_id=course.id, grade=3.0)
+            for student in students for course in courses
+        ])
+        db.session.commit()
+
+        statements = []
+        def count(*args):
+            statements.append(args)
+        event.listen(db.engine, 'before_cursor_execute', count)
+
+        def transcripts(student_ids):
+            del statements[:]
+            db.session.expire_all()
+            response = self.client.post('/students/transcripts', json={'student_ids': student_ids}, headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            return response.json, len(statements)
+
+        small, small_queries = transcripts([students[0].id, 999])
+        large, large_queries = transcripts([student.id for student in students])
+
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+        self.assertEqual(small['not_found'], [999])
+        self.assertEqual(len(large['transcripts']), 6)
+        self.assertEqual(large['transcripts'][0]['gpa'], 3.0)
+        self.assertEqual(small_queries, large_queries)
+
+    def test_transcript_defaults_to_current_term(self):
+        self.add_admin()
+        courses = self.add_courses(2)
+        student = self.add_student()
+
+        spring = create_term('2026-spring', current=True)
+        self.client.post('/enrollments/enroll/{}/{}'.format(student.id, courses[0].id))
+        self.client.post('/enrollments/add-grade', json={'student_id': student.id, 'course_id': courses[0].id, 'grade': 4.0}, headers=self.headers)
+
+        fall = create_term('2026-fall', current=True)
+        self.client.post('/enrollments/enroll/{}/{}'.format(student.id, courses[1].id))
+        self.client.post('/enrollments/add-grade', json={'student_id': student.id, 'course_id': courses[1].id, 'grade': 2.0}, headers=self.headers)
+
+        def gpa(term=None):
+            url = '/students/student/{}/gpa'.format(student.id) + ('?term={}'.format(term) if term else '')
+            return self.client.get(url, headers=self.headers).json['gpa']
+
+        self.assertEqual(gpa(), 2.0)
+        self.assertEqual(gpa(spring.id), 4.0)
+        self.assertEqual(gpa('all'), 3.0)
+
+        self.assertEqual(archive_term(spring.id, chunk_size=1), 1)
+
+        db.session.expire_all()
+        self.assertEqual(Enrollment.query.one().term_id, fall.id)
+        self.assertEqual(ArchivedEnrollment.query.one().term_id, spring.id)
+        self.assertIsNotNone(db.session.get(Term, spring.id).archived_at)
+        self.assertEqual(db.session.get(Course, courses[0].id).enrollment_count, 0)
+        self.assertEqual(gpa(spring.id), 4.0)
+        self.assertEqual(gpa('all'), 3.0)
+
+    def test_gpa_without_live_courses(self):
+        self.add_admin()
+        course = self.add_course()
+        student = self.add_student()
+
+        self.client.post('/enrollments/enroll/{}/{}'.format(student.id, course.id))
+        self.client.post('/enrollments/add-grade', json={'student_id': student.id, 'course_id': course.id, 'grade': 4.0}, headers=self.headers)
+        self.assertEqual(self.client.delete('/courses/course/{}'.format(course.id), headers=self.headers).status_code, 204)
+
+        response = self.client.get('/students/student/{}'.format(student.id), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json['gpa'])
+
+        response = self.client.get('/students/student/{}/gpa'.format(student.id), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json['gpa'])
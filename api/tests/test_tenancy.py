@@ -0,0 +1,76 @@
+import os
+import click
+from . import ApiTestCase
+from ..config.config import config_dict
+from ..commands import create_tenant
+from ..utils import db, tenant_bind_key
+from ..utils.tenancy import tenant_context
+from ..models import Student
+from werkzeug.security import generate_password_hash
+
+
+class TestTenancy(ApiTestCase):
+
+    def app_config(self):
+        directory = self.temp_dir()
+        tenants = {
+            name: 'sqlite:///' + os.path.join(directory, name + '.db')
+            for name in ('north', 'south', 'east')
+        }
+
+        class TenantConfig(config_dict['test']):
+            TENANTS = tenants
+            TENANT_HOSTS = {'south.example.org': 'south'}
+
+        return TenantConfig
+
+    def setUp(self):
+        super().setUp()
+        for name in ('north', 'south'):
+            db.metadata.create_all(db.engines[tenant_bind_key(name)])
+            with tenant_context(name):
+                db.session.add(Student(
+                    full_name='{} Student'.format(name.title()),
+                    email='student@{}.org'.format(name),
+                    password_hash=generate_password_hash('secret'),
+                ))
+                db.session.commit()
+
+    def login(self, email, **kwargs):
+        return self.client.post('/auth/login', json={'email': email, 'password': 'secret'}, **kwargs)
+
+    def test_each_tenant_has_its_own_database(self):
+        self.assertEqual(self.login('student@north.org').status_code, 401)
+        self.assertEqual(self.login('student@north.org', headers={'X-Tenant': 'south'}).status_code, 401)
+        self.assertEqual(self.login('student@north.org', headers={'X-Tenant': 'north'}).status_code, 200)
+        self.assertEqual(self.login('student@south.org', base_url='http://south.example.org').status_code, 200)
+        self.assertEqual(self.login('student@north.org', base_url='http://north.example.org').status_code, 200)
+
+        with tenant_context(None):
+            self.assertEqual(Student.query.count(), 0)
+        self.assertIsNot(db.engines[tenant_bind_key('north')], db.engines[tenant_bind_key('south')])
+
+    def test_token_is_bound_to_its_tenant(self):
+        token = self.login('student@north.org', headers={'X-Tenant': 'north'}).json['access_token']
+        headers = {'Authorization': 'Bearer {}'.format(token)}
+
+        # The token alone picks the school
+        response = self.client.get('/students/student/1', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['email'], 'student@north.org')
+
+        response = self.client.get('/students/student/1', headers=dict(headers, **{'X-Tenant': 'south'}))
+        self.assertEqual(response.status_code, 403)
+
+    def test_unknown_tenant(self):
+        self.assertEqual(self.login('student@north.org', headers={'X-Tenant': 'west'}).status_code, 404)
+
+    def test_create_tenant_runs_the_migrations(self):
+        create_tenant('east')
+
+        with tenant_context('east'):
+            self.assertEqual(Student.query.count(), 0)
+        with self.assertRaises(click.UsageError):
+            create_tenant('east')
+        with self.assertRaises(click.BadParameter):
+            create_tenant('west')
@@ -0,0 +1,104 @@
+from sqlalchemy import event
+from . import ApiTestCase
+from ..utils import db
+from ..models import CourseSlot, Enrollment, Waitlist
+from ..enrollments.views import current_term_id
+
+
+class TestTimetable(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_admin()
+        self.courses = self.add_courses(3)
+        self.students = self.add_students(2)
+
+    def set_slots(self, course, *slots):
+        return self.client.put('/courses/course/{}/slots'.format(course.id), headers=self.headers, json={
+            'slots': [{'day': day, 'starts_at': starts_at, 'ends_at': ends_at} for day, starts_at, ends_at in slots]
+        })
+
+    def test_slots_are_validated(self):
+        self.assertEqual(self.set_slots(self.courses[0], (0, '09:00', '10:30'), (2, '09:00', '10:30')).status_code, 200)
+        response = self.client.get('/courses/course/{}/slots'.format(self.courses[0].id), headers=self.headers)
+        self.assertEqual(response.json['slots'][1], {'day': 2, 'starts_at': '09:00', 'ends_at': '10:30'})
+
+        self.assertEqual(self.set_slots(self.courses[1], (0, '11:00', '10:00')).status_code, 400)
+        self.assertEqual(self.set_slots(self.courses[1], (0, '09:00', '10:00'), (0, '09:30', '11:00')).status_code, 400)
+        self.assertEqual(self.set_slots(self.courses[1], (7, '09:00', '10:00')).status_code, 400)
+        self.assertEqual(self.set_slots(self.courses[1], (0, '9am', '10:00')).status_code, 400)
+
+    def test_enrollment_rejects_clashes(self):
+        first, second, third = self.courses
+        self.set_slots(first, (0, '09:00', '10:30'))
+        self.set_slots(second, (0, '10:00', '11:00'), (3, '14:00', '15:00'))
+        self.set_slots(third, (0, '10:30', '11:30'))
+
+        student = self.students[0]
+        self.assertEqual(self.client.post('/enrollments/enroll/{}/{}'.format(student.id, first.id)).status_code, 200)
+
+        response = self.client.post('/enrollments/enroll/{}/{}'.format(student.id, second.id))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json['clashes'], [{
+            'slot': {'day': 0, 'starts_at': '10:00', 'ends_at': '11:00'},
+            'course_id': first.id,
+            'course_name': first.name,
+            'course_slot': {'day': 0, 'starts_at': '09:00', 'ends_at': '10:30'},
+        }])
+
+        # Back to back slots do not clash
+        self.assertEqual(self.client.post('/enrollments/enroll/{}/{}'.format(student.id, third.id)).status_code, 200)
+
+        response = self.client.post('/enrollments/enroll/bulk', headers=self.headers, json={
+            'course_id': second.id, 'student_ids': [student.id, self.students[1].id]
+        })
+        self.assertEqual(response.json['enrolled'], [self.students[1].id])
+        self.assertEqual(response.json['skipped'][0]['reason'], 'Timetable clash')
+        self.assertEqual(len(response.json['skipped'][0]['clashes']), 2)
+        self.assertEqual(Enrollment.query.filter_by(course_id=second.id).count(), 1)
+
+    def test_promotion_passes_over_clashes(self):
+        first, second, _ = self.courses
+        first.capacity = 1
+        extra, = self.add_students(1, start=2)
+        self.set_slots(first, (0, '09:00', '10:30'))
+        self.set_slots(second, (0, '10:00', '11:00'))
+
+        student, clashing = self.students
+        self.client.post('/enrollments/enroll/{}/{}'.format(student.id, first.id))
+        self.assertEqual(self.client.post('/enrollments/enroll/{}/{}'.format(clashing.id, first.id)).status_code, 202)
+        self.assertEqual(self.client.post('/enrollments/enroll/{}/{}'.format(extra.id, first.id)).status_code, 202)
+        # Enrolled in a clashing course while waiting
+        self.assertEqual(self.client.post('/enrollments/enroll/{}/{}'.format(clashing.id, second.id)).status_code, 200)
+
+        response = self.client.delete('/enrollments/unenroll/{}/{}'.format(student.id, first.id))
+        self.assertEqual(response.json['promoted_student_id'], extra.id)
+        self.assertEqual(Waitlist.query.filter_by(course_id=first.id).one().student_id, clashing.id)
+
+    def test_clash_check_follows_the_student_timetable(self):
+        first, second, _ = self.courses
+        self.set_slots(first, (0, '09:00', '10:30'))
+        self.set_slots(second, (0, '10:00', '11:00'))
+        # Many unrelated courses meeting at the same time
+        unrelated = self.add_courses(50, name='Other')
+        db.session.add_all(CourseSlot(course_id=course.id, day=0, starts_at=600, ends_at=660) for course in unrelated)
+        db.session.commit()
+        student = self.students[0]
+        self.client.post('/enrollments/enroll/{}/{}'.format(student.id, first.id))
+
+        course_id, student_id, term_id = second.id, student.id, current_term_id()
+        statements = []
+        listener = lambda *args: statements.append((args[2], args[3]))
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            clashes = CourseSlot.clashes(course_id, [student_id], term_id)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertEqual([clash['course_id'] for clash in clashes[student_id]], [first.id])
+
+        # One query, searching the student's enrollments and then each course's slots by index
+        self.assertEqual(len(statements), 1)
+        statement, parameters = statements[0]
+        plan = [row[3] for row in db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        self.assertIn('ix_enrollments_term_student', plan[0])
+        self.assertFalse([step for step in plan if step.startswith('SCAN')], plan)
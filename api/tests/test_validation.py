@@ -0,0 +1,56 @@
+from flask_restx import Model, fields
+from . import ApiTestCase
+from ..utils.validation import ValidationError, compile_model
+from ..models import Course, Student
+
+
+class TestValidation(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_admin()
+
+    def test_compiled_model_fails_fast(self):
+        item = Model('Item', {'id': fields.Integer(required=True)})
+        check = compile_model(Model('Order', {
+            'items': fields.List(fields.Nested(item), required=True),
+            'note': fields.String(max_length=5),
+        }))
+        check({'items': [{'id': 1}], 'unknown': True})
+
+        with self.assertRaises(ValidationError) as raised:
+            check({'items': [{'id': 1}, {'id': True}], 'note': 'too long'})
+        self.assertEqual(raised.exception.path, 'items.1.id')
+
+        with self.assertRaises(ValidationError) as raised:
+            check({'note': 'x'})
+        self.assertEqual(raised.exception.path, 'items')
+        self.assertIs(compile_model(item), compile_model(item))
+
+    def test_write_endpoints_are_validated(self):
+        response = self.client.post('/enrollments/add-grade', headers=self.headers, json={
+            'student_id': 1, 'course_id': 1, 'grade': 7.5
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['errors'], {'grade': '7.5 is greater than the maximum of 5.0'})
+
+        response = self.client.post('/courses/', headers=self.headers, json={'name': 'Algebra'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('description', response.json['errors'])
+
+        response = self.client.put('/courses/course/1', headers=self.headers, data='not json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_create_student(self):
+        student = {'full_name': 'Test Student', 'email': 'test@mail.com', 'password': 'secret'}
+        response = self.client.post('/students/', headers=self.headers, json=student)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Student.query.filter_by(email='test@mail.com').one().password_hash)
+
+        self.assertEqual(self.client.post('/students/', headers=self.headers, json=student).status_code, 409)
+
+        response = self.client.post('/courses/', headers=self.headers, json={
+            'name': 'Algebra', 'description': 'Linear algebra', 'lecturer': 'Ada', 'credits': 3
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Course.query.one().name, 'Algebra')
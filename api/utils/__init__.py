@@ -1,4 +1,64 @@
-from flask_sqlalchemy import SQLAlchemy
+from flask import g, has_app_context, has_request_context
+from flask_jwt_extended import JWTManager as BaseJWTManager
+from flask_sqlalchemy import SQLAlchemy as BaseSQLAlchemy
+from flask_sqlalchemy.session import Session as BaseSession
 
 
-db = SQLAlchemy()
+TENANT_BIND_PREFIX = 'tenant:'
+
+
+# Bind key of a tenant's database, see tenancy.py
+def tenant_bind_key(tenant):
+    return TENANT_BIND_PREFIX + tenant
+
+
+# Session whose commits only flush while session.info['defer_commit'] is set,
+# so several handlers can run inside one transaction.
+# While a tenant is active whatever goes to the default database goes to the tenant's.
+class Session(BaseSession):
+    def commit(self):
+        if self.info.get('defer_commit'):
+            self.flush()
+        else:
+            super().commit()
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+        tenant = g.get('tenant') if bind is None and has_app_context() else None
+        if tenant is not None:
+            engines = self._db.engines
+            if engine is engines[None]:
+                return engines[tenant_bind_key(tenant)]
+        return engine
+
+
+class SQLAlchemy(BaseSQLAlchemy):
+    def init_app(self, app):
+        super().init_app(app)
+        # Tenant binds hold the default tables, an empty metadata of their own
+        # would only make create_all look for them in every app of the process
+        for key in list(self.metadatas):
+            if key is not None and key.startswith(TENANT_BIND_PREFIX):
+                del self.metadatas[key]
+
+
+db = SQLAlchemy(session_options={'class_': Session})
+
+
+# JWT manager that checks a token's signature once per request: the claims are kept
+# in g.verified_jwt, an (encoded token, claims) pair, for the rest of the request.
+# The batch endpoint hands its pair to every sub-request.
+class JWTManager(BaseJWTManager):
+    def init_app(self, app, add_context_processor=False):
+        super().init_app(app, add_context_processor)
+        # The app context can outlive the request (the test client reuses one)
+        app.teardown_request(lambda error=None: g.pop('verified_jwt', None))
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        verified = g.get('verified_jwt') if has_request_context() else None
+        if verified is not None and verified[0] == encoded_token and csrf_value is None:
+            return verified[1]
+        claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        if has_request_context() and not allow_expired:
+            g.verified_jwt = (encoded_token, claims)
+        return claims
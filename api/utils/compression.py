@@ -0,0 +1,155 @@
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+import brotli
+from flask import current_app, request
+from werkzeug.http import parse_accept_header
+
+# Response Compression
+#
+# Bodies are compressed with brotli or gzip, whichever the client prefers in
+# Accept-Encoding (brotli when it accepts both equally). Bodies smaller than
+# COMPRESS_MIN_SIZE are sent as they are, streamed (generator) responses are
+# compressed chunk by chunk so they are never held in memory, and event
+# streams are left alone so every event reaches the client at once.
+#
+# The catalogue responses (COMPRESS_CACHE_RULES) are the same for every
+# client until a course changes, so their compressed bodies are kept in an
+# LRU cache keyed by a hash of the uncompressed body.
+
+
+# Encodings in order of preference when the client accepts several equally
+ENCODINGS = ('br', 'gzip')
+
+
+# Encoding to answer with for an Accept-Encoding header, None for identity
+def negotiate(accept_encoding):
+    if not accept_encoding:
+        return None
+    return parse_accept_header(accept_encoding).best_match(ENCODINGS)
+
+
+# Compress a whole body
+def compress(body, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(body, quality=level['br'])
+    compressor = gzip_compressor(level['gzip'])
+    return compressor.compress(body) + compressor.flush()
+
+
+def gzip_compressor(level):
+    # wbits 31 writes the gzip header and trailer
+    return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+# Compress an iterable of byte chunks as it is consumed
+def compress_stream(chunks, encoding, level, close=None):
+    try:
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=level['br'])
+            for chunk in chunks:
+                data = compressor.process(chunk)
+                if data:
+                    yield data
+            yield compressor.finish()
+        else:
+            compressor = gzip_compressor(level['gzip'])
+            for chunk in chunks:
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+    finally:
+        if close is not None:
+            close()
+
+
+class CompressedBodyCache:
+    '''
+    LRU cache of compressed bodies, shared by the threads of a worker
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.bodies = OrderedDict()
+
+    def get_or_compress(self, body, encoding, level):
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        with self.lock:
+            compressed = self.bodies.get(key)
+            if compressed is not None:
+                self.bodies.move_to_end(key)
+                return compressed
+
+        compressed = compress(body, encoding, level)
+        with self.lock:
+            self.bodies[key] = compressed
+            if len(self.bodies) > self.size:
+                self.bodies.popitem(last=False)
+        return compressed
+
+
+class Compressor:
+    '''
+    Flask extension compressing the responses after each request
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['COMPRESS_ENABLED']:
+            return
+        app.extensions['compression'] = CompressedBodyCache(app.config['COMPRESS_CACHE_SIZE'])
+        app.after_request(self.after_request)
+
+    # Whether a response can be compressed at all, whatever the client accepts
+    def compressible(self, response):
+        config = current_app.config
+        return (
+            200 <= response.status_code < 300
+            and response.status_code != 204
+            and response.mimetype in config['COMPRESS_MIMETYPES']
+            and 'Content-Encoding' not in response.headers
+            and 'no-transform' not in response.headers.get('Cache-Control', '')
+            and not response.direct_passthrough
+        )
+
+    def after_request(self, response):
+        if not self.compressible(response):
+            return response
+
+        # Caches must keep one copy per encoding
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate(request.headers.get('Accept-Encoding'))
+        if encoding is None or request.method == 'HEAD':
+            return response
+
+        config = current_app.config
+        level = {'gzip': config['COMPRESS_GZIP_LEVEL'], 'br': config['COMPRESS_BROTLI_QUALITY']}
+
+        if response.is_streamed:
+            original = response.response
+            response.response = compress_stream(
+                response.iter_encoded(), encoding, level, getattr(original, 'close', None)
+            )
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < config['COMPRESS_MIN_SIZE']:
+                return response
+            rule = request.url_rule.rule if request.url_rule else None
+            if request.method == 'GET' and rule in config['COMPRESS_CACHE_RULES']:
+                compressed = current_app.extensions['compression'].get_or_compress(body, encoding, level)
+            else:
+                compressed = compress(body, encoding, level)
+            response.set_data(compressed)
+
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+compressor = Compressor()
@@ -0,0 +1,35 @@
+from sqlalchemy import text
+from . import db
+
+# Enrollment Partitions
+#
+# On Postgres the enrollments table is partitioned by LIST (term_id), each term
+# gets its own partition and rows of terms without one land in
+# enrollments_default. Other databases keep one table with (term_id, ...)
+# indexes, so these helpers do nothing there.
+
+
+def is_partitioned():
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+
+def partition_name(term_id):
+    return 'enrollments_term_{:d}'.format(term_id)
+
+
+# Create the partition of a new term, before any enrollment is added to it
+def create_term_partition(term_id):
+    if not is_partitioned():
+        return
+    db.session.execute(text(
+        'CREATE TABLE IF NOT EXISTS {} PARTITION OF enrollments FOR VALUES IN ({:d})'.format(
+            partition_name(term_id), term_id
+        )
+    ))
+
+
+# Drop the (emptied) partition of an archived term
+def drop_term_partition(term_id):
+    if not is_partitioned():
+        return
+    db.session.execute(text('DROP TABLE IF EXISTS {}'.format(partition_name(term_id))))
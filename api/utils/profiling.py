@@ -0,0 +1,154 @@
+import cProfile
+import glob
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from flask import current_app, g, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from ..models import Admin
+
+# Request Profiling
+#
+# Profiles a sampled share of the requests (PROFILE_SAMPLE_RATE) and any
+# request an admin sends with the PROFILE_HEADER header. Each profile is a
+# cProfile dump (<id>.prof, open it with pstats or snakeviz) next to a JSON
+# file with the endpoint and timings (<id>.json), in PROFILE_DIR. Only the
+# newest PROFILE_KEEP profiles are kept.
+#
+# Nothing is registered on the app unless PROFILE_ENABLED is set, so the
+# requests do not pay anything for it when it is off.
+
+
+class Profiler:
+    '''
+    Flask extension profiling the selected requests
+    '''
+
+    def __init__(self, app=None):
+        # cProfile can only profile one request of the process at a time
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['PROFILE_ENABLED']:
+            return
+        os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+        app.extensions['profiler'] = self
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.teardown_request(self.teardown)
+
+    # Why the current request is profiled, None when it is not
+    def trigger(self):
+        config = current_app.config
+        if config['PROFILE_HEADER'] in request.headers:
+            try:
+                verify_jwt_in_request(optional=True)
+                identity = get_jwt_identity()
+            except Exception:
+                identity = None
+            if identity is not None and Admin.query.filter_by(id=identity, is_active=True).first():
+                return 'header'
+        if random.random() < config['PROFILE_SAMPLE_RATE']:
+            return 'sample'
+        return None
+
+    def start(self):
+        trigger = self.trigger()
+        if trigger is None or not self.lock.acquire(blocking=False):
+            return None
+        g.profile = (cProfile.Profile(), trigger, time.time(), time.perf_counter())
+        g.profile[0].enable()
+        return None
+
+    def finish(self, response):
+        self.stop(response.status_code)
+        return response
+
+    # Requests that raised never reach after_request
+    def teardown(self, exception):
+        self.stop(500)
+
+    def stop(self, status):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        profiler, trigger, started_at, started = profile
+        profiler.disable()
+        self.lock.release()
+        duration = time.perf_counter() - started
+
+        directory = current_app.config['PROFILE_DIR']
+        # Ids sort by time, so the newest profiles list first
+        profile_id = '{:%Y%m%dT%H%M%S%f}-{}'.format(datetime.utcfromtimestamp(started_at), uuid.uuid4().hex[:8])
+        profiler.dump_stats(os.path.join(directory, profile_id + '.prof'))
+        metadata = {
+            'id': profile_id,
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'trigger': trigger,
+            'pid': os.getpid(),
+            'started_at': datetime.utcfromtimestamp(started_at).isoformat(),
+            'duration_ms': round(duration * 1000, 3),
+        }
+        with open(os.path.join(directory, profile_id + '.json'), 'w') as file:
+            json.dump(metadata, file)
+        rotate_profiles(directory, current_app.config['PROFILE_KEEP'])
+
+
+# Delete all but the newest keep profiles
+def rotate_profiles(directory, keep):
+    names = sorted(glob.glob(os.path.join(directory, '*.json')), reverse=True)
+    for name in names[keep:]:
+        for path in (name, name[:-len('.json')] + '.prof'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+# Metadata of the newest profiles, newest first
+def recent_profiles(directory, limit):
+    profiles = []
+    for name in sorted(glob.glob(os.path.join(directory, '*.json')), reverse=True)[:limit]:
+        try:
+            with open(name) as file:
+                profiles.append(json.load(file))
+        except (OSError, ValueError):
+            # Deleted by another worker's rotation or still being written
+            continue
+    return profiles
+
+
+# Metadata and the most expensive functions of a profile, None when it does not exist
+def load_profile(directory, profile_id, top=30):
+    path = os.path.join(directory, os.path.basename(profile_id))
+    try:
+        with open(path + '.json') as file:
+            metadata = json.load(file)
+        stats = pstats.Stats(path + '.prof')
+    except (OSError, ValueError):
+        return None
+
+    functions = []
+    for (filename, line, name), (calls, _, own_time, cumulative_time, _) in stats.stats.items():
+        functions.append({
+            'function': '{}:{}({})'.format(filename, line, name),
+            'calls': calls,
+            'own_ms': round(own_time * 1000, 3),
+            'cumulative_ms': round(cumulative_time * 1000, 3),
+        })
+    functions.sort(key=lambda function: function['cumulative_ms'], reverse=True)
+    metadata['functions'] = functions[:top]
+    return metadata
+
+
+profiler = Profiler()
@@ -0,0 +1,166 @@
+import logging
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from flask import current_app, request
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+from http import HTTPStatus
+from .tenancy import current_tenant
+
+# Rate Limiting
+#
+# Token buckets per IP and per principal (the JWT identity with its school),
+# checked before every request. Limits are looked up by route rule
+# ('/auth/login'), then by namespace ('auth'), then 'default', and written as
+# '<requests>/<period>' where period is second, minute, hour or day. The buckets live in a SQLite
+# file so every gunicorn worker on the host shares them; each check is one
+# short write transaction that only takes tokens when every bucket has one.
+# Behind proxies the client address comes from X-Forwarded-For, see
+# PROXY_FIX_HOPS.
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Share of checks that also delete buckets idle long enough to be full again
+PRUNE_PROBABILITY = 0.001
+
+
+# Parse '10/minute' into (capacity, tokens per second)
+def parse_limit(limit):
+    count, _, period = limit.partition('/')
+    return int(count), int(count) / PERIODS[period.strip().rstrip('s')]
+
+
+class TokenBucketStore:
+    '''
+    Token buckets in a SQLite database shared by the worker processes
+
+    Connections are opened per thread (and again after a fork). With
+    ':memory:' every thread has its own buckets, which is only meant for tests.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def connection(self):
+        if getattr(self.local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    # Take a token, returns 0 when allowed or the seconds until a token is available
+    def take(self, key, capacity, rate, now=None):
+        return self.take_all([key], capacity, rate, now)
+
+    # Take a token from every bucket of keys, or from none of them when one is empty
+    # Returns 0 when allowed or the seconds until every bucket has a token
+    def take_all(self, keys, capacity, rate, now=None):
+        now = time.time() if now is None else now
+        connection = self.connection()
+        # Holds the write lock, so no other worker takes tokens between the check and the update
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            waits = []
+            for key in keys:
+                row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                if tokens < 1:
+                    waits.append(max((1 - tokens) / rate, 0.001))
+
+            if not waits:
+                # Refill for the time since the last update and take one token
+                connection.executemany(
+                    'INSERT INTO buckets (key, tokens, updated) VALUES (:key, :capacity - 1, :now) '
+                    'ON CONFLICT (key) DO UPDATE SET '
+                    'tokens = MIN(:capacity, tokens + (:now - updated) * :rate) - 1, updated = :now',
+                    [{'key': key, 'capacity': capacity, 'now': now, 'rate': rate} for key in keys],
+                )
+
+            if random.random() < PRUNE_PROBABILITY:
+                connection.execute('DELETE FROM buckets WHERE updated < ?', (now - PERIODS['day'],))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return max(waits, default=0)
+
+
+class RateLimiter:
+    '''
+    Flask extension checking the rate limits before each request
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['RATELIMIT_ENABLED']:
+            return
+        app.extensions['ratelimit'] = TokenBucketStore(app.config['RATELIMIT_STORAGE'])
+        app.before_request(self.check)
+
+    # Limit of the current request, None when unlimited
+    def limit_for_request(self):
+        rules = current_app.config['RATELIMIT_RULES']
+        rule = request.url_rule.rule if request.url_rule else request.path
+        namespace = rule.strip('/').split('/')[0]
+        for name in (rule, namespace, 'default'):
+            if name in rules:
+                return rules[name] and (name, rules[name])
+        return None
+
+    # '<role>:<JWT identity>' of the request, if it carries a valid token
+    # Admins and students have separate ids, the role keeps their buckets apart.
+    def principal(self):
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except Exception:
+            return None
+        if identity is None:
+            return None
+        return '{}:{}'.format(get_jwt().get('role', 'user'), identity)
+
+    def check(self):
+        matched = self.limit_for_request()
+        if not matched:
+            return None
+
+        name, limit = matched
+        capacity, rate = parse_limit(limit)
+        keys = ['{}|ip|{}'.format(name, request.remote_addr)]
+        principal = self.principal()
+        if principal is not None:
+            # Schools share identities
+            tenant = current_tenant()
+            if tenant is not None:
+                principal = '{}:{}'.format(tenant, principal)
+            keys.append('{}|principal|{}'.format(name, principal))
+
+        store = current_app.extensions['ratelimit']
+        try:
+            retry_after = store.take_all(keys, capacity, rate)
+        except sqlite3.Error:
+            # Fail open, a broken limiter must not take the API down
+            logger.exception('Rate limit check failed')
+            return None
+
+        if retry_after:
+            headers = {'Retry-After': str(math.ceil(retry_after))}
+            return {'message': 'Too many requests, retry later'}, HTTPStatus.TOO_MANY_REQUESTS, headers
+        return None
+
+
+rate_limiter = RateLimiter()
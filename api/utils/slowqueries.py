@@ -0,0 +1,194 @@
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from collections import Counter
+from flask import has_request_context, request
+from sqlalchemy import event
+from . import db
+
+# Slow Query Log
+#
+# Times every statement with the engine's cursor events and records the ones
+# slower than SLOW_QUERY_THRESHOLD_MS by fingerprint (the statement with its
+# literals and IN lists folded), with the endpoints that ran them. The first
+# time a fingerprint is recorded its plan is captured on the same connection:
+# EXPLAIN QUERY PLAN on SQLite, EXPLAIN on Postgres, or EXPLAIN ANALYZE for a
+# SLOW_QUERY_ANALYZE_RATE share of the SELECTs (that runs the query again).
+# The plan is captured again on the first slow run after
+# SLOW_QUERY_EXPLAIN_INTERVAL seconds, keeping the previous one when it
+# changed, so a plan that regresses later shows up.
+#
+# The log is kept in memory per worker process: every gunicorn worker has a
+# log of its own, and GET /admin/slow-queries reads the one of the worker that
+# serves it (the entries carry its pid). It is meant for development and for
+# short investigations, it is off unless SLOW_QUERY_ENABLED is set.
+
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+PARAMETER = re.compile(r'%\(\w+\)s|%s|:\w+|\$\d+')
+IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+SPACES = re.compile(r'\s+')
+
+
+# Statement with its literals and parameters replaced by ?
+def fingerprint(statement):
+    statement = STRING.sub('?', statement)
+    statement = PARAMETER.sub('?', statement)
+    statement = NUMBER.sub('?', statement)
+    statement = IN_LIST.sub('IN (...)', statement)
+    return SPACES.sub(' ', statement).strip()
+
+
+class SlowQueryLog:
+    '''
+    Slow statements aggregated by fingerprint
+    '''
+
+    def __init__(self, threshold_ms, analyze_rate=0.0, max_fingerprints=500, explain_interval=300):
+        self.threshold = threshold_ms / 1000
+        self.analyze_rate = analyze_rate
+        self.explain_interval = explain_interval
+        self.max_fingerprints = max_fingerprints
+        self.lock = threading.Lock()
+        self.queries = {}
+
+    # Time the statements of an engine
+    def attach(self, engine):
+        event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+        event.listen(engine, 'handle_error', self.handle_error)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        elapsed = time.perf_counter() - started
+        if elapsed >= self.threshold:
+            self.record(conn, statement, parameters, elapsed, executemany)
+
+    # A statement that raised never reaches after_cursor_execute
+    def handle_error(self, context):
+        started = context.connection.info.get('query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+    def record(self, conn, statement, parameters, elapsed, executemany):
+        key = fingerprint(statement)
+        endpoint = request.endpoint if has_request_context() else None
+        with self.lock:
+            entry = self.queries.get(key)
+            if entry is None:
+                if len(self.queries) >= self.max_fingerprints:
+                    # Make room by forgetting the query that cost the least so far
+                    del self.queries[min(self.queries, key=lambda name: self.queries[name]['total_ms'])]
+                entry = self.queries[key] = {
+                    'fingerprint': key,
+                    'statement': statement,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'endpoints': Counter(),
+                    'plan': None,
+                    'analyzed': False,
+                    'plan_at': None,
+                    'previous_plan': None,
+                }
+            now = datetime.utcnow()
+            # Claimed under the lock so concurrent slow runs don't all EXPLAIN
+            explain = not executemany and (
+                entry['plan_at'] is None or (now - entry['plan_at']).total_seconds() >= self.explain_interval
+            )
+            if explain:
+                entry['plan_at'] = now
+            elapsed_ms = elapsed * 1000
+            entry['count'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['last_seen'] = now
+            entry['endpoints'][endpoint or '(no request)'] += 1
+
+        if explain:
+            plan, analyzed = explain_statement(conn, statement, parameters, self.analyze_rate)
+            with self.lock:
+                if entry['plan'] is not None and plan != entry['plan']:
+                    entry['previous_plan'] = entry['plan']
+                entry['plan'], entry['analyzed'] = plan, analyzed
+
+    # Recorded queries, the most expensive first
+    def report(self, order_by='total_ms', limit=50):
+        with self.lock:
+            entries = sorted(self.queries.values(), key=lambda entry: entry[order_by], reverse=True)[:limit]
+            return [dict(entry, endpoints=dict(entry['endpoints'].most_common()),
+                         mean_ms=entry['total_ms'] / entry['count'], worker=os.getpid()) for entry in entries]
+
+    def reset(self):
+        with self.lock:
+            self.queries.clear()
+
+
+# Plan of a statement as text lines and whether it was EXPLAIN ANALYZE
+# Runs on the DBAPI cursor so the EXPLAIN itself is neither timed nor recorded
+def explain_statement(conn, statement, parameters, analyze_rate=0.0):
+    dialect = conn.dialect.name
+    analyze = False
+    if dialect == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif dialect == 'postgresql':
+        analyze = statement.lstrip().upper().startswith('SELECT') and random.random() < analyze_rate
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze else 'EXPLAIN '
+    else:
+        return None, False
+
+    cursor = conn.connection.cursor()
+    try:
+        if dialect == 'postgresql':
+            # A failed EXPLAIN must not abort the request's transaction
+            cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception as error:
+            if dialect == 'postgresql':
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            return ['EXPLAIN failed: {}'.format(error)], False
+        if dialect == 'postgresql':
+            cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+    finally:
+        cursor.close()
+
+    if dialect == 'sqlite':
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows], False
+    return [row[0] for row in rows], analyze
+
+
+class SlowQueryRecorder:
+    '''
+    Flask extension recording the slow queries of the app's engines
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['SLOW_QUERY_ENABLED']:
+            return
+        log = SlowQueryLog(
+            app.config['SLOW_QUERY_THRESHOLD_MS'],
+            app.config['SLOW_QUERY_ANALYZE_RATE'],
+            app.config['SLOW_QUERY_MAX_FINGERPRINTS'],
+            app.config['SLOW_QUERY_EXPLAIN_INTERVAL'],
+        )
+        app.extensions['slow_queries'] = log
+        with app.app_context():
+            for engine in db.engines.values():
+                log.attach(engine)
+
+
+slow_query_recorder = SlowQueryRecorder()
@@ -0,0 +1,27 @@
+from flask import current_app
+from flask_restx import Api
+from flask_restx.swagger import Swagger
+
+# Swagger spec shared by every app built in this process, keyed by what
+# changes the spec: the mounted namespaces and the server name
+_schemas = {}
+
+
+class CachedSchemaApi(Api):
+    '''
+    Api that builds its Swagger spec on first use and reuses it across app instances
+
+    '''
+
+    def schema_key(self):
+        namespaces = tuple((ns.name, self.ns_paths.get(ns)) for ns in self.namespaces)
+        return (self.title, namespaces, current_app.config.get('SERVER_NAME'))
+
+    @property
+    def __schema__(self):
+        if self._schema is None:
+            key = self.schema_key()
+            if key not in _schemas:
+                _schemas[key] = Swagger(self).as_dict()
+            self._schema = _schemas[key]
+        return self._schema
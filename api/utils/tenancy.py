@@ -0,0 +1,114 @@
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context, request
+from flask_jwt_extended import decode_token
+from http import HTTPStatus
+from . import tenant_bind_key
+
+# Multi-school Tenancy
+#
+# Every school (tenant) in TENANTS has a database of its own, added to
+# SQLALCHEMY_BINDS as the bind 'tenant:<name>', so each one gets its own
+# engine and connection pool. While a tenant is active (g.tenant) the session
+# sends everything bound to the default database to the tenant's database
+# instead. Without a tenant the default database is used, so a deployment
+# without TENANTS works as before.
+#
+# A request's tenant comes from its token or, without one, its host
+# (TENANT_HOSTS, or the first label of the host name when it names a school)
+# or the TENANT_HEADER. Tokens carry the tenant they were issued for and are
+# refused for any other school.
+
+
+class UnknownTenant(Exception):
+    def __init__(self, name):
+        super().__init__('Unknown tenant {!r}'.format(name))
+        self.name = name
+
+
+# Tenant of the current app context, None for the default database
+def current_tenant():
+    return g.get('tenant') if has_app_context() else None
+
+
+# Run in a new app context of app (the current one by default) with name as the tenant
+@contextmanager
+def tenant_context(name, app=None):
+    app = app or current_app._get_current_object()
+    if name is not None and name not in app.config['TENANTS']:
+        raise UnknownTenant(name)
+    with app.app_context():
+        g.tenant = name
+        yield
+
+
+# Tenant a host name points to
+def host_tenant(host, config):
+    hostname = host.split(':', 1)[0].lower()
+    if hostname in config['TENANT_HOSTS']:
+        return config['TENANT_HOSTS'][hostname]
+    label = hostname.split('.', 1)[0]
+    return label if '.' in hostname and label in config['TENANTS'] else None
+
+
+# Tenant claim added to every token, see JWTManager.additional_claims_loader
+def tenant_claims(identity):
+    tenant = current_tenant()
+    return {'tenant': tenant} if tenant is not None else {}
+
+
+class Tenancy:
+    '''
+    Flask extension giving every school in TENANTS its own database
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    # Call before db.init_app, the tenant binds are added to SQLALCHEMY_BINDS here
+    def init_app(self, app):
+        tenants = app.config['TENANTS']
+        if not tenants:
+            return
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        for name, options in tenants.items():
+            binds[tenant_bind_key(name)] = options
+        app.config['SQLALCHEMY_BINDS'] = binds
+        app.before_request(self.resolve)
+        app.teardown_request(self.reset)
+
+    def resolve(self):
+        config = current_app.config
+        requested = host_tenant(request.host, config) or request.headers.get(config['TENANT_HEADER'])
+        if requested is not None and requested not in config['TENANTS']:
+            return {'message': 'Unknown school'}, HTTPStatus.NOT_FOUND
+
+        token = self.token()
+        if token is None:
+            g.tenant = requested
+            return None
+        # A token without a tenant was issued by the default database
+        claimed = token.get('tenant')
+        if requested is not None and claimed != requested:
+            return {'message': 'The token was issued for another school'}, HTTPStatus.FORBIDDEN
+        g.tenant = claimed
+        return None
+
+    # The app context can outlive the request (the test client reuses one)
+    def reset(self, error=None):
+        g.pop('tenant', None)
+
+    # Claims of the request's bearer token, None without a valid one (the view answers for a bad token)
+    def token(self):
+        config = current_app.config
+        header = request.headers.get(config.get('JWT_HEADER_NAME', 'Authorization'), '')
+        prefix = config.get('JWT_HEADER_TYPE', 'Bearer') + ' '
+        if not header.startswith(prefix):
+            return None
+        try:
+            return decode_token(header[len(prefix):])
+        except Exception:
+            return None
+
+
+tenancy = Tenancy()
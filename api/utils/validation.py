@@ -0,0 +1,191 @@
+import re
+from flask import current_app, request
+from flask_restx import Resource, fields
+from http import HTTPStatus
+
+# Request Validation
+#
+# The Flask Restx models given to @expect are compiled once, at app startup,
+# into plain Python checks, and every POST and PUT with an expected model is
+# checked before its view runs. Validation stops at the first error and
+# answers 400 in the Flask Restx format:
+#
+#     {"message": "Input payload validation failed", "errors": {"grade": "..."}}
+#
+# Only the field types the models use are checked, other fields accept any
+# value, and keys the model does not know are left alone.
+
+VALIDATED_METHODS = ('POST', 'PUT')
+
+
+class ValidationError(Exception):
+    def __init__(self, path, message):
+        super().__init__(message)
+        self.path = path
+        self.message = message
+
+
+# Compiled validators by model, shared by every app built in the process
+_compiled = {}
+
+
+def check_type(python_types, name, bool_allowed=False):
+    def check(value, path):
+        if not isinstance(value, python_types) or (isinstance(value, bool) and not bool_allowed):
+            raise ValidationError(path, '{!r} is not of type \'{}\''.format(value, name))
+    return check
+
+
+# Check of a single field, None when the field accepts anything
+def compile_field(field):
+    if isinstance(field, type):
+        field = field()
+
+    checks = []
+    if isinstance(field, fields.Boolean):
+        checks.append(check_type(bool, 'boolean', bool_allowed=True))
+    elif isinstance(field, fields.Integer):
+        checks.append(check_type(int, 'integer'))
+    elif isinstance(field, (fields.Float, fields.Arbitrary)):
+        checks.append(check_type((int, float), 'number'))
+    elif isinstance(field, fields.String):
+        checks.append(check_type(str, 'string'))
+    elif isinstance(field, fields.Nested):
+        checks.append(compile_model(field.nested))
+    elif isinstance(field, fields.List):
+        checks.append(check_type(list, 'array'))
+        item = compile_field(field.container)
+        if item is not None:
+            def check_items(value, path):
+                for index, element in enumerate(value):
+                    item(element, '{}.{}'.format(path, index))
+            checks.append(check_items)
+
+    minimum, maximum = getattr(field, 'minimum', None), getattr(field, 'maximum', None)
+    if minimum is not None or maximum is not None:
+        def check_range(value, path):
+            if minimum is not None and value < minimum:
+                raise ValidationError(path, '{!r} is less than the minimum of {!r}'.format(value, minimum))
+            if maximum is not None and value > maximum:
+                raise ValidationError(path, '{!r} is greater than the maximum of {!r}'.format(value, maximum))
+        checks.append(check_range)
+
+    min_length, max_length = getattr(field, 'min_length', None), getattr(field, 'max_length', None)
+    if min_length is not None or max_length is not None:
+        def check_length(value, path):
+            if min_length is not None and len(value) < min_length:
+                raise ValidationError(path, '{!r} is too short'.format(value))
+            if max_length is not None and len(value) > max_length:
+                raise ValidationError(path, '{!r} is too long'.format(value))
+        checks.append(check_length)
+
+    if getattr(field, 'pattern', None):
+        pattern = re.compile(field.pattern)
+
+        def check_pattern(value, path):
+            if not pattern.search(value):
+                raise ValidationError(path, '{!r} does not match {!r}'.format(value, field.pattern))
+        checks.append(check_pattern)
+
+    if getattr(field, 'enum', None):
+        allowed = frozenset(field.enum)
+
+        def check_enum(value, path):
+            if value not in allowed:
+                raise ValidationError(path, '{!r} is not one of {!r}'.format(value, sorted(allowed)))
+        checks.append(check_enum)
+
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(value, path):
+        for check in checks:
+            check(value, path)
+    return check_all
+
+
+# Check of a whole model, raises ValidationError on the first bad field
+def compile_model(model):
+    cached = _compiled.get(id(model))
+    if cached is not None and cached[0] is model:
+        return cached[1]
+
+    properties = []
+    for name, field in getattr(model, 'resolved', model).items():
+        if isinstance(field, type):
+            field = field()
+        # Read only fields are filled in by the server
+        if getattr(field, 'readonly', False):
+            continue
+        properties.append((name, bool(getattr(field, 'required', False)), compile_field(field)))
+    properties = tuple(properties)
+
+    def check_model(value, path=''):
+        if not isinstance(value, dict):
+            raise ValidationError(path, '{!r} is not of type \'object\''.format(value))
+        for name, required, check in properties:
+            field_path = '{}.{}'.format(path, name) if path else name
+            item = value.get(name)
+            if item is None:
+                if required:
+                    raise ValidationError(field_path, '\'{}\' is a required property'.format(name))
+                continue
+            if check is not None:
+                check(item, field_path)
+
+    _compiled[id(model)] = (model, check_model)
+    return check_model
+
+
+# Validator of a Flask Restx Resource method, None when it expects no model
+def compile_method(view_method):
+    expected = getattr(view_method, '__apidoc__', {}).get('expect') or []
+    for expect in expected:
+        model = expect[0] if isinstance(expect, (list, tuple)) else expect
+        if isinstance(model, fields.Raw):
+            model = getattr(model, 'nested', None)
+        if hasattr(model, 'resolved'):
+            return compile_model(model)
+    return None
+
+
+class RequestValidator:
+    '''
+    Flask extension validating POST and PUT payloads before the view runs
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    # Call once the namespaces are added, their models are compiled here
+    def init_app(self, app):
+        validators = {}
+        for endpoint, view in app.view_functions.items():
+            resource = getattr(view, 'view_class', None)
+            if resource is None or not issubclass(resource, Resource):
+                continue
+            for method in VALIDATED_METHODS:
+                validator = compile_method(getattr(resource, method.lower(), None))
+                if validator is not None:
+                    validators[(endpoint, method)] = validator
+        app.extensions['validators'] = validators
+        app.before_request(self.check)
+
+    def check(self):
+        if request.method not in VALIDATED_METHODS:
+            return None
+        validator = current_app.extensions['validators'].get((request.endpoint, request.method))
+        if validator is None:
+            return None
+        try:
+            validator(request.get_json(silent=True))
+        except ValidationError as error:
+            response = {'message': 'Input payload validation failed', 'errors': {error.path: error.message}}
+            return response, HTTPStatus.BAD_REQUEST
+        return None
+
+
+request_validator = RequestValidator()
@@ -0,0 +1,6 @@
+from decouple import config
+from api.asgi import create_asgi_app
+
+# Create ASGI app for the read endpoints
+# Run with: uvicorn asgi:app
+app = create_asgi_app(config=config('APP_CONFIG', 'prod'))
@@ -0,0 +1,172 @@
+'''
+Benchmark the read endpoints under the sync Flask app (gunicorn) and the
+async ASGI app (uvicorn).
+
+Reports requests per second, latency and the resident memory of each
+server process tree at the same client concurrency.
+
+    python benchmarks/bench_asgi.py --concurrency 64 --requests 2000
+
+Pass --database-url to run against Postgres instead of a temporary SQLite
+file (the async app then needs asyncpg installed, SQLite needs aiosqlite).
+'''
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seed(students, courses):
+    from api import create_app
+    from api.utils import db
+    from api.models import Admin, Course, Enrollment, Student
+    from flask_jwt_extended import create_access_token
+
+    app = create_app('prod')
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Admin(username='bench', password='x', is_active=True))
+        course_rows = [
+            Course(name='Course {}'.format(i), description='Bench', lecturer='Lecturer', credits=3)
+            for i in range(courses)
+        ]
+        db.session.add_all(course_rows)
+        db.session.flush()
+        for i in range(students):
+            student = Student(full_name='Student {}'.format(i), email='s{}@bench'.format(i), password_hash='x')
+            db.session.add(student)
+            db.session.flush()
+            for course in course_rows[i % courses:i % courses + 5]:
+                db.session.add(Enrollment(student_id=student.id, course_id=course.id, grade=float(i % 5)))
+        db.session.commit()
+        return create_access_token(identity=1)
+
+
+def rss_kb(pid):
+    # Resident memory of a process and all of its children
+    total = 0
+    pids = [pid]
+    while pids:
+        current = pids.pop()
+        try:
+            with open('/proc/{}/status'.format(current)) as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+            with open('/proc/{0}/task/{0}/children'.format(current)) as children:
+                pids.extend(int(child) for child in children.read().split())
+        except FileNotFoundError:
+            continue
+    return total
+
+
+def wait_for(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server on port {} did not start'.format(port))
+
+
+def run_load(port, token, paths, total, concurrency):
+    def fetch(i):
+        request = urllib.request.Request(
+            'http://127.0.0.1:{}{}'.format(port, paths[i % len(paths)]),
+            headers={'Authorization': 'Bearer {}'.format(token)},
+        )
+        start = time.perf_counter()
+        with urllib.request.urlopen(request) as response:
+            response.read()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = sorted(pool.map(fetch, range(total)))
+    elapsed = time.perf_counter() - start
+    return {
+        'rps': total / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def bench_server(name, command, port, token, paths, args, env):
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(port)
+        run_load(port, token, paths, min(args.requests, 200), args.concurrency)
+        idle = rss_kb(process.pid)
+        result = run_load(port, token, paths, args.requests, args.concurrency)
+        result['rss_idle_mb'] = idle / 1024
+        result['rss_load_mb'] = rss_kb(process.pid) / 1024
+        result['name'] = name
+        return result
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--courses', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--sync-workers', type=int, default=4)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tmp, 'bench.db')
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-secret')
+    # Every client comes from one address, the rate limits would throttle the load
+    os.environ.setdefault('RATELIMIT_ENABLED', 'False')
+    sys.path.insert(0, ROOT)
+    token = seed(args.students, args.courses)
+    env = dict(os.environ, APP_CONFIG='prod')
+
+    paths = ['/courses/course/{}'.format(i % args.courses + 1) for i in range(10)]
+    paths += ['/students/student/{}'.format(i + 1) for i in range(40)]
+    paths += ['/students/student/{}/gpa'.format(i + 1) for i in range(10)]
+
+    sync_port, async_port = free_port(), free_port()
+    results = [
+        bench_server(
+            'sync gunicorn x{}'.format(args.sync_workers),
+            [sys.executable, '-m', 'gunicorn', '-w', str(args.sync_workers),
+             '-b', '127.0.0.1:{}'.format(sync_port), "api:create_app('prod')"],
+            sync_port, token, paths, args, env,
+        ),
+        bench_server(
+            'asgi uvicorn x1',
+            [sys.executable, '-m', 'uvicorn', '--port', str(async_port), '--log-level', 'warning', 'asgi:app'],
+            async_port, token, paths, args, env,
+        ),
+    ]
+
+    print('concurrency={} requests={}'.format(args.concurrency, args.requests))
+    print('{:<22}{:>10}{:>10}{:>10}{:>14}{:>14}'.format('server', 'req/s', 'p50 ms', 'p99 ms', 'rss idle MB', 'rss load MB'))
+    for result in results:
+        print('{name:<22}{rps:>10.0f}{p50_ms:>10.1f}{p99_ms:>10.1f}{rss_idle_mb:>14.1f}{rss_load_mb:>14.1f}'.format(**result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+'''
+Compare gunicorn boot time and worker memory with and without the preloaded
+production entry point (wsgi.py + gunicorn.conf.py).
+
+Boot time is measured until every worker has answered a Swagger spec
+request. Memory is reported per worker as RSS and PSS; PSS splits shared
+pages between the processes using them, so it shows what copy-on-write
+sharing actually saves.
+
+    python benchmarks/bench_boot.py --workers 4
+'''
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def children(pid):
+    try:
+        with open('/proc/{0}/task/{0}/children'.format(pid)) as handle:
+            return [int(child) for child in handle.read().split()]
+    except FileNotFoundError:
+        return []
+
+
+def memory_kb(pid):
+    values = {}
+    with open('/proc/{}/smaps_rollup'.format(pid)) as handle:
+        for line in handle:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                values[parts[0][:-1].lower()] = int(parts[1])
+    return values
+
+
+def boot(command, port, workers, env):
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = 'http://127.0.0.1:{}/swagger.json'.format(port)
+    answered = 0
+    # Each worker builds its spec on its first hit, keep asking until all have answered quickly
+    while answered < workers * 4:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                response.read()
+            answered += 1
+        except OSError:
+            time.sleep(0.05)
+            if time.perf_counter() - start > 60:
+                process.terminate()
+                raise RuntimeError('gunicorn did not boot')
+    elapsed = time.perf_counter() - start
+    time.sleep(0.5)
+    worker_memory = [memory_kb(pid) for pid in children(process.pid)]
+    process.terminate()
+    process.wait()
+    return elapsed, worker_memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        APP_CONFIG='prod',
+        DATABASE_URL=os.environ.get('DATABASE_URL', 'sqlite:///' + os.path.join(tmp, 'bench.db')),
+        JWT_SECRET_KEY=os.environ.get('JWT_SECRET_KEY', 'bench-secret'),
+        WEB_CONCURRENCY=str(args.workers),
+    )
+
+    runs = []
+    port = free_port()
+    runs.append(('per-worker create_app', boot(
+        [sys.executable, '-m', 'gunicorn', '-c', os.devnull, '-w', str(args.workers), '-b', '127.0.0.1:{}'.format(port),
+         "api:create_app('prod')"],
+        port, args.workers, env,
+    )))
+    port = free_port()
+    runs.append(('preloaded wsgi.py', boot(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', '127.0.0.1:{}'.format(port), 'wsgi:app'],
+        port, args.workers, env,
+    )))
+
+    print('workers={}'.format(args.workers))
+    print('{:<24}{:>10}{:>18}{:>18}'.format('mode', 'boot s', 'worker rss MB', 'worker pss MB'))
+    for name, (elapsed, memory) in runs:
+        rss = sum(item['rss'] for item in memory) / len(memory) / 1024
+        pss = sum(item['pss'] for item in memory) / len(memory) / 1024
+        print('{:<24}{:>10.2f}{:>18.1f}{:>18.1f}'.format(name, elapsed, rss, pss))
+
+
+if __name__ == '__main__':
+    main()
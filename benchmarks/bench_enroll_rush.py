@@ -0,0 +1,136 @@
+'''
+Registration rush load test for course capacity and waitlists.
+
+Starts gunicorn, then for each round sends one enrol request per student
+from hundreds of parallel clients at a single course with a small capacity.
+After each round it checks that the course is not over-enrolled, that every
+other student is on the waitlist exactly once and that the seat counter
+matches the enrolment rows. Throughput is reported per round so it can be
+checked for stability.
+
+    python benchmarks/bench_enroll_rush.py --clients 300 --capacity 40 --rounds 5
+'''
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server on port {} did not start'.format(port))
+
+
+def enrol(port, student_id, course_id, statuses, barrier):
+    barrier.wait()
+    request = urllib.request.Request(
+        'http://127.0.0.1:{}/enrollments/enroll/{}/{}'.format(port, student_id, course_id), method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            statuses.append(response.status)
+    except urllib.error.HTTPError as error:
+        statuses.append(error.code)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    parser.add_argument('--clients', type=int, default=300)
+    parser.add_argument('--capacity', type=int, default=40)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tmp, 'rush.db')
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-secret')
+    # Every client comes from one address, the rate limits would throttle the load
+    os.environ.setdefault('RATELIMIT_ENABLED', 'False')
+    sys.path.insert(0, ROOT)
+
+    from api import create_app
+    from api.utils import db
+    from api.models import Course, Enrollment, Student, Term, Waitlist
+
+    app = create_app('prod')
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([
+            Student(full_name='Student {}'.format(i), email='s{}@rush'.format(i), password_hash='x')
+            for i in range(args.clients)
+        ])
+        db.session.add(Term(name='Rush', is_current=True))
+        db.session.add_all([
+            Course(name='Course {}'.format(i), description='Rush', lecturer='Lecturer', credits=3, capacity=args.capacity)
+            for i in range(args.rounds)
+        ])
+        db.session.commit()
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.devnull, '-w', str(args.workers), '--threads', str(args.threads),
+         '-b', '127.0.0.1:{}'.format(port), "api:create_app('prod')"],
+        cwd=ROOT, env=os.environ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    failed = False
+    try:
+        wait_for(port)
+        print('clients={} capacity={}'.format(args.clients, args.capacity))
+        print('{:<8}{:>10}{:>10}{:>10}{:>10}{:>10}  {}'.format('round', 'req/s', 'enrolled', 'waitlist', 'counter', 'errors', 'check'))
+        for course_id in range(1, args.rounds + 1):
+            statuses = []
+            barrier = threading.Barrier(args.clients + 1)
+            threads = [
+                threading.Thread(target=enrol, args=(port, student_id, course_id, statuses, barrier))
+                for student_id in range(1, args.clients + 1)
+            ]
+            for thread in threads:
+                thread.start()
+            barrier.wait()
+            start = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+            with app.app_context():
+                enrolled = Enrollment.query.filter_by(course_id=course_id).count()
+                waitlisted = Waitlist.query.filter_by(course_id=course_id).count()
+                counter = db.session.get(Course, course_id).enrollment_count
+            errors = sum(1 for status in statuses if status not in (200, 202))
+            ok = enrolled == counter == min(args.capacity, args.clients) and enrolled + waitlisted == args.clients
+            failed = failed or not ok
+            print('{:<8}{:>10.0f}{:>10}{:>10}{:>10}{:>10}  {}'.format(
+                course_id, args.clients / elapsed, enrolled, waitlisted, counter, errors, 'ok' if ok else 'FAILED'
+            ))
+    finally:
+        server.terminate()
+        server.wait()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+'''
+Measure the rate limit check latency with several worker processes.
+
+Every process takes tokens from the shared SQLite bucket store in a loop,
+from an IP and a principal bucket like the app's check, half of them on one
+hot pair (one client hammering the API) and half on pairs of their own, and
+reports the latency of a single check. With --budget-us
+the script exits non-zero when the p99 check is slower.
+
+    python benchmarks/bench_ratelimit.py --processes 4 --checks 5000 --budget-us 1000
+'''
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def worker(path, index, checks, results):
+    sys.path.insert(0, ROOT)
+    from api.utils.ratelimit import TokenBucketStore, parse_limit
+
+    store = TokenBucketStore(path)
+    capacity, rate = parse_limit('100000/second')
+    client = 'hot' if index % 2 == 0 else 'worker-{}'.format(index)
+    keys = ['ip|' + client, 'principal|' + client]
+    store.take_all(keys, capacity, rate)
+
+    timings = []
+    for _ in range(checks):
+        start = time.perf_counter()
+        store.take_all(keys, capacity, rate)
+        timings.append(time.perf_counter() - start)
+    results.put(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--checks', type=int, default=5000)
+    parser.add_argument('--budget-us', type=float)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-secret')
+    path = os.path.join(tempfile.mkdtemp(), 'ratelimit.sqlite3')
+
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(path, index, args.checks, results))
+        for index in range(args.processes)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    timings = sorted(t for _ in processes for t in results.get())
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    def percentile(share):
+        return timings[min(int(len(timings) * share), len(timings) - 1)] * 1e6
+
+    print('processes={} checks={}'.format(args.processes, len(timings)))
+    print('{:<12}{:>10}{:>10}{:>10}{:>12}'.format('', 'p50 us', 'p99 us', 'max us', 'checks/s'))
+    print('{:<12}{:>10.1f}{:>10.1f}{:>10.1f}{:>12.0f}'.format(
+        'take', percentile(0.5), percentile(0.99), timings[-1] * 1e6, len(timings) / elapsed
+    ))
+
+    if args.budget_us is not None and percentile(0.99) > args.budget_us:
+        print('p99 is over the {:.0f} us budget'.format(args.budget_us))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
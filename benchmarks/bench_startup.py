@@ -0,0 +1,74 @@
+'''
+Measure import time and app factory startup.
+
+Reports the time to import the api package in a fresh interpreter, to build
+the first and the following apps with every namespace or just one, and to
+render the Swagger spec for a first and a second app in the same process.
+
+    python benchmarks/bench_startup.py --budget-ms 50
+
+With --budget-ms the script exits non-zero when building a warm app with
+every namespace takes longer, so it can run in CI to catch regressions.
+'''
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time_ms(env):
+    # -X importtime reports cumulative microseconds for each top level import
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import api'],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stderr
+    for line in output.splitlines():
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == 'api':
+            return int(parts[1]) / 1000
+    return float('nan')
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-secret')
+    results = [('import api (fresh interpreter)', import_time_ms(os.environ))]
+
+    sys.path.insert(0, ROOT)
+    from api import create_app
+
+    results.append(('first create_app, all namespaces', timed(lambda: create_app('test'), 1)))
+    warm_all = timed(lambda: create_app('test'), args.repeat)
+    results.append(('create_app, all namespaces', warm_all))
+    results.append(('create_app, auth only', timed(lambda: create_app('test', namespaces=['auth']), args.repeat)))
+
+    # Apps are built up front so only the spec rendering is timed
+    clients = [create_app('test').test_client() for _ in range(args.repeat + 1)]
+    results.append(('first app swagger.json', timed(lambda: clients.pop().get('/swagger.json'), 1)))
+    results.append(('next app swagger.json', timed(lambda: clients.pop().get('/swagger.json'), args.repeat)))
+
+    for name, value in results:
+        print('{:<36}{:>10.2f} ms'.format(name, value))
+
+    if args.budget_ms is not None and warm_all > args.budget_ms:
+        print('create_app took {:.2f} ms, over the {:.2f} ms budget'.format(warm_all, args.budget_ms))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
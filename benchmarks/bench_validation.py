@@ -0,0 +1,67 @@
+'''
+Compare request payload validation paths.
+
+Times checking an add-grade and a create-course payload with the reqparse
+parser add-grade used before, with Flask Restx's jsonschema validation
+(@expect(..., validate=True), which builds a validator on every call), and
+with the validators compiled at startup by api.utils.validation.
+
+    python benchmarks/bench_validation.py --repeat 20000
+'''
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20000)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-secret')
+    sys.path.insert(0, ROOT)
+    from flask_restx import reqparse
+    from api import create_app
+    from api.courses.views import course_input_model
+    from api.enrollments.views import grade_model
+    from api.utils.validation import compile_model
+
+    app = create_app('test')
+
+    # The add-grade parser before the validation layer
+    add_grade_parser = reqparse.RequestParser()
+    add_grade_parser.add_argument('student_id', type=int, required=True, location='json')
+    add_grade_parser.add_argument('course_id', type=int, required=True, location='json')
+    add_grade_parser.add_argument('grade', type=float, required=True, location='json')
+    add_grade_parser.add_argument('term_id', type=int, required=False, location='json')
+
+    grade = {'student_id': 1, 'course_id': 2, 'grade': 4.5}
+    course = {'name': 'Algebra', 'description': 'Linear algebra', 'lecturer': 'Ada', 'credits': 3, 'capacity': 40}
+    check_grade, check_course = compile_model(grade_model), compile_model(course_input_model)
+
+    with app.test_request_context('/enrollments/add-grade', method='POST', json=grade):
+        results = [
+            ('add-grade reqparse', timed(add_grade_parser.parse_args, args.repeat)),
+            ('add-grade jsonschema', timed(lambda: grade_model.validate(grade), args.repeat)),
+            ('add-grade compiled', timed(lambda: check_grade(grade), args.repeat)),
+            ('create-course jsonschema', timed(lambda: course_input_model.validate(course), args.repeat)),
+            ('create-course compiled', timed(lambda: check_course(course), args.repeat)),
+        ]
+
+    for name, value in results:
+        print('{:<28}{:>10.2f} us'.format(name, value))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import decouple
+
+# Gunicorn config for wsgi.py
+
+bind = '0.0.0.0:{}'.format(decouple.config('PORT', 8000, cast=int))
+workers = decouple.config('WEB_CONCURRENCY', 4, cast=int)
+# Threaded workers, a live stream holds a thread rather than a whole worker and
+# the timeout only applies to the worker, not to a stream that stays open.
+# Keep LIVE_MAX_SUBSCRIBERS below threads so streams leave threads for other requests.
+worker_class = decouple.config('GUNICORN_WORKER_CLASS', 'gthread')
+threads = decouple.config('GUNICORN_THREADS', 32, cast=int)
+timeout = decouple.config('GUNICORN_TIMEOUT', 30, cast=int)
+# Seconds workers get to finish their requests after a stop signal
+graceful_timeout = decouple.config('GUNICORN_GRACEFUL_TIMEOUT', 30, cast=int)
+
+# Build the app once in the master so workers share it copy-on-write
+preload_app = True
+
+
+# Connections opened in the master must not be shared with the workers
+def post_fork(server, worker):
+    from api.utils import db
+    from wsgi import app
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+# Seconds a worker keeps serving with /readyz failing after SIGTERM, so the load balancer
+# takes it out before connections drop. Keep it below graceful_timeout.
+drain_seconds = decouple.config('GUNICORN_DRAIN_SECONDS', 10, cast=float)
+
+
+# On SIGTERM fail /readyz at once and stop the worker drain_seconds later.
+# Gunicorn's own handler only stops the worker, the signal is handled here instead.
+def post_worker_init(worker):
+    import signal
+    import threading
+    from api.health.probes import drain, draining
+
+    def handle_term(sig, frame):
+        if draining.is_set():
+            return
+        drain()
+        timer = threading.Timer(drain_seconds, worker.handle_exit, (sig, None))
+        timer.daemon = True
+        timer.start()
+
+    signal.signal(signal.SIGTERM, handle_term)
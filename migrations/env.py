@@ -3,10 +3,12 @@ from __future__ import with_statement
 import logging
 from logging.config import fileConfig
 
-from flask import current_app
+from flask import current_app, g
 
 from alembic import context
 
+from api.utils import tenant_bind_key
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -18,6 +20,10 @@ logger = logging.getLogger('alembic.env')
 
 
 def get_engine():
+    # A school's database under create-tenant-command and migrate-tenant-command
+    tenant = g.get('tenant')
+    if tenant is not None:
+        return current_app.extensions['migrate'].db.engines[tenant_bind_key(tenant)]
     try:
         # this works with Flask-SQLAlchemy<3 and Alchemical
         return current_app.extensions['migrate'].db.get_engine()
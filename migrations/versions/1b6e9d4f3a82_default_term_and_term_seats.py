@@ -0,0 +1,43 @@
+"""default term and seats of the current term
+
+Revision ID: 1b6e9d4f3a82
+Revises: f2d85a3c6b19
+Create Date: 2026-10-20 10:14:27.905311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1b6e9d4f3a82'
+down_revision = 'f2d85a3c6b19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+
+    # New enrollments need a current term, it is no longer created on the first enrollment
+    connection.execute(sa.text(
+        "INSERT INTO terms (name, is_current) SELECT 'Default', :current "
+        "WHERE NOT EXISTS (SELECT 1 FROM terms WHERE is_current = :current OR name = 'Default')"
+    ), {'current': True})
+
+    # Seat counters only count the enrollments of the current term
+    connection.execute(sa.text(
+        'UPDATE courses SET enrollment_count = (SELECT COUNT(*) FROM enrollments '
+        'WHERE enrollments.course_id = courses.id AND enrollments.term_id = '
+        '(SELECT MAX(id) FROM terms WHERE is_current = :current))'
+    ), {'current': True})
+
+
+def downgrade():
+    connection = op.get_bind()
+
+    # Seat counters count the enrollments of every term again
+    connection.execute(sa.text(
+        'UPDATE courses SET enrollment_count = '
+        '(SELECT COUNT(*) FROM enrollments WHERE enrollments.course_id = courses.id)'
+    ))
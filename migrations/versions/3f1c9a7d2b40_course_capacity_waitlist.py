@@ -0,0 +1,66 @@
+"""course capacity and waitlist
+
+Revision ID: 3f1c9a7d2b40
+Revises: 7cd98063a3b5
+Create Date: 2026-10-19 09:12:41.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b40'
+down_revision = '7cd98063a3b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('capacity', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('enrollment_count', sa.Integer(), server_default='0', nullable=False))
+
+    # A student can only hold one enrollment per course, keep the graded one (or the first)
+    # of any duplicates before the unique constraint is added
+    op.execute(
+        'DELETE FROM enrollments WHERE id NOT IN ('
+        'SELECT kept.id FROM (SELECT COALESCE(MIN(CASE WHEN grade IS NOT NULL THEN id END), MIN(id)) AS id '
+        'FROM enrollments GROUP BY student_id, course_id) AS kept)'
+    )
+
+    # Seats already taken
+    op.execute(
+        'UPDATE courses SET enrollment_count = '
+        '(SELECT COUNT(*) FROM enrollments WHERE enrollments.course_id = courses.id)'
+    )
+
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_enrollments_student_course', ['student_id', 'course_id'])
+
+    op.create_table('waitlist',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('student_id', 'course_id', name='uq_waitlist_student_course')
+    )
+    with op.batch_alter_table('waitlist', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_waitlist_course_id'), ['course_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('waitlist', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_waitlist_course_id'))
+
+    op.drop_table('waitlist')
+
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_enrollments_student_course', type_='unique')
+
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.drop_column('enrollment_count')
+        batch_op.drop_column('capacity')
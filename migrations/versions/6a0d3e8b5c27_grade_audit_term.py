@@ -0,0 +1,36 @@
+"""term of the grade audit rows
+
+Revision ID: 6a0d3e8b5c27
+Revises: 1b6e9d4f3a82
+Create Date: 2026-10-20 11:02:39.118840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a0d3e8b5c27'
+down_revision = '1b6e9d4f3a82'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('grade_audit', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('term_id', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_grade_audit_course_id_id', ['course_id', 'id'], unique=False)
+        batch_op.create_index('ix_grade_audit_student_id_id', ['student_id', 'id'], unique=False)
+
+    # Rows whose enrollment is still live get its term, archived or purged ones stay empty
+    op.execute(
+        'UPDATE grade_audit SET term_id = '
+        '(SELECT term_id FROM enrollments WHERE enrollments.id = grade_audit.enrollment_id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('grade_audit', schema=None) as batch_op:
+        batch_op.drop_index('ix_grade_audit_student_id_id')
+        batch_op.drop_index('ix_grade_audit_course_id_id')
+        batch_op.drop_column('term_id')
@@ -0,0 +1,31 @@
+"""course graded count
+
+Revision ID: 8b2e4f61c9d3
+Revises: 3f1c9a7d2b40
+Create Date: 2026-10-19 11:40:07.228915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4f61c9d3'
+down_revision = '3f1c9a7d2b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('graded_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        'UPDATE courses SET graded_count = '
+        '(SELECT COUNT(grade) FROM enrollments WHERE enrollments.course_id = courses.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.drop_column('graded_count')
@@ -0,0 +1,157 @@
+"""terms and enrollments partitioned by term
+
+Revision ID: a3c58e9f1d27
+Revises: e61b8c05a4d2
+Create Date: 2026-10-19 18:05:52.640118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c58e9f1d27'
+down_revision = 'e61b8c05a4d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('terms',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('starts_on', sa.Date(), nullable=True),
+    sa.Column('ends_on', sa.Date(), nullable=True),
+    sa.Column('is_current', sa.Boolean(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+
+    op.create_table('enrollments_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('term_id', sa.Integer(), nullable=False),
+    sa.Column('grade', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('enrollments_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_enrollments_archive_term_student', ['term_id', 'student_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_enrollments_archive_course_id'), ['course_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_enrollments_archive_student_id'), ['student_id'], unique=False)
+
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('term_id', sa.Integer(), nullable=True))
+
+    # Existing enrollments go to a current 'Legacy' term
+    connection = op.get_bind()
+    if connection.execute(sa.text('SELECT COUNT(*) FROM enrollments')).scalar():
+        connection.execute(sa.text("INSERT INTO terms (name, is_current) VALUES ('Legacy', :current)"), {'current': True})
+        connection.execute(sa.text("UPDATE enrollments SET term_id = (SELECT id FROM terms WHERE name = 'Legacy')"))
+
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.alter_column('term_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_enrollments_term_id', 'terms', ['term_id'], ['id'])
+        batch_op.drop_constraint('uq_enrollments_student_course', type_='unique')
+        batch_op.create_unique_constraint('uq_enrollments_student_course_term', ['student_id', 'course_id', 'term_id'])
+        batch_op.create_index('ix_enrollments_term_course', ['term_id', 'course_id'], unique=False)
+        batch_op.create_index('ix_enrollments_term_student', ['term_id', 'student_id'], unique=False)
+
+    if connection.dialect.name == 'postgresql':
+        partition_enrollments()
+
+
+# Postgres only, rebuild enrollments as a table partitioned by LIST (term_id)
+# The primary key has to include the partition key, so it is (id, term_id).
+# Rows go to enrollments_default until a term gets its own partition from
+# create-term-command.
+def partition_enrollments():
+    op.execute('ALTER TABLE enrollments RENAME TO enrollments_unpartitioned')
+    op.execute('ALTER SEQUENCE enrollments_id_seq OWNED BY NONE')
+    op.execute('ALTER TABLE enrollments_unpartitioned DROP CONSTRAINT uq_enrollments_student_course_term')
+    op.execute('DROP INDEX ix_enrollments_term_course')
+    op.execute('DROP INDEX ix_enrollments_term_student')
+    op.execute('''
+        CREATE TABLE enrollments (
+            id INTEGER NOT NULL DEFAULT nextval('enrollments_id_seq'),
+            student_id INTEGER NOT NULL REFERENCES students (id),
+            course_id INTEGER NOT NULL REFERENCES courses (id),
+            term_id INTEGER NOT NULL CONSTRAINT fk_enrollments_term_id REFERENCES terms (id),
+            grade FLOAT,
+            CONSTRAINT enrollments_partitioned_pkey PRIMARY KEY (id, term_id),
+            CONSTRAINT uq_enrollments_student_course_term UNIQUE (student_id, course_id, term_id)
+        ) PARTITION BY LIST (term_id)
+    ''')
+    op.execute('ALTER SEQUENCE enrollments_id_seq OWNED BY enrollments.id')
+    op.execute('CREATE TABLE enrollments_default PARTITION OF enrollments DEFAULT')
+    op.execute('CREATE INDEX ix_enrollments_term_course ON enrollments (term_id, course_id)')
+    op.execute('CREATE INDEX ix_enrollments_term_student ON enrollments (term_id, student_id)')
+    op.execute(
+        'INSERT INTO enrollments (id, student_id, course_id, term_id, grade) '
+        'SELECT id, student_id, course_id, term_id, grade FROM enrollments_unpartitioned'
+    )
+    op.execute('DROP TABLE enrollments_unpartitioned')
+
+
+# Postgres only, back to a plain table (term partitions are dropped with it)
+def unpartition_enrollments():
+    op.execute('ALTER TABLE enrollments RENAME TO enrollments_partitioned')
+    op.execute('ALTER SEQUENCE enrollments_id_seq OWNED BY NONE')
+    op.execute('ALTER TABLE enrollments_partitioned DROP CONSTRAINT uq_enrollments_student_course_term')
+    op.execute('DROP INDEX ix_enrollments_term_course')
+    op.execute('DROP INDEX ix_enrollments_term_student')
+    op.execute('''
+        CREATE TABLE enrollments (
+            id INTEGER NOT NULL DEFAULT nextval('enrollments_id_seq') PRIMARY KEY,
+            student_id INTEGER NOT NULL REFERENCES students (id),
+            course_id INTEGER NOT NULL REFERENCES courses (id),
+            term_id INTEGER NOT NULL CONSTRAINT fk_enrollments_term_id REFERENCES terms (id),
+            grade FLOAT,
+            CONSTRAINT uq_enrollments_student_course_term UNIQUE (student_id, course_id, term_id)
+        )
+    ''')
+    op.execute('ALTER SEQUENCE enrollments_id_seq OWNED BY enrollments.id')
+    op.execute('CREATE INDEX ix_enrollments_term_course ON enrollments (term_id, course_id)')
+    op.execute('CREATE INDEX ix_enrollments_term_student ON enrollments (term_id, student_id)')
+    op.execute(
+        'INSERT INTO enrollments (id, student_id, course_id, term_id, grade) '
+        'SELECT id, student_id, course_id, term_id, grade FROM enrollments_partitioned'
+    )
+    op.execute('DROP TABLE enrollments_partitioned CASCADE')
+
+
+def downgrade():
+    connection = op.get_bind()
+    if connection.dialect.name == 'postgresql':
+        unpartition_enrollments()
+
+    # Archived enrollments come back to the enrollments table, keeping one row per
+    # student and course, the live one or else the latest archived one
+    connection.execute(sa.text(
+        'INSERT INTO enrollments (student_id, course_id, term_id, grade) '
+        'SELECT student_id, course_id, term_id, grade FROM enrollments_archive AS archived '
+        'WHERE NOT EXISTS (SELECT 1 FROM enrollments WHERE enrollments.student_id = archived.student_id '
+        'AND enrollments.course_id = archived.course_id) ORDER BY archived.id'
+    ))
+    connection.execute(sa.text(
+        'DELETE FROM enrollments WHERE EXISTS (SELECT 1 FROM enrollments AS newer '
+        'WHERE newer.student_id = enrollments.student_id AND newer.course_id = enrollments.course_id '
+        'AND newer.id > enrollments.id)'
+    ))
+
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.drop_index('ix_enrollments_term_student')
+        batch_op.drop_index('ix_enrollments_term_course')
+        batch_op.drop_constraint('uq_enrollments_student_course_term', type_='unique')
+        batch_op.create_unique_constraint('uq_enrollments_student_course', ['student_id', 'course_id'])
+        batch_op.drop_constraint('fk_enrollments_term_id', type_='foreignkey')
+        batch_op.drop_column('term_id')
+
+    with op.batch_alter_table('enrollments_archive', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_enrollments_archive_student_id'))
+        batch_op.drop_index(batch_op.f('ix_enrollments_archive_course_id'))
+        batch_op.drop_index('ix_enrollments_archive_term_student')
+
+    op.drop_table('enrollments_archive')
+    op.drop_table('terms')
@@ -0,0 +1,26 @@
+"""course grade version
+
+Revision ID: c4a7e0d93f15
+Revises: 8b2e4f61c9d3
+Create Date: 2026-10-19 13:05:52.640118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a7e0d93f15'
+down_revision = '8b2e4f61c9d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('grade_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.drop_column('grade_version')
@@ -0,0 +1,41 @@
+"""grade audit log
+
+Revision ID: c9f4a1e7b352
+Revises: b7e2d94c1a6f
+Create Date: 2026-10-19 20:02:36.118950
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9f4a1e7b352'
+down_revision = 'b7e2d94c1a6f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('grade_audit',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('enrollment_id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('actor_id', sa.Integer(), nullable=True),
+    sa.Column('old_grade', sa.Float(), nullable=True),
+    sa.Column('new_grade', sa.Float(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('grade_audit', schema=None) as batch_op:
+        batch_op.create_index('ix_grade_audit_actor_id_id', ['actor_id', 'id'], unique=False)
+        batch_op.create_index('ix_grade_audit_enrollment_id_id', ['enrollment_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('grade_audit', schema=None) as batch_op:
+        batch_op.drop_index('ix_grade_audit_enrollment_id_id')
+        batch_op.drop_index('ix_grade_audit_actor_id_id')
+
+    op.drop_table('grade_audit')
@@ -0,0 +1,37 @@
+"""course timetable slots
+
+Revision ID: e4b7c2a91f63
+Revises: c9f4a1e7b352
+Create Date: 2026-10-19 21:12:48.530117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7c2a91f63'
+down_revision = 'c9f4a1e7b352'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('course_slots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Integer(), nullable=False),
+    sa.Column('starts_at', sa.Integer(), nullable=False),
+    sa.Column('ends_at', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('course_slots', schema=None) as batch_op:
+        batch_op.create_index('ix_course_slots_course_day', ['course_id', 'day'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('course_slots', schema=None) as batch_op:
+        batch_op.drop_index('ix_course_slots_course_day')
+
+    op.drop_table('course_slots')
@@ -0,0 +1,32 @@
+"""soft delete for students and courses
+
+Revision ID: e61b8c05a4d2
+Revises: 5d9f3b2a7e18
+Create Date: 2026-10-19 16:48:13.377290
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e61b8c05a4d2'
+down_revision = '5d9f3b2a7e18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.drop_column('deleted_at')
+
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.drop_column('deleted_at')
@@ -0,0 +1,44 @@
+"""course prerequisites and cache versions
+
+Revision ID: f2d85a3c6b19
+Revises: e4b7c2a91f63
+Create Date: 2026-10-19 21:47:03.271846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2d85a3c6b19'
+down_revision = 'e4b7c2a91f63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('course_prerequisites',
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('prerequisite_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ),
+    sa.ForeignKeyConstraint(['prerequisite_id'], ['courses.id'], ),
+    sa.PrimaryKeyConstraint('course_id', 'prerequisite_id')
+    )
+    with op.batch_alter_table('course_prerequisites', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_course_prerequisites_prerequisite_id'), ['prerequisite_id'], unique=False)
+
+    cache_versions = op.create_table('cache_versions',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # Seeded so concurrent first bumps only ever update
+    op.bulk_insert(cache_versions, [{'name': 'prerequisites', 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('cache_versions')
+    with op.batch_alter_table('course_prerequisites', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_course_prerequisites_prerequisite_id'))
+
+    op.drop_table('course_prerequisites')
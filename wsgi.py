@@ -0,0 +1,14 @@
+import gc
+from decouple import config
+from api import create_app, warm_up
+
+# Production WSGI entry point
+# Run with: gunicorn -c gunicorn.conf.py wsgi:app
+
+# Config is selected from the environment (dev, prod or test)
+app = create_app(config=config('APP_CONFIG', 'prod'))
+
+# Warm mappers and the Swagger spec, then move everything allocated so far
+# out of the GC generations so forked workers keep sharing those pages
+warm_up(app)
+gc.freeze()